@@ -0,0 +1,86 @@
+from collections import OrderedDict
+
+
+class PathCache:
+    """A least recently used cache of paths returned by GameState.find_path_to_edge
+
+    Paths only depend on where structures stand, so entries are keyed by
+    (structure layout, start location, target edge) and stay valid across
+    turns and across GameState copies for as long as the layout matches.
+
+    Attributes :
+        * capacity (int): The maximum number of paths kept before the least recently used one is evicted
+        * hits (int): Lookups answered from the cache
+        * misses (int): Lookups that had to run the path finder
+        * evictions (int): Entries dropped to respect capacity
+
+    """
+    def __init__(self, capacity=4096):
+        self.capacity = capacity
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.__entries = OrderedDict()
+
+    def __len__(self):
+        return len(self.__entries)
+
+    def __deepcopy__(self, memo):
+        # The cache is shared on purpose, copies of a GameState keep feeding the same one
+        return self
+
+    def get(self, layout, start_location, target_edge):
+        """Gets a cached path
+
+        Args:
+            layout: The structure layout the path was computed on, see GameMap.structure_layout
+            start_location: The location of a hypothetical unit
+            target_edge: The edge the unit wants to reach
+
+        Returns:
+            A fresh copy of the cached path, or None on a miss
+
+        """
+        key = (layout, int(start_location[0]), int(start_location[1]), target_edge)
+        path = self.__entries.get(key)
+        if path is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.__entries.move_to_end(key)
+        return [list(location) for location in path]
+
+    def put(self, layout, start_location, target_edge, path):
+        """Stores a path, evicting the least recently used entries if the cache is full
+        """
+        key = (layout, int(start_location[0]), int(start_location[1]), target_edge)
+        self.__entries[key] = tuple((int(x), int(y)) for x, y in path)
+        self.__entries.move_to_end(key)
+        while len(self.__entries) > self.capacity:
+            self.__entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        """Drops every entry, the counters are kept
+        """
+        self.__entries.clear()
+
+    def stats(self):
+        """Gets the cache counters
+
+        Returns:
+            A dict with hits, misses, evictions, size and hit_rate
+
+        """
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "size": len(self.__entries),
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+# The cache GameState uses by default, shared by every GameState in the process
+PATH_CACHE = PathCache()
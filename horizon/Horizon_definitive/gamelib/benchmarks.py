@@ -0,0 +1,328 @@
+"""
+Micro benchmarks for the performance sensitive parts of gamelib.
+
+Run from the algo folder with `python -m gamelib.benchmarks`. Results are printed
+to stdout, nothing here is used by the algo itself.
+"""
+import json
+import math
+import time
+import tracemalloc
+
+from .navigation import ShortestPathFinder, LegacyShortestPathFinder
+from .path_cache import PathCache
+from .reachability import Reachability
+from .unit import GameUnit
+from .frames import ActionFrame, peek_turn_info
+from .tests import make_random_board, make_turn
+from .game_state import GameState
+from .simulator import Simulator
+from .parallel import SimulationPool
+from .forecast import BreachForecast
+
+
+def _rate(func, repeat):
+    """Calls func repeat times and returns calls per second"""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return repeat / (time.perf_counter() - start)
+
+
+def bench_pathfinding(structures=120, repeat=20):
+    """Paths per second of ShortestPathFinder against LegacyShortestPathFinder on a random board"""
+    state = make_random_board(0, structures)
+    starts = [location for location in state.game_map.get_edges()[2] + state.game_map.get_edges()[3]
+              if not state.contains_stationary_unit(location)]
+    jobs = [(start, state.game_map.get_edge_locations(state.get_target_edge(start))) for start in starts]
+
+    results = {}
+    for name, finder in (("legacy", LegacyShortestPathFinder()), ("flat", ShortestPathFinder())):
+        def run():
+            for start, end_points in jobs:
+                finder.navigate_multiple_endpoints(start, end_points, state)
+        results[name] = _rate(run, repeat) * len(jobs)
+    return results
+
+
+def bench_path_cache(structures=120, repeat=20):
+    """find_path_to_edge calls per second without a cache and with a warm PathCache"""
+    state = make_random_board(0, structures)
+    starts = [location for location in state.game_map.get_edges()[2] + state.game_map.get_edges()[3]
+              if not state.contains_stationary_unit(location)]
+
+    def run():
+        for start in starts:
+            state.find_path_to_edge(start)
+
+    state.path_cache = None
+    uncached = _rate(run, repeat) * len(starts)
+    state.path_cache = PathCache()
+    run()
+    cached = _rate(run, repeat) * len(starts)
+    return {"uncached": uncached, "cached": cached}
+
+
+def bench_many_starts(structures=120, repeat=20):
+    """Paths per second for all 28 spawn locations, one find_path_to_edge call each against one find_paths_to_edge_many call"""
+    state = make_random_board(0, structures)
+    state.path_cache = None
+    starts = [location for location in state.game_map.get_edges()[2] + state.game_map.get_edges()[3]
+              if not state.contains_stationary_unit(location)]
+
+    def single():
+        for start in starts:
+            state.find_path_to_edge(start)
+
+    def batch():
+        state.find_paths_to_edge_many(starts)
+
+    return {"single": _rate(single, repeat) * len(starts), "batch": _rate(batch, repeat) * len(starts)}
+
+
+def bench_persistent(structures=160, kills=8, repeat=20):
+    """Seconds per simulated wave that destroys kills structures and re-paths after each one,
+    with a full search per kill against one persistent path finder"""
+    state = make_random_board(0, structures)
+    state.path_cache = None
+    start = next(location for location in state.game_map.get_edges()[2] if not state.contains_stationary_unit(location))
+    end_points = state.game_map.get_edge_locations(state.get_target_edge(start))
+    victims = [location for location in state.game_map if state.contains_stationary_unit(location)][:kills]
+
+    def full():
+        for location in victims:
+            state.game_map.remove_unit(location)
+            state.find_path_to_edge(start)
+        for location in victims:
+            state.game_map.add_unit("FF", location)
+
+    def persistent():
+        pathing = ShortestPathFinder()
+        pathing.track_edge(state, end_points)
+        for location in victims:
+            pathing.unblock(location)
+            pathing.path_from(start)
+
+    return {"full": 1 / _rate(full, repeat), "persistent": 1 / _rate(persistent, repeat)}
+
+
+def bench_reachability(structures=200, repeat=50):
+    """Seconds to decide whether any of our edge cells can be reached from the enemy edges,
+    pathing from every enemy edge cell against labeling the board once"""
+    state = make_random_board(0, structures)
+    state.path_cache = None
+    state.suppress_warnings(True)
+    starts = state.game_map.get_edges()[0] + state.game_map.get_edges()[1]
+
+    def pathing():
+        return any(path and path[-1][1] < 14 for path in state.find_paths_to_edge_many(starts))
+
+    def labeling():
+        reachability = Reachability(state.game_map.structure_layout())
+        return any(reachability.reaches_half(start, 0) for start in starts)
+
+    return {"pathing": 1 / _rate(pathing, repeat), "labeling": 1 / _rate(labeling, repeat)}
+
+
+def _legacy_locations_in_range(game_map, location, radius):
+    """GameMap.get_locations_in_range as it was before the stencils, kept as a baseline"""
+    x, y = location
+    locations = []
+    search_radius = math.ceil(radius)
+    getHitRadius = game_map.config["unitInformation"][0]['getHitRadius']
+    for i in range(int(x - search_radius), int(x + search_radius + 1)):
+        for j in range(int(y - search_radius), int(y + search_radius + 1)):
+            new_location = [i, j]
+            if game_map.in_arena_bounds(new_location) and math.sqrt((x - i)**2 + (y - j)**2) < radius + getHitRadius:
+                locations.append(new_location)
+    return locations
+
+
+def bench_locations_in_range(radius=4.5, repeat=20):
+    """get_locations_in_range calls per second for every cell of the board, bounding square search against stencils"""
+    game_map = make_random_board(0, 0).game_map
+    locations = list(game_map)
+
+    def legacy():
+        for location in locations:
+            _legacy_locations_in_range(game_map, location, radius)
+
+    def stencil():
+        for location in locations:
+            game_map.get_locations_in_range(location, radius)
+
+    return {"legacy": _rate(legacy, repeat) * len(locations), "stencil": _rate(stencil, repeat) * len(locations)}
+
+
+def bench_unit_memory(count=1000, repeat=20):
+    """Bytes allocated per 1000 GameUnits and units constructed per second"""
+    config = make_random_board(0, 0).config
+    GameUnit("DF", config)
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    units = [GameUnit("DF", config, 0, None, 13, 6) for _ in range(count)]
+    allocated = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    del units
+    rate = _rate(lambda: [GameUnit("DF", config, 0, None, 13, 6) for _ in range(count)], repeat) * count
+    return {"bytes": allocated * 1000 / count, "rate": rate}
+
+
+def bench_spawn_wave(scouts=40, repeat=200):
+    """Seconds to spawn a wave of scouts one attempt_spawn call per unit, like the old loop did, and in a single call"""
+    state = make_random_board(0)
+    state._player_resources[0]['MP'] = scouts
+
+    def single():
+        fork = state.fork()
+        for _ in range(scouts):
+            fork.attempt_spawn("PI", [13, 0])
+
+    def wave():
+        state.fork().attempt_spawn("PI", [13, 0], scouts)
+
+    return {"single": 1 / _rate(single, repeat), "wave": 1 / _rate(wave, repeat)}
+
+
+def bench_action_frames(structures=200, mobile=60, repeat=200):
+    """Action frames read per second: full json.loads against turnInfo and events only"""
+    state = make_random_board(0, structures)
+    units = [[[], [], [], [], [], [], []], [[], [], [], [], [], [], []]]
+    for location in state.game_map:
+        for unit in state.game_map[location]:
+            units[unit.player_index][0].append([unit.x, unit.y, unit.health, str(id(unit))])
+    units[0][3] = [[13, 0, 15.0, str(i)] for i in range(mobile)]
+    frame = json.dumps({"p2Units": units[1], "turnInfo": [1, 5, 30], "p1Stats": [30.0, 4.0, 2.0, 900], "p1Units": units[0],
+                        "p2Stats": [30.0, 4.0, 2.0, 900], "events": {"breach": [], "damage": [[[13, 5], 5, 0, "1", 1]], "death": []}})
+
+    def full():
+        json.loads(frame)["events"]["breach"]
+
+    def lazy():
+        ActionFrame(frame, peek_turn_info(frame)).get_events("breach")
+
+    return {"full": _rate(full, repeat), "lazy": _rate(lazy, repeat)}
+
+
+def bench_turn_update(structures=200, changes=10, repeat=50):
+    """Seconds to get the next turn's GameState: parsing the whole message against applying it to the kept state"""
+    state = make_random_board(0, structures)
+    units = [(unit.unit_type, unit.player_index, unit.x, unit.y, unit.health) for location in state.game_map for unit in state.game_map[location]]
+    # Decoded up front, AlgoCore hands both paths an already parsed message
+    first = json.loads(make_turn(units, 1))
+    units = [(unit_type, owner, x, y, health - 10 if index < changes else health) for index, (unit_type, owner, x, y, health) in enumerate(units)]
+    second = json.loads(make_turn(units, 2))
+    kept = GameState(state.config, first)
+
+    def fresh():
+        GameState(state.config, second)
+
+    def update():
+        kept.apply_turn(first if kept.turn_number == 2 else second)
+        kept.fork()
+
+    return {"fresh": 1 / _rate(fresh, repeat), "update": 1 / _rate(update, repeat)}
+
+
+def make_defended_board(seed=0, walls=60, turrets=16, player_index=1):
+    """A random board with turrets on the half of player_index, the enemy by default, and a free spawn location at [13, 0]"""
+    state = make_random_board(seed, walls)
+    game_map = state.game_map
+    rows = range(state.HALF_ARENA, state.ARENA_SIZE) if player_index == 1 else range(state.HALF_ARENA)
+    cells = [[x, y] for x in range(state.ARENA_SIZE) for y in rows
+             if game_map.in_arena_bounds([x, y]) and not game_map.get_structure([x, y])]
+    for location in cells[::max(1, len(cells) // turrets)][:turrets]:
+        game_map.add_unit("DF", location, player_index)
+    if game_map.get_structure([13, 0]):
+        game_map.remove_unit([13, 0])
+    return state
+
+
+def bench_simulator(scouts=15, demolishers=3, repeat=50):
+    """Full wave simulations per second and frames per second of Simulator on a defended board"""
+    state = make_defended_board()
+    state.game_map.add_units("PI", [13, 0], scouts, 0)
+    state.game_map.add_units("EI", [13, 0], demolishers, 0)
+    frames = []
+
+    def simulate():
+        frames.append(Simulator(state).run().frames)
+
+    rate = _rate(simulate, repeat)
+    return {"waves": rate, "frames": rate * sum(frames) / len(frames)}
+
+
+def bench_breach_forecast(scouts=40, demolishers=13, repeat=5, **options):
+    """Seconds to forecast the breaches of an enemy scout wave and demolisher wave from every enemy spawn location,
+    by default as large as 40 enemy MP allows. options are passed to BreachForecast"""
+    state = make_defended_board(player_index=0)
+    forecast = None
+
+    def run():
+        nonlocal forecast
+        forecast = BreachForecast(state, [("PI", scouts), ("EI", demolishers)], **options)
+
+    seconds = 1 / _rate(run, repeat)
+    return {"seconds": seconds, "simulations": forecast.simulations}
+
+
+def bench_simulation_pool(worker_counts=(0, 1, 2, 4), scouts=10, repeat=5):
+    """Seconds to simulate a scout wave from every free spawn location, by number of worker processes"""
+    state = make_defended_board()
+    edges = state.game_map.get_edges()
+    locations = [location for location in edges[2] + edges[3] if not state.contains_stationary_unit(location)]
+    results = {"locations": len(locations)}
+    for processes in worker_counts:
+        pool = SimulationPool(state.config, processes=processes)
+        pool.evaluate_spawns(state, locations, "PI", scouts)
+        results[processes] = 1 / _rate(lambda: pool.evaluate_spawns(state, locations, "PI", scouts), repeat)
+        pool.close()
+    return results
+
+
+def main():
+    for structures in (0, 60, 120, 200):
+        results = bench_pathfinding(structures)
+        print("pathfinding, {:3} structures: legacy {:8.0f} paths/s, flat {:8.0f} paths/s ({:.1f}x)".format(
+            structures, results["legacy"], results["flat"], results["flat"] / results["legacy"]))
+    results = bench_path_cache()
+    print("find_path_to_edge: uncached {:8.0f} paths/s, warm cache {:8.0f} paths/s ({:.1f}x)".format(
+        results["uncached"], results["cached"], results["cached"] / results["uncached"]))
+    results = bench_many_starts()
+    print("spawn location paths: one by one {:8.0f} paths/s, batched {:8.0f} paths/s ({:.1f}x)".format(
+        results["single"], results["batch"], results["batch"] / results["single"]))
+    results = bench_persistent()
+    print("re-pathing after 8 kills: full search {:6.2f} ms, persistent {:6.2f} ms ({:.1f}x)".format(
+        results["full"] * 1000, results["persistent"] * 1000, results["full"] / results["persistent"]))
+    results = bench_reachability()
+    print("sealed board check: pathing {:6.2f} ms, component labeling {:6.2f} ms ({:.1f}x)".format(
+        results["pathing"] * 1000, results["labeling"] * 1000, results["pathing"] / results["labeling"]))
+    results = bench_locations_in_range()
+    print("get_locations_in_range: bounding square {:8.0f} calls/s, stencil {:8.0f} calls/s ({:.1f}x)".format(
+        results["legacy"], results["stencil"], results["stencil"] / results["legacy"]))
+    results = bench_action_frames()
+    print("action frames: full decode {:8.0f} frames/s, events only {:8.0f} frames/s ({:.1f}x)".format(
+        results["full"], results["lazy"], results["lazy"] / results["full"]))
+    results = bench_turn_update()
+    print("next turn state, 10 changes: fresh parse {:6.2f} ms, kept state {:6.2f} ms ({:.1f}x)".format(
+        results["fresh"] * 1000, results["update"] * 1000, results["fresh"] / results["update"]))
+    results = bench_spawn_wave()
+    print("40 scout wave: one unit per call {:6.3f} ms, one stack {:6.3f} ms ({:.1f}x)".format(
+        results["single"] * 1000, results["wave"] * 1000, results["single"] / results["wave"]))
+    results = bench_simulator()
+    print("action phase simulation, 18 unit wave: {:6.2f} ms per wave, {:8.0f} frames/s".format(
+        1000 / results["waves"], results["frames"]))
+    for mp in (10, 20, 40):
+        exact = bench_breach_forecast(mp, mp // 3, every_spawn=True, max_units=None)
+        results = bench_breach_forecast(mp, mp // 3)
+        print("breach forecast, {:2} enemy MP: every spawn and unit {:6.2f} ms, grouped and capped {:6.2f} ms ({} of {} waves)".format(
+            mp, exact["seconds"] * 1000, results["seconds"] * 1000, results["simulations"], exact["simulations"]))
+    results = bench_simulation_pool()
+    print("{} spawn locations: ".format(results.pop("locations")) + ", ".join(
+        "{} workers {:6.2f} ms".format(processes, seconds * 1000) for processes, seconds in results.items()))
+    results = bench_unit_memory()
+    print("GameUnit: {:8.0f} bytes per 1000 units, {:8.0f} units/s".format(results["bytes"], results["rate"]))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+"""
+Predicting where a player can score against the structures on the board.
+
+BreachForecast plays the same wave from the free spawn locations of one player, each on a fork of one
+Simulator, and keeps what breached. By default it forecasts your opponent's waves against your structures,
+the mirror image of simulating your own attacks.
+
+Units walk untouched until the first cell where a structure can attack or shield them, or they can attack one.
+Spawn locations whose paths reach that cell from the same direction, headed for the same edge, meet the same
+structures from there on. A self destruct only hurts anything after selfDestructStepsRequired steps, so they must
+also have walked as many cells before it, or both at least that many. Only the one closest to that cell is simulated
+and its result stands for the whole group. The locations walked through before that cell are credited to each spawn
+location's own path.
+
+The time a wave takes grows with its size, so waves of more than max_units units are simulated with max_units.
+Structures kill about as many units of a stack whatever its size, so when some of them breach, the units
+left out are counted as breaching with them. A bigger stack also destroys structures sooner, so this may count
+a few breaches too few. When none breach, the full wave is simulated instead.
+"""
+import time
+
+from .geometry import ARENA_SIZE, EDGES
+from .simulator import Simulator
+
+DEFAULT_MAX_UNITS = 16
+
+
+class BreachForecast:
+    """The breaches of waves sent from the free spawn locations of a player
+
+    Attributes :
+        * waves (list): The (unit_type, count) waves sent, each one from every spawn location
+        * player_index (int): The player sending them, 1 for your opponent by default
+        * groups (dict): The spawn locations simulated, from (x, y) to the list of free spawn locations whose result it stands for
+        * lanes (list): (breach damage, spawn location, unit_type, units that breached) for every wave and simulated spawn location, most damage first
+        * damage_map (dict): The breach damage expected from the units walking through each location, from (x, y) to damage,
+          averaged over every wave and free spawn location as if the player picked one of them at random
+        * expected_damage (float): The breach damage expected from one wave picked the same way
+        * simulations (int): The number of waves simulated
+        * seconds (float): The time the forecast took
+
+    """
+    def __init__(self, game_state, waves, player_index=1, every_spawn=False, max_units=DEFAULT_MAX_UNITS):
+        """Simulates the waves
+
+        Args:
+            game_state: The board to forecast on, it is not modified
+            waves: (unit_type, count) waves, count units of unit_type are sent together
+            player_index: The player sending the waves
+            every_spawn: Simulate every free spawn location instead of one per group, see the module docstring
+            max_units: Bigger waves are simulated with this many units, see the module docstring, None to simulate them whole
+
+        """
+        start = time.perf_counter()
+        self.waves = list(waves)
+        self.player_index = player_index
+        self.lanes = []
+        self.damage_map = {}
+        self.expected_damage = 0.0
+        self.simulations = 0
+
+        edges = EDGES[0] + EDGES[1] if player_index == 1 else EDGES[2] + EDGES[3]
+        spawns = [[x, y] for x, y in edges if not game_state.contains_stationary_unit([x, y])]
+        self.__prefixes = {}
+        base = Simulator(game_state)
+        self.groups = {tuple(location): [location] for location in spawns} if every_spawn else self.__group(game_state, base, spawns)
+        total = 0
+        for unit_type, count in self.waves:
+            if count <= 0:
+                continue
+            total += len(spawns)
+            for location, group in self.groups.items():
+                sent = count if max_units is None else min(count, max_units)
+                result, breached = self.__simulate(base, unit_type, location, sent)
+                if sent < count and not breached:
+                    # The defenses may hold a bigger wave too or just run out of time, only the full wave tells
+                    sent = count
+                    result, breached = self.__simulate(base, unit_type, location, sent)
+                # The defenses kill about as many units of a bigger stack, the ones not sent would have scored too
+                scale = (len(breached) + count - sent) / len(breached) if breached else 0
+                damage = sum(breach[2] for breach in breached) * scale
+                self.lanes.append((damage, list(location), unit_type, round(len(breached) * scale)))
+                self.expected_damage += damage * len(group)
+                if damage > 0:
+                    shared = self.__prefixes.get(location, ())
+                    for cell, scored in result.breach_cells.items():
+                        if cell not in shared:
+                            self.damage_map[cell] = self.damage_map.get(cell, 0) + scored * scale * len(group)
+                    if shared:
+                        # Every unit that breached walked the whole path before the cell the group shares
+                        for member in group:
+                            for cell in self.__prefixes[tuple(member)]:
+                                self.damage_map[cell] = self.damage_map.get(cell, 0) + damage
+        if total:
+            self.expected_damage /= total
+            for cell in self.damage_map:
+                self.damage_map[cell] /= total
+        # Stable, so equal lanes keep the order they were simulated in
+        self.lanes.sort(key=lambda lane: -lane[0])
+        self.seconds = time.perf_counter() - start
+
+    def __simulate(self, base, unit_type, location, count):
+        simulator = base.fork()
+        simulator.spawn(unit_type, location, count, self.player_index)
+        result = simulator.run()
+        self.simulations += 1
+        return result, [breach for breach in result.breaches if breach[4] == self.player_index]
+
+    def __group(self, game_state, simulator, spawns):
+        """Groups spawn locations by the first cell their path meets a structure on, see the module docstring
+        """
+        groups = {}
+        # Cells walked before the shared cell that still change whether a self destruct at the end of the path hurts
+        steps_required = {info.get("shorthand"): info.get("selfDestructStepsRequired", 0) for info in game_state.config["unitInformation"]}
+        armed = max((steps_required.get(unit_type, 0) for unit_type, _ in self.waves), default=0)
+        for location, path in zip(spawns, game_state.find_paths_to_edge_many(spawns)):
+            entry = next((steps for steps, (x, y) in enumerate(path or ())
+                          if simulator._interacts(x * ARENA_SIZE + y, self.player_index)), None)
+            if not entry:
+                # Met on its spawn location or never, nothing to share
+                groups[tuple(location)] = [0, location, [location]]
+                continue
+            self.__prefixes[tuple(location)] = {tuple(cell) for cell in path[:entry]}
+            key = (tuple(path[entry - 1]), tuple(path[entry]), game_state.get_target_edge(location), min(entry, armed))
+            if key not in groups:
+                groups[key] = [entry, location, [location]]
+                continue
+            group = groups[key]
+            group[2].append(location)
+            if entry < group[0]:
+                group[0], group[1] = entry, location
+        # Alone in its group, the result of a spawn location needs no correction
+        groups = {tuple(location): members for _, location, members in groups.values()}
+        for location, members in groups.items():
+            if len(members) == 1:
+                self.__prefixes.pop(location, None)
+        return groups
+
+    def top_lanes(self, count=3):
+        """Gets the waves that scored the most
+
+        Returns:
+            Up to count entries of lanes, only those that breached
+
+        """
+        return [lane for lane in self.lanes[:count] if lane[0] > 0]
+
+    def damage_at(self, location):
+        """Gets the breach damage expected from the units walking through a location, see damage_map
+        """
+        return self.damage_map.get((int(location[0]), int(location[1])), 0)
+
+    def hot_cells(self, count=10, player_index=None):
+        """Gets the locations the most breach damage walks through
+
+        Args:
+            count: The number of locations to return
+            player_index: Only locations on the half of this player, every location if None
+
+        Returns:
+            A list of [x, y], most damage first
+
+        """
+        cells = [cell for cell in self.damage_map
+                 if player_index is None or (cell[1] < ARENA_SIZE // 2) == (player_index == 0)]
+        cells.sort(key=lambda cell: -self.damage_map[cell])
+        return [list(cell) for cell in cells[:count]]
@@ -0,0 +1,134 @@
+from collections import OrderedDict
+
+from .geometry import ARENA_SIZE, HALF_ARENA, NUM_CELLS, ARENA_CELLS, NEIGHBORS, EDGES
+
+
+class Reachability:
+    """Connected components of the free cells of one structure layout
+
+    Mobile units can move between any two free cells of the same component and never
+    between two different components, so once the board is labeled questions like
+    "can a unit starting here reach that edge" are answered with a couple of array reads.
+
+    Attributes :
+        * layout (bytes): The structure layout that was labeled, see GameMap.structure_layout
+        * labels (list): The component of every cell id, -1 for structures and cells outside the arena
+        * edges (list): Bitmask of the edges each component touches, bit i for GameMap edge constant i
+        * halves (list): Bitmask of the halves each component reaches, bit 0 for player 0 (y < 14) and bit 1 for player 1
+
+    """
+    def __init__(self, layout):
+        self.layout = layout
+        self.labels = labels = [-1] * NUM_CELLS
+        self.edges = edges = []
+        self.halves = halves = []
+        edge_flags = [0] * NUM_CELLS
+        for edge, locations in enumerate(EDGES):
+            for x, y in locations:
+                edge_flags[x * ARENA_SIZE + y] |= 1 << edge
+
+        for cell, _, _ in ARENA_CELLS:
+            if layout[cell] or labels[cell] != -1:
+                continue
+            label = len(edges)
+            labels[cell] = label
+            edge_mask = 0
+            half_mask = 0
+            stack = [cell]
+            while stack:
+                current = stack.pop()
+                edge_mask |= edge_flags[current]
+                half_mask |= 1 if current % ARENA_SIZE < HALF_ARENA else 2
+                for neighbor in NEIGHBORS[current]:
+                    if labels[neighbor] == -1 and not layout[neighbor]:
+                        labels[neighbor] = label
+                        stack.append(neighbor)
+            edges.append(edge_mask)
+            halves.append(half_mask)
+
+    def __len__(self):
+        return len(self.edges)
+
+    def component(self, location):
+        """Gets the component of a location
+
+        Args:
+            location: A map location
+
+        Returns:
+            The component label, or -1 if the location is outside the arena or holds a structure
+
+        """
+        x, y = int(location[0]), int(location[1])
+        if not (0 <= x < ARENA_SIZE and 0 <= y < ARENA_SIZE):
+            return -1
+        return self.labels[x * ARENA_SIZE + y]
+
+    def connected(self, location_1, location_2):
+        """Checks if a unit could walk from one location to the other
+        """
+        label = self.component(location_1)
+        return label != -1 and label == self.component(location_2)
+
+    def can_reach_edge(self, location, edge):
+        """Checks if a unit starting at location can reach a cell of the given edge
+
+        Args:
+            location: A map location
+            edge: One of the GameMap edge constants (TOP_RIGHT, TOP_LEFT, BOTTOM_LEFT, BOTTOM_RIGHT)
+
+        Returns:
+            True if some free cell of that edge is in the same component as location
+
+        """
+        label = self.component(location)
+        return label != -1 and bool(self.edges[label] >> edge & 1)
+
+    def reaches_half(self, location, player_index):
+        """Checks if a unit starting at location can reach the half of the arena owned by player_index
+        """
+        label = self.component(location)
+        return label != -1 and bool(self.halves[label] >> player_index & 1)
+
+    def reachable_from_half(self, locations, player_index):
+        """Filters locations down to the ones a unit standing in player_index's half could walk to
+
+        Args:
+            locations: A list of map locations, for example the cells of one of our edges
+            player_index: The owner of the half the units start from, 1 for the enemy half
+
+        Returns:
+            The locations that share a component with a free cell of that half
+
+        """
+        return [location for location in locations if self.reaches_half(location, player_index)]
+
+
+def _layout_of(layout_or_map):
+    return layout_or_map if isinstance(layout_or_map, bytes) else layout_or_map.structure_layout()
+
+
+class ReachabilityCache:
+    """A least recently used cache of labeled layouts, so each board version is labeled once
+    """
+    def __init__(self, capacity=32):
+        self.capacity = capacity
+        self.__entries = OrderedDict()
+
+    def get(self, layout_or_map):
+        """Gets the Reachability of a structure layout or of a GameMap's current layout, labeling it on a miss
+        """
+        layout = _layout_of(layout_or_map)
+        reachability = self.__entries.get(layout)
+        if reachability is None:
+            reachability = Reachability(layout)
+            self.__entries[layout] = reachability
+            while len(self.__entries) > self.capacity:
+                self.__entries.popitem(last=False)
+        else:
+            self.__entries.move_to_end(layout)
+        return reachability
+
+
+# The cache GameState.get_reachability uses, shared by every GameState in the process
+REACHABILITY_CACHE = ReachabilityCache()
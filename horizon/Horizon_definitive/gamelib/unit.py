@@ -1,3 +1,7 @@
+from array import array
+from operator import attrgetter
+
+
 def is_stationary(unit_type, structure_types):
     """
         Args:
@@ -9,6 +13,101 @@ def is_stationary(unit_type, structure_types):
     return unit_type in structure_types
 
 
+class UnitSpec:
+    """The fixed properties of one unit type, read from the config once and shared by every unit of that type
+
+    Upgraded units point at a second UnitSpec of the same type with the upgrade values applied.
+    UnitSpecs are never modified once built.
+
+    Attributes :
+        * config (JSON): The config this spec was compiled from
+        * unit_type (string): The shorthand of the unit type
+        * upgraded (bool): If this spec describes the upgraded version of the unit type
+        * upgrade_spec (:obj: UnitSpec): The spec a unit of this type switches to when upgraded
+        * Plus every stat GameUnit exposes: stationary, speed, damage_f, damage_i, attackRange, shieldRange,
+          max_health, shieldPerUnit, shieldBonusPerY and cost
+
+    """
+    __slots__ = ("config", "unit_type", "upgraded", "upgrade_spec", "stationary", "speed", "damage_f", "damage_i",
+                 "attackRange", "shieldRange", "max_health", "shieldPerUnit", "shieldBonusPerY", "cost")
+
+    def __init__(self, config, type_config, base=None):
+        set_field = super().__setattr__
+        set_field("config", config)
+        set_field("unit_type", type_config["shorthand"])
+        set_field("stationary", type_config["unitCategory"] == 0)
+        if base is None:
+            set_field("upgraded", False)
+            set_field("speed", type_config.get("speed", 0))
+            set_field("damage_f", type_config.get("attackDamageTower", 0))
+            set_field("damage_i", type_config.get("attackDamageWalker", 0))
+            set_field("attackRange", type_config.get("attackRange", 0))
+            set_field("shieldRange", type_config.get("shieldRange", 0))
+            set_field("max_health", type_config.get("startHealth", 0))
+            set_field("shieldPerUnit", type_config.get("shieldPerUnit", 0))
+            set_field("shieldBonusPerY", type_config.get("shieldBonusPerY", 0))
+            set_field("cost", (type_config.get("cost1", 0), type_config.get("cost2", 0)))
+            set_field("upgrade_spec", UnitSpec(config, type_config, self))
+        else:
+            upgrade = type_config.get("upgrade", {})
+            set_field("upgraded", True)
+            set_field("speed", upgrade.get("speed", base.speed))
+            set_field("damage_f", upgrade.get("attackDamageTower", base.damage_f))
+            set_field("damage_i", upgrade.get("attackDamageWalker", base.damage_i))
+            set_field("attackRange", upgrade.get("attackRange", base.attackRange))
+            set_field("shieldRange", upgrade.get("shieldRange", base.shieldRange))
+            set_field("max_health", upgrade.get("startHealth", base.max_health))
+            set_field("shieldPerUnit", upgrade.get("shieldPerUnit", base.shieldPerUnit))
+            set_field("shieldBonusPerY", upgrade.get("shieldBonusPerY", base.shieldBonusPerY))
+            set_field("cost", (upgrade.get("cost1", 0) + base.cost[0], upgrade.get("cost2", 0) + base.cost[1]))
+            set_field("upgrade_spec", self)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("UnitSpec is read only")
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def __reduce__(self):
+        return _spec_of, (self.config, self.unit_type, self.upgraded)
+
+
+# (config, {unit_type: UnitSpec}) for the configs seen most recently, the config is kept so its id stays unique
+_COMPILED_SPECS = {}
+
+
+def compile_unit_specs(config):
+    """Gets the UnitSpec of every unit type in a config, compiling them the first time the config is seen
+
+    AlgoCore compiles the config as soon as the game starts, after that GameUnit construction is a single lookup.
+
+    Args:
+        config (JSON): Contains information about the game
+
+    Returns:
+        A dict from unit type shorthand to its UnitSpec
+
+    """
+    compiled = _COMPILED_SPECS.get(id(config))
+    if compiled is not None and compiled[0] is config:
+        return compiled[1]
+    specs = {type_config["shorthand"]: UnitSpec(config, type_config)
+             for type_config in config["unitInformation"] if "unitCategory" in type_config}
+    # Every GameState of a game shares one config, only tests and tools go through many
+    if len(_COMPILED_SPECS) >= 8:
+        del _COMPILED_SPECS[next(iter(_COMPILED_SPECS))]
+    _COMPILED_SPECS[id(config)] = (config, specs)
+    return specs
+
+
+def _spec_of(config, unit_type, upgraded):
+    spec = compile_unit_specs(config)[unit_type]
+    return spec.upgrade_spec if upgraded else spec
+
+
 class GameUnit:
     """Holds information about a Unit. 
 
@@ -30,51 +129,51 @@ class GameUnit:
         * shieldPerUnit (float): how much shield is given per unit
         * pending_removal (boolean): If this unit is marked for removal by its owner
         * upgraded (boolean): If this unit is upgraded
+        * spec (:obj: UnitSpec): The shared record the stats above are read from
 
     """
+    __slots__ = ("spec", "player_index", "health", "x", "y", "pending_removal")
+
     def __init__(self, unit_type, config, player_index=None, health=None, x=-1, y=-1):
         """ Initialize unit variables using args passed
 
         """
-        self.unit_type = unit_type
-        self.config = config
+        self.spec = compile_unit_specs(config)[unit_type]
         self.player_index = player_index
         self.pending_removal = False
-        self.upgraded = False
         self.x = x
         self.y = y
-        self.__serialize_type()
-        self.health = self.max_health if not health else health
-
-    def __serialize_type(self):
-        from .game_state import STRUCTURE_TYPES, UNIT_TYPE_TO_INDEX, SUPPORT
-        type_config = self.config["unitInformation"][UNIT_TYPE_TO_INDEX[self.unit_type]]
-        self.stationary = type_config["unitCategory"] == 0
-        self.speed = type_config.get("speed", 0)
-        self.damage_f = type_config.get("attackDamageTower", 0)
-        self.damage_i = type_config.get("attackDamageWalker", 0)
-        self.attackRange = type_config.get("attackRange", 0)
-        self.shieldRange = type_config.get("shieldRange", 0)
-        self.max_health = type_config.get("startHealth", 0)
-        self.shieldPerUnit = type_config.get("shieldPerUnit", 0)
-        self.shieldBonusPerY = type_config.get("shieldBonusPerY", 0)
-        self.cost = [type_config.get("cost1", 0), type_config.get("cost2", 0)]
+        self.health = self.spec.max_health if not health else health
 
+    unit_type = property(attrgetter("spec.unit_type"))
+    config = property(attrgetter("spec.config"))
+    upgraded = property(attrgetter("spec.upgraded"))
+    stationary = property(attrgetter("spec.stationary"))
+    speed = property(attrgetter("spec.speed"))
+    damage_f = property(attrgetter("spec.damage_f"))
+    damage_i = property(attrgetter("spec.damage_i"))
+    attackRange = property(attrgetter("spec.attackRange"))
+    shieldRange = property(attrgetter("spec.shieldRange"))
+    max_health = property(attrgetter("spec.max_health"))
+    shieldPerUnit = property(attrgetter("spec.shieldPerUnit"))
+    shieldBonusPerY = property(attrgetter("spec.shieldBonusPerY"))
 
-    def upgrade(self):
-        from .game_state import UNIT_TYPE_TO_INDEX
-        type_config = self.config["unitInformation"][UNIT_TYPE_TO_INDEX[self.unit_type]].get("upgrade", {})
-        self.speed = type_config.get("speed", self.speed)
-        self.damage_f = type_config.get("attackDamageTower", self.damage_f)
-        self.damage_i = type_config.get("attackDamageWalker", self.damage_i)
-        self.attackRange = type_config.get("attackRange", self.attackRange)
-        self.shieldRange = type_config.get("shieldRange", self.shieldRange)
-        self.max_health = type_config.get("startHealth", self.max_health)
-        self.shieldPerUnit = type_config.get("shieldPerUnit", self.shieldPerUnit)
-        self.shieldBonusPerY = type_config.get("shieldBonusPerY", self.shieldBonusPerY)
-        self.cost = [type_config.get("cost1", 0) + self.cost[0], type_config.get("cost2", 0) + self.cost[1]]
-        self.upgraded = True
+    @property
+    def cost(self):
+        return list(self.spec.cost)
 
+    def __copy__(self):
+        clone = GameUnit.__new__(GameUnit)
+        clone.spec = self.spec
+        clone.player_index = self.player_index
+        clone.health = self.health
+        clone.x = self.x
+        clone.y = self.y
+        clone.pending_removal = self.pending_removal
+        return clone
+
+    def upgrade(self):
+        self.spec = self.spec.upgrade_spec
 
     def __toString(self):
         owner = "Friendly" if self.player_index == 0 else "Enemy"
@@ -87,3 +186,77 @@ class GameUnit:
     def __repr__(self):
         return self.__toString()
 
+
+
+class UnitStack:
+    """A number of mobile units of one type and owner on one location, kept as a health per unit instead of a GameUnit each
+
+    GameMap stores the mobile units added by add_unit and GameState.attempt_spawn as UnitStacks, so a wave
+    costs the same to spawn and store whatever its size. GameUnits are only built when the location is read with game_map[x, y].
+
+    Attributes :
+        * spec (:obj: UnitSpec): The shared stats of the units
+        * player_index (integer): The player that controls the units
+        * x (integer): The x coordinate of the units
+        * y (integer): The y coordinate of the units
+        * healths (array): The current health of every unit in the stack
+
+    """
+    __slots__ = ("spec", "player_index", "x", "y", "healths")
+
+    def __init__(self, unit_type, config, player_index=0, count=1, x=-1, y=-1, health=None):
+        self.spec = compile_unit_specs(config)[unit_type]
+        self.player_index = player_index
+        self.x = x
+        self.y = y
+        self.healths = array("d", [self.spec.max_health if not health else health]) * count
+
+    unit_type = property(attrgetter("spec.unit_type"))
+    config = property(attrgetter("spec.config"))
+
+    @property
+    def count(self):
+        return len(self.healths)
+
+    def __len__(self):
+        return len(self.healths)
+
+    def __copy__(self):
+        clone = UnitStack.__new__(UnitStack)
+        clone.spec = self.spec
+        clone.player_index = self.player_index
+        clone.x = self.x
+        clone.y = self.y
+        clone.healths = array("d", self.healths)
+        return clone
+
+    def push(self, count, health=None):
+        """Adds count units to the stack, at full health unless health is given
+        """
+        self.healths.extend(array("d", [self.spec.max_health if not health else health]) * count)
+
+    def units(self):
+        """Builds a GameUnit for every unit of the stack
+
+        Returns:
+            A new list of GameUnits, in the order they were pushed
+
+        """
+        units = []
+        for health in self.healths:
+            unit = GameUnit.__new__(GameUnit)
+            unit.spec = self.spec
+            unit.player_index = self.player_index
+            unit.health = health
+            unit.x = self.x
+            unit.y = self.y
+            unit.pending_removal = False
+            units.append(unit)
+        return units
+
+    def __str__(self):
+        owner = "Friendly" if self.player_index == 0 else "Enemy"
+        return "{} {} x{} location: {}".format(owner, self.unit_type, len(self.healths), [self.x, self.y])
+
+    def __repr__(self):
+        return self.__str__()
@@ -23,6 +23,7 @@ Advanced strategy tips:
 class AlgoStrategy(gamelib.AlgoCore):
     def __init__(self):
         super().__init__()
+        self.subscribe("breach", self.on_breach)
         seed = random.randrange(maxsize)
         random.seed(seed)
         gamelib.debug_write('Random seed: {}'.format(seed))
@@ -31,14 +32,12 @@ class AlgoStrategy(gamelib.AlgoCore):
         self.last_support_update = 0
         self.scored_on_locations = [] # locations where opponent scored on us
     
-    def on_action_frame(self, frame_str):
-        state = json.loads(frame_str)
-        for breach in state["events"]["breach"]:
-            loc = breach[0]
-            owner = breach[4]
-            # owner==2 means opponent scored on us
-            if owner == 2:
-                self.scored_on_locations.append(loc)
+    def on_breach(self, breach, frame):
+        loc = breach[0]
+        owner = breach[4]
+        # owner==2 means opponent scored on us
+        if owner == 2:
+            self.scored_on_locations.append(loc)
 
     def on_game_start(self, config):
         """ 
@@ -65,6 +64,9 @@ class AlgoStrategy(gamelib.AlgoCore):
                 self.sectors[c // 7].append([c,r])
         self.start_points = [[4,12], [10,12], [17,12], [23,12]]
 
+        # Forked last, so the workers see everything set up above
+        self.simulation_pool = gamelib.SimulationPool(config, self.simulate_location)
+
     def on_turn(self, turn_state):
         game_state = gamelib.GameState(self.config, turn_state)
         gamelib.debug_write('Turn {}'.format(game_state.turn_number))
@@ -450,8 +452,7 @@ class AlgoStrategy(gamelib.AlgoCore):
             if game_state.can_spawn(SCOUT, [14+i,i]):
                 location_options.append([14+i,i])
 
-        for location in location_options:
-            path = game_state.find_path_to_edge(location)
+        for location, path in zip(location_options, game_state.find_paths_to_edge_many(location_options)):
             damage = 0
             for path_location in path:
                 damage += len(game_state.get_attackers(path_location, 0)) * gamelib.GameUnit(TURRET, game_state.config).damage_i
@@ -475,8 +476,6 @@ class AlgoStrategy(gamelib.AlgoCore):
         # 4 stores scout damage to supports 
         # 5 stores the starting location
         # 6 stores set of all attackers along this path
-        path_dmg: list[tuple[int,int,list[int]]]= []
-        
         location_options = []
         # game_state.get_target(attacking_unit)
         for i in range(14):
@@ -486,92 +485,10 @@ class AlgoStrategy(gamelib.AlgoCore):
                 location_options.append([14+i,i])
                 
         
-        TEMP_SCOUT  = gamelib.GameUnit(SCOUT, game_state.config)
-        SCOUT_DAMAGE = TEMP_SCOUT.damage_f
-        SCOUT_HP = TEMP_SCOUT.max_health
-        
-        edge_locs = []
-        for i in range(4):
-            edge_locs.append(game_state.game_map.get_edge_locations(i))
+        # Batch the starting paths, when evaluating in this process the forks then read them from the shared path cache
+        game_state.find_paths_to_edge_many(location_options)
         
-        for location in location_options:
-            temp_state :gamelib.GameState = copy.deepcopy(game_state)
-            dead_scouts = 0
-            edge = temp_state.get_target_edge(location)
-            path = temp_state.find_path_to_edge(location)
-            scout_damage_to_turret = 0
-            scout_damage_to_wall = 0
-            scout_damage_to_support = 0
-            turret_damage_to_scout = 0
-            
-            all_attackers: set[tuple[int,int]] = set()
-            
-            path_index = 0
-            cur_hp = SCOUT_HP + 3 # hardcode + 3 for shield
-            
-            while path_index < len(path):
-                path_location = path[path_index]
-                attackers : list[gamelib.GameUnit] = temp_state.get_attackers(path_location, 0)
-                temp_state.game_map.add_unit(SCOUT, path_location)
-                
-                remaining_scouts_to_attack = num_scouts - dead_scouts
-                
-                while (remaining_scouts_to_attack > 0):
-                    target = temp_state.get_target(temp_state.game_map[path_location][0])
-                    if target:
-                        max_dmg = remaining_scouts_to_attack * SCOUT_DAMAGE
-                        if target.health <= max_dmg:
-                            if target.unit_type == TURRET:
-                                scout_damage_to_turret += target.health
-                            elif target.unit_type == WALL:
-                                scout_damage_to_wall += target.health
-                            elif target.unit_type == SUPPORT:
-                                scout_damage_to_support += target.health
-                            
-                            temp_state.game_map.remove_unit([target.x, target.y])
-                            # after destroying a structure, recalculate the path
-                            path = temp_state.find_path_to_edge(path_location, edge)
-                            # gamelib.debug_write(str(path))
-                            path_index = 0
-                            
-                            remaining_scouts_to_attack -= math.ceil(target.health / SCOUT_DAMAGE)
-                        else:
-                            target.health -= max_dmg
-                            if target.unit_type == TURRET:
-                                scout_damage_to_turret += max_dmg
-                            elif target.unit_type == WALL:
-                                scout_damage_to_wall += max_dmg
-                            elif target.unit_type == SUPPORT:
-                                scout_damage_to_support += max_dmg
-                            break
-                    else: 
-                        break
-                
-                temp_state.game_map.remove_unit(path_location)
-                
-                
-                
-                # gamelib.debug_write(f"{location} path loc: {path_location} num attackers: {len(attackers)}")
-                
-                for attacker in attackers:
-                    all_attackers.add((attacker.x, attacker.y))
-                    if num_scouts == dead_scouts: 
-                        break
-                    turret_damage_to_scout += min(attacker.damage_i, cur_hp)
-                    cur_hp -= attacker.damage_i
-                    if cur_hp <= 0:
-                        dead_scouts += 1
-                        cur_hp = SCOUT_HP + 3
-                        # gamelib.debug_write("SCOUT DIED")
-                        
-                
-                path_index += 1
-            
-            survived = num_scouts-dead_scouts
-            if path[-1] not in edge_locs[edge]:
-                survived = 0
-            
-            path_dmg.append((survived, turret_damage_to_scout, scout_damage_to_turret, scout_damage_to_wall, scout_damage_to_support, location, all_attackers))
+        path_dmg = self.simulation_pool.evaluate_spawns(game_state, location_options, num_scouts)
         # Python is a stable sort, so we sort by num surviving scouts, then by scout damage to supports, then by scout damage to turrets, then by scout damage to walls
         path_dmg = sorted(path_dmg, key = lambda x: x[3], reverse=True)
         path_dmg = sorted(path_dmg, key = lambda x: x[2], reverse=True)
@@ -593,6 +510,100 @@ class AlgoStrategy(gamelib.AlgoCore):
         return (path_dmg[index][5], path_dmg[index][0]) #return location and num surviving
 
 
+    def simulate_location(self, temp_state : gamelib.GameState, location, num_scouts:int):
+        # Sends num_scouts scouts from location on temp_state, which it modifies, and returns their path_dmg entry, see full_sim
+        TEMP_SCOUT  = gamelib.GameUnit(SCOUT, temp_state.config)
+        SCOUT_DAMAGE = TEMP_SCOUT.damage_f
+        SCOUT_HP = TEMP_SCOUT.max_health
+        
+        edge_locs = []
+        for i in range(4):
+            edge_locs.append(temp_state.game_map.get_edge_locations(i))
+        
+        dead_scouts = 0
+        edge = temp_state.get_target_edge(location)
+        path = temp_state.find_path_to_edge(location)
+        pathing = None  # persistent path finder, created on the first kill
+        scout_damage_to_turret = 0
+        scout_damage_to_wall = 0
+        scout_damage_to_support = 0
+        turret_damage_to_scout = 0
+        
+        all_attackers: set[tuple[int,int]] = set()
+        
+        path_index = 0
+        cur_hp = SCOUT_HP + 3 # hardcode + 3 for shield
+        
+        while path_index < len(path):
+            path_location = path[path_index]
+            attackers : list[gamelib.GameUnit] = temp_state.get_attackers(path_location, 0)
+            temp_state.game_map.add_unit(SCOUT, path_location)
+            
+            remaining_scouts_to_attack = num_scouts - dead_scouts
+            
+            while (remaining_scouts_to_attack > 0):
+                target = temp_state.get_target(temp_state.game_map[path_location][0])
+                if target:
+                    max_dmg = remaining_scouts_to_attack * SCOUT_DAMAGE
+                    if target.health <= max_dmg:
+                        if target.unit_type == TURRET:
+                            scout_damage_to_turret += target.health
+                        elif target.unit_type == WALL:
+                            scout_damage_to_wall += target.health
+                        elif target.unit_type == SUPPORT:
+                            scout_damage_to_support += target.health
+                        
+                        temp_state.game_map.remove_unit([target.x, target.y])
+                        # after destroying a structure, repair the path instead of searching again
+                        if pathing is None:
+                            pathing = gamelib.ShortestPathFinder()
+                            pathing.track_edge(temp_state, edge_locs[edge])
+                        else:
+                            pathing.unblock([target.x, target.y])
+                        path = pathing.path_from(path_location)
+                        # gamelib.debug_write(str(path))
+                        path_index = 0
+                        
+                        remaining_scouts_to_attack -= math.ceil(target.health / SCOUT_DAMAGE)
+                    else:
+                        target.health -= max_dmg
+                        if target.unit_type == TURRET:
+                            scout_damage_to_turret += max_dmg
+                        elif target.unit_type == WALL:
+                            scout_damage_to_wall += max_dmg
+                        elif target.unit_type == SUPPORT:
+                            scout_damage_to_support += max_dmg
+                        break
+                else: 
+                    break
+            
+            temp_state.game_map.remove_unit(path_location)
+            
+            
+            
+            # gamelib.debug_write(f"{location} path loc: {path_location} num attackers: {len(attackers)}")
+            
+            for attacker in attackers:
+                all_attackers.add((attacker.x, attacker.y))
+                if num_scouts == dead_scouts: 
+                    break
+                turret_damage_to_scout += min(attacker.damage_i, cur_hp)
+                cur_hp -= attacker.damage_i
+                if cur_hp <= 0:
+                    dead_scouts += 1
+                    cur_hp = SCOUT_HP + 3
+                    # gamelib.debug_write("SCOUT DIED")
+                    
+            
+            path_index += 1
+        
+        survived = num_scouts-dead_scouts
+        if path[-1] not in edge_locs[edge]:
+            survived = 0
+        
+        return (survived, turret_damage_to_scout, scout_damage_to_turret, scout_damage_to_wall, scout_damage_to_support, location, all_attackers)
+
+
     def least_damage_spawn_location_simulation(self, game_state, num_scouts:int):
         # Returns the location, and also the number of simulated scouts that make it through
         # 0 stores turret damage to scout, 1 stores scout damage to turret, 2 stores the starting location
@@ -606,8 +617,7 @@ class AlgoStrategy(gamelib.AlgoCore):
             if game_state.can_spawn(SCOUT, [14+i,i]):
                 location_options.append([14+i,i])
         dead_scouts = 0
-        for location in location_options:
-            path = game_state.find_path_to_edge(location)
+        for location, path in zip(location_options, game_state.find_paths_to_edge_many(location_options)):
             scout_damage_to_turret = 0
             turret_damage_to_scout = 0
             dead_attackers: set[list[int,int]] = {}
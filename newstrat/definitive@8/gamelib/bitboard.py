@@ -0,0 +1,107 @@
+"""
+Bitboards are Python ints with one bit per cell, bit x * ARENA_SIZE + y for location [x, y],
+the same cell ids the rest of gamelib uses. Set questions about the board such as
+"which columns hold a structure" or "how many of these cells are walls" become a few
+integer operations instead of loops over locations.
+
+GameMap.structure_mask gives the masks of the structures on the board, the helpers below
+combine and read them.
+"""
+from .geometry import ARENA_SIZE, HALF_ARENA, ARENA_CELLS, EDGES, locations_in_range
+
+ARENA_MASK = sum(1 << cell for cell, _, _ in ARENA_CELLS)
+# Every cell of column x, inside the arena or not, is one run of ARENA_SIZE bits
+COLUMN_MASKS = tuple(((1 << ARENA_SIZE) - 1) << (x * ARENA_SIZE) for x in range(ARENA_SIZE))
+ROW_MASKS = tuple(sum(1 << (x * ARENA_SIZE + y) for x in range(ARENA_SIZE)) for y in range(ARENA_SIZE))
+# The half of the arena each player builds on, indexed by player_index
+HALF_MASKS = (ARENA_MASK & sum(ROW_MASKS[:HALF_ARENA]), ARENA_MASK & sum(ROW_MASKS[HALF_ARENA:]))
+# The cells of each edge, indexed like the GameMap edge constants
+EDGE_MASKS = tuple(sum(1 << (x * ARENA_SIZE + y) for x, y in edge) for edge in EDGES)
+_NOT_FIRST_ROW = ~ROW_MASKS[0]
+_NOT_LAST_ROW = ~ROW_MASKS[ARENA_SIZE - 1]
+# (radius, hit_radius) -> {cell: mask of the cells in range of it}
+_RANGE_MASKS = {}
+
+
+def bit(location):
+    """Gets the mask with only the given location set
+    """
+    return 1 << (int(location[0]) * ARENA_SIZE + int(location[1]))
+
+
+def mask_of(locations):
+    """Gets the mask of a list of locations
+    """
+    mask = 0
+    for x, y in locations:
+        mask |= 1 << (int(x) * ARENA_SIZE + int(y))
+    return mask
+
+
+def locations_of(mask):
+    """Gets the locations set in a mask, ordered by x then y like a loop over x and y would visit them
+    """
+    locations = []
+    while mask:
+        low = mask & -mask
+        x, y = divmod(low.bit_length() - 1, ARENA_SIZE)
+        locations.append([x, y])
+        mask ^= low
+    return locations
+
+
+def popcount(mask):
+    """Gets the number of cells set in a mask
+    """
+    return bin(mask).count("1")
+
+
+def columns_of(mask):
+    """Gets the x coordinates of the columns that have at least one cell set in the mask
+    """
+    return [x for x in range(ARENA_SIZE) if mask & COLUMN_MASKS[x]]
+
+
+def neighbors(mask):
+    """Gets the cells next to any cell of the mask, in the four directions units move in, clipped to the arena
+    """
+    return ((mask << 1 & _NOT_FIRST_ROW) | (mask >> 1 & _NOT_LAST_ROW) | mask << ARENA_SIZE | mask >> ARENA_SIZE) & ARENA_MASK
+
+
+def within_range(locations, radius, hit_radius):
+    """Gets the cells GameMap.get_locations_in_range would return around any of the locations
+
+    Args:
+        locations: The centers, inside the arena
+        radius: The radius of the search area, usually an attackRange or shieldRange from the config
+        hit_radius: The getHitRadius from the config
+
+    """
+    table = _RANGE_MASKS.setdefault((radius, hit_radius), {})
+    mask = 0
+    for x, y in locations:
+        cell = int(x) * ARENA_SIZE + int(y)
+        around = table.get(cell)
+        if around is None:
+            around = table[cell] = mask_of(locations_in_range(int(x), int(y), radius, hit_radius))
+        mask |= around
+    return mask
+
+
+def flood_fill(seed, free):
+    """Grows seed through the free cells
+
+    Args:
+        seed: The mask to start from, cells that are not free are dropped
+        free: The mask of cells units can move through, usually ARENA_MASK & ~GameMap.structure_mask()
+
+    Returns:
+        The mask of every free cell connected to the seed
+
+    """
+    filled = seed & free
+    while True:
+        grown = (filled | neighbors(filled)) & free
+        if grown == filled:
+            return filled
+        filled = grown
@@ -0,0 +1,113 @@
+"""
+Static facts about the diamond shaped arena, computed once at import time.
+
+Cells are addressed by id = x * ARENA_SIZE + y throughout gamelib. GameMap, GameState
+and the path finders read the tables below instead of redoing the arithmetic on every call.
+"""
+import math
+
+ARENA_SIZE = 28
+HALF_ARENA = 14
+NUM_CELLS = ARENA_SIZE * ARENA_SIZE
+
+
+def _diamond_contains(x, y):
+    """The arithmetic diamond test, for coordinates that cannot index the tables"""
+    if y < HALF_ARENA:
+        return HALF_ARENA - y - 1 <= x <= HALF_ARENA + y
+    return y - HALF_ARENA <= x <= ARENA_SIZE + HALF_ARENA - y - 1
+
+# 1 for every cell id inside the arena
+IN_BOUNDS = bytes(1 if _diamond_contains(x, y) else 0 for x in range(ARENA_SIZE) for y in range(ARENA_SIZE))
+
+
+def in_arena_bounds(x, y):
+    """Checks if [x, y] is on the board, same result as GameMap.in_arena_bounds
+    """
+    try:
+        return 0 <= x < ARENA_SIZE and 0 <= y < ARENA_SIZE and IN_BOUNDS[x * ARENA_SIZE + y] == 1
+    except TypeError:
+        return _diamond_contains(x, y)
+
+# (id, x, y) for every cell inside the arena, ordered by id
+ARENA_CELLS = tuple((x * ARENA_SIZE + y, x, y) for x in range(ARENA_SIZE) for y in range(ARENA_SIZE) if IN_BOUNDS[x * ARENA_SIZE + y])
+# (x, y) for every cell inside the arena in the order GameMap iterates them, row by row from the bottom
+DIAMOND_ORDER = tuple((x, y) for y in range(ARENA_SIZE) for x in range(ARENA_SIZE) if IN_BOUNDS[x * ARENA_SIZE + y])
+
+
+def _build_neighbor_table():
+    """For every cell id, the in-bounds neighbors in the order the pathing rules visit them: up, down, right, left"""
+    table = [()] * NUM_CELLS
+    for cell, x, y in ARENA_CELLS:
+        table[cell] = tuple(nx * ARENA_SIZE + ny for nx, ny in ((x, y + 1), (x, y - 1), (x + 1, y), (x - 1, y))
+                            if 0 <= nx < ARENA_SIZE and 0 <= ny < ARENA_SIZE and IN_BOUNDS[nx * ARENA_SIZE + ny])
+    return tuple(table)
+
+NEIGHBORS = _build_neighbor_table()
+
+# (x, y) of every edge cell, indexed and ordered like GameMap.get_edges: top right, top left, bottom left, bottom right
+EDGES = (
+    tuple((HALF_ARENA + num, ARENA_SIZE - 1 - num) for num in range(HALF_ARENA)),
+    tuple((HALF_ARENA - 1 - num, ARENA_SIZE - 1 - num) for num in range(HALF_ARENA)),
+    tuple((HALF_ARENA - 1 - num, num) for num in range(HALF_ARENA)),
+    tuple((HALF_ARENA + num, num) for num in range(HALF_ARENA)),
+)
+EDGE_SETS = tuple(frozenset(edge) for edge in EDGES)
+# The edges each player can spawn mobile units on, indexed by player_index
+SPAWN_EDGE_SETS = (EDGE_SETS[2] | EDGE_SETS[3], EDGE_SETS[0] | EDGE_SETS[1])
+
+# Squared distance and distance between two cells, indexed by [abs(x1 - x2)][abs(y1 - y2)]
+SQUARED_DISTANCES = tuple(tuple(dx * dx + dy * dy for dy in range(ARENA_SIZE)) for dx in range(ARENA_SIZE))
+DISTANCES = tuple(tuple(math.sqrt(squared) for squared in row) for row in SQUARED_DISTANCES)
+
+
+_STENCILS = {}
+_RANGE_TABLES = {}
+
+
+def range_stencil(radius, hit_radius):
+    """Gets the (dx, dy) offsets GameMap.get_locations_in_range covers around a location
+
+    Args:
+        radius: The radius of the search area, usually an attackRange or shieldRange from the config
+        hit_radius: The getHitRadius from the config
+
+    Returns:
+        A tuple of offsets ordered by dx then dy, inside the bounding square of the search
+        and closer than radius + hit_radius to the center
+
+    """
+    key = (radius, hit_radius)
+    stencil = _STENCILS.get(key)
+    if stencil is None:
+        search_radius = math.ceil(radius)
+        stencil = _STENCILS[key] = tuple((dx, dy) for dx in range(-search_radius, search_radius + 1)
+                                         for dy in range(-search_radius, search_radius + 1)
+                                         if math.sqrt(dx * dx + dy * dy) < radius + hit_radius)
+    return stencil
+
+
+def locations_in_range(x, y, radius, hit_radius):
+    """Gets the cells around an in-bounds cell [x, y] that GameMap.get_locations_in_range returns
+
+    The stencil is clipped to the board the first time a center is asked for and the
+    resulting tuple of (x, y) is kept, so later queries are a single lookup.
+    """
+    table = _RANGE_TABLES.get((radius, hit_radius))
+    if table is None:
+        table = _RANGE_TABLES[radius, hit_radius] = [None] * NUM_CELLS
+    cell = x * ARENA_SIZE + y
+    locations = table[cell]
+    if locations is None:
+        locations = table[cell] = tuple((x + dx, y + dy) for dx, dy in range_stencil(radius, hit_radius)
+                                        if in_arena_bounds(x + dx, y + dy))
+    return locations
+
+
+def distance(x1, y1, x2, y2):
+    """Euclidean distance, same result as GameMap.distance_between_locations
+    """
+    try:
+        return DISTANCES[abs(x1 - x2)][abs(y1 - y2)]
+    except (IndexError, TypeError):
+        return math.sqrt((x1 - x2)**2 + (y1 - y2)**2)
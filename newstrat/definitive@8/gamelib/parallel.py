@@ -0,0 +1,177 @@
+"""
+Spreading spawn location evaluations over a pool of worker processes.
+
+The workers are forked once, when the pool is created at the start of the game, so they inherit the
+algo, its config and the unit specs already compiled. Each evaluation then only ships a board snapshot,
+a tuple of the structures and resources, which a worker turns back into a GameState once per board.
+Where processes cannot be forked, or a worker fails, evaluations run one after the other in this process.
+"""
+import math
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from .game_state import GameState
+from .simulator import Simulator
+from .util import debug_write
+
+# The evaluation function of every pool created by this process, forked workers inherit them
+_FUNCTIONS = {}
+# Worker side: the config of the game and the last board restored from a snapshot
+_WORKER = {"config": None, "snapshot": None, "state": None}
+
+
+def board_snapshot(game_state):
+    """Gets a compact, picklable copy of the structures and resources of a GameState
+
+    Returns:
+        (turn_number, p1Stats, p2Stats, structures) where structures holds
+        (unit type index, player_index, x, y, health, upgraded, pending_removal) for every structure
+
+    """
+    type_index = {info.get("shorthand"): index for index, info in enumerate(game_state.config["unitInformation"])}
+    game_map = game_state.game_map
+    structures = []
+    for location in game_map:
+        unit = game_map.get_structure(location)
+        if unit is not None:
+            structures.append((type_index[unit.unit_type], unit.player_index, unit.x, unit.y, unit.health, unit.upgraded, unit.pending_removal))
+    stats = tuple((health, game_state.get_resource(game_state.SP, player_index), game_state.get_resource(game_state.MP, player_index), time)
+                  for player_index, health, time in ((0, game_state.my_health, game_state.my_time), (1, game_state.enemy_health, game_state.enemy_time)))
+    return (game_state.turn_number,) + stats + (tuple(structures),)
+
+
+def restore_board(config, snapshot):
+    """Builds the GameState a board_snapshot was taken from, without the units and actions that were not structures
+
+    Args:
+        config: The config of the game
+        snapshot: A tuple returned by board_snapshot
+
+    """
+    turn_number, p1_stats, p2_stats, structures = snapshot
+    unit_information = config["unitInformation"]
+    remove_index = next(index for index, info in enumerate(unit_information) if info.get("shorthand") == "RM")
+    upgrade_index = next(index for index, info in enumerate(unit_information) if info.get("shorthand") == "UP")
+    units = ([[] for _ in unit_information], [[] for _ in unit_information])
+    for number, (type_index, player_index, x, y, health, upgraded, pending_removal) in enumerate(structures):
+        units[player_index][type_index].append([x, y, health, str(number)])
+        if upgraded:
+            units[player_index][upgrade_index].append([x, y, health, str(number)])
+        if pending_removal:
+            units[player_index][remove_index].append([x, y, health, str(number)])
+    message = {"turnInfo": [0, turn_number, -1], "p1Stats": list(p1_stats), "p2Stats": list(p2_stats),
+               "p1Units": units[0], "p2Units": units[1], "events": {}}
+    state = GameState(config, message)
+    state.suppress_warnings(True)
+    return state
+
+
+def simulate_spawn(game_state, location, unit_type, num=1, player_index=0):
+    """Sends num units of unit_type from location through a Simulator, the default evaluation of SimulationPool
+
+    Returns:
+        (units that breached, breach damage, damage dealt to structures, units lost)
+
+    """
+    simulator = Simulator(game_state)
+    simulator.spawn(unit_type, location, num, player_index)
+    result = simulator.run()
+    dealt = sum(damage for (x, y), damage in result.structure_damage.items()
+                if game_state.game_map.get_structure([x, y]).player_index != player_index)
+    breached = sum(1 for breach in result.breaches if breach[4] == player_index)
+    return breached, result.breach_damage[player_index], dealt, result.units_lost[player_index]
+
+
+def _start_worker(config):
+    _WORKER["config"] = config
+    # Compiles the unit specs and sets the GameState constants once, before the first evaluation
+    restore_board(config, (0, (30, 0, 0, 0), (30, 0, 0, 0), ()))
+
+
+def _ping(_):
+    return os.getpid()
+
+
+def _evaluate_chunk(key, snapshot, locations, args):
+    if _WORKER["snapshot"] != snapshot:
+        _WORKER["state"] = restore_board(_WORKER["config"], snapshot)
+        _WORKER["snapshot"] = snapshot
+    evaluate = _FUNCTIONS[key]
+    state = _WORKER["state"]
+    return [evaluate(state.fork(), location, *args) for location in locations]
+
+
+class SimulationPool:
+    """Evaluates spawn locations in parallel on forked worker processes
+
+    Create it in on_game_start, after everything the evaluation function reads from the algo is set up,
+    since the workers keep the copy of the algo they were forked with. Anything that changes during
+    the game has to be passed as an argument of evaluate_spawns.
+
+    Attributes :
+        * processes (int): The number of worker processes, 0 when evaluating in this process
+        * evaluate (function): Called as evaluate(game_state, location, *args) for every location,
+          on a fork of the board it may modify. Its result has to be picklable
+
+    """
+    def __init__(self, config, evaluate=simulate_spawn, processes=None):
+        self.config = config
+        self.evaluate = evaluate
+        if processes is None:
+            processes = os.cpu_count() or 1
+            # A single core gains nothing from a second process
+            processes = processes if processes > 1 else 0
+        self.processes = processes
+        self.__executor = None
+        self.__key = id(self)
+        if processes > 0:
+            self.__start()
+
+    def __start(self):
+        _FUNCTIONS[self.__key] = self.evaluate
+        try:
+            context = multiprocessing.get_context("fork")
+            executor = ProcessPoolExecutor(self.processes, mp_context=context, initializer=_start_worker, initargs=(self.config,))
+            # Starts every worker now rather than during the first turn that needs them
+            list(executor.map(_ping, range(self.processes)))
+        except Exception as error:
+            debug_write("Could not start {} simulation workers ({!r}), evaluating in this process".format(self.processes, error))
+            self.processes = 0
+            return
+        self.__executor = executor
+
+    def evaluate_spawns(self, game_state, locations, *args):
+        """Evaluates every location on the board of game_state
+
+        Args:
+            game_state: The board to evaluate on, it is not modified
+            locations: The locations to pass to the evaluation function, one call each
+            args: Passed to the evaluation function after the location
+
+        Returns:
+            The results of the evaluation function, in the order of locations
+
+        """
+        locations = list(locations)
+        if self.__executor is None or len(locations) < 2:
+            return [self.evaluate(game_state.fork(), location, *args) for location in locations]
+        snapshot = board_snapshot(game_state)
+        size = math.ceil(len(locations) / self.processes)
+        try:
+            futures = [self.__executor.submit(_evaluate_chunk, self.__key, snapshot, locations[start:start + size], args)
+                       for start in range(0, len(locations), size)]
+            return [result for future in futures for result in future.result()]
+        except Exception as error:
+            debug_write("Simulation workers failed ({!r}), evaluating in this process from now on".format(error))
+            self.close()
+            return [self.evaluate(game_state.fork(), location, *args) for location in locations]
+
+    def close(self):
+        """Stops the workers, later evaluations run in this process
+        """
+        if self.__executor is not None:
+            self.__executor.shutdown(wait=False, cancel_futures=True)
+            self.__executor = None
+        self.processes = 0
+        _FUNCTIONS.pop(self.__key, None)
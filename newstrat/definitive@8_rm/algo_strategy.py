@@ -4,7 +4,7 @@ import math
 import copy
 import json
 from sys import maxsize
-from gamelib import GameState, GameMap, GameUnit
+from gamelib import GameState, GameMap, GameUnit, bitboard
 from threshold import ThresholdEstimator
 
 # Shorthand constants set in on_game_start
@@ -20,6 +20,12 @@ class AlgoStrategy(gamelib.AlgoCore):
     """
     def __init__(self):
         super().__init__()
+        self.subscribe("breach", self.on_breach)
+        self.event_stream = gamelib.EventStream()
+        # board_analysis usually finishes early in the action phase, a turn may wait a little for it
+        self.speculation_wait = 0.2
+        # Paths found by analyse_board, which may still run alongside on_turn and so cannot share its cache
+        self.background_path_cache = gamelib.PathCache()
         seed = random.randrange(maxsize)
         random.seed(seed)
         gamelib.debug_write(f"Random seed: {seed}")
@@ -29,6 +35,7 @@ class AlgoStrategy(gamelib.AlgoCore):
 
         # State
         self.support_locations = []
+        self.breach_forecast = None
         self.scored_on = []
         self.sectors = []
         self.start_points = []
@@ -148,10 +155,18 @@ class AlgoStrategy(gamelib.AlgoCore):
                 for x in range(x_min, x_max + 1):
                     self.support_mask[x][y] = True
 
+        self.evaluation_cache = gamelib.EvaluationCache(config)
+
+        # Forked last, so the workers see everything set up above
+        self.simulation_pool = gamelib.SimulationPool(config, self._simulate_option)
+
     def on_turn(self, turn_state):
         """Main turn entry: offense, defense, support."""
         state = GameState(self.config, turn_state)
+        # Board checks done during the last action phase, None if the board changed since
+        analysis = self.collect("board_analysis", turn_state)
         gamelib.debug_write(f"Turn {state.turn_number}")
+        self.evaluation_cache.advance(state)
         #state.suppress_warnings(True)
 
         # Update turn number
@@ -160,6 +175,8 @@ class AlgoStrategy(gamelib.AlgoCore):
 
         # # Monitor resources and unit health
         # self._monitor_resources_and_units(state)
+        # Only the last action phase is read from the event stream, drop the turns before it
+        self.event_stream.discard_before(state.turn_number - 1)
 
         # --- Check for last resort ---
         if state.turn_number >= 4:
@@ -176,7 +193,7 @@ class AlgoStrategy(gamelib.AlgoCore):
         else:
 
             rim_attack = self.rim_evaluation(state)
-            funnel_attack = self.is_funnel(state)
+            funnel_attack = analysis["funnel"] if analysis else self.is_funnel(state)
             keep_notch = True
 
             gamelib.debug_write(f"opp threshold: {self.opp_threshold}, current resource: {state.get_resources(1)[1]}")
@@ -203,7 +220,7 @@ class AlgoStrategy(gamelib.AlgoCore):
             # opponent has low MP and is unlikely to attack
             elif self.opp_threshold and state.get_resources(1)[1] < self.estimator.confidence_interval()[0]:
                 blocked = self.is_completely_blocked(state)
-                side = self.evaluate_enemy_defense(state)
+                side = analysis["side"] if analysis else self.evaluate_enemy_defense(state)
                 deploypoint = [5, 8] if side == 'l' else [22, 8]
                 scoutamt = state.get_resource(MP) // state.type_cost(SCOUT)[1]
                 self.scout_attack(state, deploypoint, int(scoutamt))
@@ -238,11 +255,14 @@ class AlgoStrategy(gamelib.AlgoCore):
 
 
             if self.resort_side is None:
-                self.resort_side = self.evaluate_enemy_defense(state)
+                self.resort_side = analysis["side"] if analysis else self.evaluate_enemy_defense(state)
                 gamelib.debug_write(f"Resort side: {self.resort_side}")
 
 
 
+            # Where an enemy wave would score this turn, read by improve_defense
+            self.breach_forecast = self.forecast_breaches(state)
+
             # # --- Defense improvements ---
             max_improvements = 12
             for _ in range(max_improvements):
@@ -256,20 +276,37 @@ class AlgoStrategy(gamelib.AlgoCore):
         attack, loc, num = self.should_attack(state)
         self._manage_support(state, loc if 'loc' in locals() else None)
 
+        gamelib.debug_write(f"Evaluation cache: {self.evaluation_cache.stats()}")
         state.submit_turn()
 
-    def on_action_frame(self, turn_str):
+    def on_action_frame(self, frame):
+        """Run the board checks of the next turn while the action phase plays out."""
+        self.speculate("board_analysis", frame, self.analyse_board, frame)
+
+    def analyse_board(self, frame):
+        """Checks that only depend on the structures, run on the background thread.
+
+        The enemy side is only read, so evaluating it on the last frame gives the same answer
+        on_turn would get, as long as no structure was added or destroyed in between.
+        """
+        state = GameState(self.config, frame)
+        state.suppress_warnings(True)
+        state.path_cache = self.background_path_cache
+        return {
+            "funnel": self.is_funnel(state),
+            "side": self.evaluate_enemy_defense(state),
+        }
+
+    def on_breach(self, breach, frame):
         """Stamp breaches with turn so we know where+when they happen."""
-        data = json.loads(turn_str)
-        for breach in data.get("events", {}).get("breach", []):
-            loc, owner = tuple(breach[0]), breach[4]
-            if owner != 1:
-                # record both location and the turn number
-                self.scored_on.append({
-                    "loc": loc,
-                    "turn": self.last_turn  # we'll set last_turn in on_turn
-                })
-                gamelib.debug_write(f"Opponent breached at {loc} on turn {self.last_turn}")
+        loc, owner = tuple(breach[0]), breach[4]
+        if owner != 1:
+            # record both location and the turn number
+            self.scored_on.append({
+                "loc": loc,
+                "turn": self.last_turn  # we'll set last_turn in on_turn
+            })
+            gamelib.debug_write(f"Opponent breached at {loc} on turn {self.last_turn}")
 
     # ------------------------
     # Initial defense
@@ -351,19 +388,12 @@ class AlgoStrategy(gamelib.AlgoCore):
         }
         totals = {'l': 0.0, 'r': 0.0}
 
-        for x in range(28):
-            for y in range(14, 28):
-                loc = [x, y]
-                cell = state.game_map[loc] or []    # treat None as empty
-                for unit in cell:
-                    # skip your own units
-                    if unit.player_index == 0:
-                        continue
-                    weight = WEIGHTS.get((unit.unit_type, unit.upgraded))
-                    if weight is None:
-                        continue
-                    side = 'l' if x < 14 else 'r'
-                    totals[side] += weight
+        # Only enemy walls and turrets on their side carry a weight
+        enemy_defense = (state.game_map.structure_mask(1, WALL) | state.game_map.structure_mask(1, TURRET)) & bitboard.HALF_MASKS[1]
+        for x, y in bitboard.locations_of(enemy_defense):
+            unit = state.game_map.get_structure([x, y])
+            side = 'l' if x < 14 else 'r'
+            totals[side] += WEIGHTS[(unit.unit_type, unit.upgraded)]
 
         gamelib.debug_write(
             f"Enemy defense weighted L={totals['l']:.1f}, R={totals['r']:.1f}"
@@ -505,6 +535,13 @@ class AlgoStrategy(gamelib.AlgoCore):
                 state.attempt_upgrade(loc)
                 return True
 
+        # 4) FORECAST UPGRADES: upgrade the turrets covering the cells predicted enemy breaches walk through
+        if self.breach_forecast is not None:
+            for loc in self.breach_forecast.hot_cells(5, 0):
+                for unit in state.get_attackers(loc, 1):
+                    if unit.unit_type == TURRET and not unit.upgraded and state.attempt_upgrade([unit.x, unit.y]):
+                        return True
+
         # # 4) SYMMETRIC MID-DEFENSE: walls at y=11, turrets at y=10
         # left_x = range(7, 12)
         # right_x = range(22, 17, -1)
@@ -541,20 +578,9 @@ class AlgoStrategy(gamelib.AlgoCore):
         Returns:
             1 if there's a rim with at most 3 consecutive holes in the right, -1 if left , 0 otherwise
         """
-        holes = []
-
-        # Check for holes along the rim
-        for x in range(28):
-            has_structure = False
-            # Check from y=14 onwards in this column
-            for y in range(14, 28):
-                if state.game_map.in_arena_bounds([x, y]) and state.contains_stationary_unit([x, y]):
-                    has_structure = True
-                    break
-
-            # If no structure found in this column, it's a hole
-            if not has_structure:
-                holes.append(x)
+        # Check for holes along the rim: a column with no structure from y=14 onwards is a hole
+        rim = state.game_map.structure_mask() & bitboard.HALF_MASKS[1]
+        holes = [x for x in range(28) if not rim & bitboard.COLUMN_MASKS[x]]
 
         # No holes means perfect rim
         if not holes:
@@ -601,14 +627,10 @@ class AlgoStrategy(gamelib.AlgoCore):
         # Find x-coordinates where paths reach y=14
         rim_x_coords = []
 
-        for start in start_points:
-            # Skip points that are not in bounds
-            if not state.game_map.in_arena_bounds(start):
-                continue
-
-            # Find path to edge
-            path = state.find_path_to_edge(start)
+        # Skip points that are not in bounds, then find all their paths to edge in one batch
+        start_points = [start for start in start_points if state.game_map.in_arena_bounds(start)]
 
+        for path in state.find_paths_to_edge_many(start_points):
             # Skip if no path found
             if not path:
                 continue
@@ -647,32 +669,15 @@ class AlgoStrategy(gamelib.AlgoCore):
             [22,19], [23,18], [24,17]
         ]
 
-        # Track if any path successfully crosses to player territory
-        any_path_crosses = False
-
+        # A path crosses into player territory exactly when its start shares a free
+        # component with some cell of our half, so no pathing is needed
+        reachability = state.get_reachability()
         for start in start_points:
-            # Skip points that are not in bounds
-            if not state.game_map.in_arena_bounds(start):
-                continue
-
-            # Find path to edge
-            path = state.find_path_to_edge(start)
-
-            # Skip if no path found
-            if not path:
-                continue
-
-            # Check if this path crosses from opponent territory to player territory
-            for i in range(1, len(path)):
-                if path[i-1][1] >= 14 and path[i][1] < 14:
-                    # Found a crossing point - not completely blocked
-                    any_path_crosses = True
-                    break
-
-            if any_path_crosses:
+            if reachability.reaches_half(start, 0):
+                # Found a way into player territory - not completely blocked
                 return False
 
-        # If we've checked all starting points and none cross to player territory
+        # If we've checked all starting points and none reach player territory
         return True
 
 
@@ -735,10 +740,7 @@ class AlgoStrategy(gamelib.AlgoCore):
 
     def wall_integrity_check(self, state: GameState) -> bool:
         """Check if the walls are still standing."""
-        nb_walls = 0
-        for loc in self.wallresnd[:6]:
-            if state.contains_stationary_unit(loc):
-                nb_walls += 1
+        nb_walls = bitboard.popcount(bitboard.mask_of(self.wallresnd[:6]) & state.game_map.structure_mask())
         if nb_walls < nb_walls/5:
             return False
         return True
@@ -868,10 +870,16 @@ class AlgoStrategy(gamelib.AlgoCore):
     def should_attack(self, state: GameState):
         mp = state.get_resource(MP)
         scouts = int(mp)
-        loc, survived = self.full_sim(state, scouts)
-        # conditions to go all-in
+        if scouts < 1:
+            return False, [], 0
+        # best location and its metrics for every wave size in one sweep, survivors first
+        sweep = self.full_sweep(state, scouts)
+        loc, metrics = sweep[-1]
+        survived = metrics[0]
+        # conditions to go all-in, with the smallest wave that still finishes the opponent
         if mp >= 8 and state.enemy_health <= 7 and state.enemy_health - survived < -3:
-            return True, loc, scouts
+            num = next(n for n in range(1, scouts + 1) if state.enemy_health - sweep[n - 1][1][0] < -3)
+            return True, sweep[num - 1][0], num
         if mp < 15 + state.turn_number // 10 and (survived <= scouts * 0.6 or mp < 8):
             return False, [], 0
         return True, loc, scouts
@@ -882,6 +890,17 @@ class AlgoStrategy(gamelib.AlgoCore):
     # ------------------------
     # Simulation helpers
     # ------------------------
+    def forecast_breaches(self, state: GameState):
+        """
+        Simulate an enemy scout wave and demolisher wave, as large as the enemy MP allows,
+        from every enemy spawn point against our structures.
+        """
+        enemy_mp = state.get_resource(MP, 1)
+        waves = [(SCOUT, int(enemy_mp // state.type_cost(SCOUT)[1])), (DEMOLISHER, int(enemy_mp // state.type_cost(DEMOLISHER)[1]))]
+        forecast = gamelib.BreachForecast(state, waves)
+        gamelib.debug_write(f"Breach forecast: expected {forecast.expected_damage:.1f}, top lanes {forecast.top_lanes()} in {forecast.seconds * 1000:.0f} ms")
+        return forecast
+
     def full_sim(self, orig_state: GameState, num_scouts: int):
         """
         Simulate num_scouts scouts from all deploy points, return best (loc, survived).
@@ -892,18 +911,210 @@ class AlgoStrategy(gamelib.AlgoCore):
                 if orig_state.can_spawn(SCOUT, pt):
                     options.append(pt)
 
-        best = (-1, None, None)  # (survived, loc, attackers_set)
-        for loc in options:
-            state = copy.deepcopy(orig_state)
-            survive, _, _, _, _, _, atk = self._simulate_path(state, loc, num_scouts)
-            if survive > best[0]:
-                best = (survive, loc, atk)
+        # Batch the starting paths, _simulate_path then reads them from the shared path cache
+        paths = orig_state.find_paths_to_edge_many(options)
+
+        # Options whose walk saw no structure change since they were last simulated come from the cache
+        cache = self.evaluation_cache
+        board = cache.board_key(orig_state)
+        supports = tuple(map(tuple, self.support_locations))
+        results = [cache.get(board, supports, loc, (SCOUT,), num_scouts, path) for loc, path in zip(options, paths)]
+        missing = [index for index, metrics in enumerate(results) if metrics is None]
+        evaluated = self.simulation_pool.evaluate_spawns(orig_state, [options[index] for index in missing], num_scouts, self.support_locations)
+        for index, (metrics, footprint) in zip(missing, evaluated):
+            cache.put(board, supports, options[index], (SCOUT,), num_scouts, metrics, footprint, paths[index])
+            results[index] = metrics
+
+        best = (-1, None)  # (survived, loc)
+        for loc, metrics in zip(options, results):
+            if metrics[0] > best[0]:
+                best = (metrics[0], loc)
 
         return best[1], best[0]
 
-    def _simulate_path(self, state, loc, num_scouts):
-        """Helper to simulate a single scout path. Returns tuple of metrics + attackers set."""
-        temp = copy.deepcopy(state)
+    def full_sweep(self, orig_state: GameState, max_scouts: int):
+        """
+        Simulate every wave size from 1 to max_scouts from all deploy points, sharing the work that does
+        not depend on the size. Entry n-1 of the returned list is (loc, (survived, dmg_to_scout, dmg_turret,
+        dmg_wall, dmg_support)) for the loc full_sim(orig_state, n) returns. Sizes share the evaluation
+        cache with full_sim, a location is simulated again when any of its sizes is missing.
+        """
+        options = []
+        for i in range(13):
+            for pt in ([i,13-i], [14+i,i]):
+                if orig_state.can_spawn(SCOUT, pt):
+                    options.append(pt)
+
+        paths = orig_state.find_paths_to_edge_many(options)
+
+        cache = self.evaluation_cache
+        board = cache.board_key(orig_state)
+        supports = tuple(map(tuple, self.support_locations))
+        sizes = range(1, max_scouts + 1)
+        results = [[cache.get(board, supports, loc, (SCOUT,), n, path) for n in sizes] for loc, path in zip(options, paths)]
+        missing = [index for index, metrics in enumerate(results) if None in metrics]
+        evaluated = self.simulation_pool.evaluate_spawns(orig_state, [options[index] for index in missing], max_scouts, self.support_locations, True)
+        for index, sweep in zip(missing, evaluated):
+            for n, (metrics, footprint) in zip(sizes, sweep):
+                cache.put(board, supports, options[index], (SCOUT,), n, metrics, footprint, paths[index])
+            results[index] = [metrics for metrics, _ in sweep]
+
+        best = [((-1, 0, 0, 0, 0), None)] * max_scouts  # (metrics, loc) per wave size
+        for loc, sweep in zip(options, results):
+            for n, metrics in enumerate(sweep):
+                if metrics[0] > best[n][0][0]:
+                    best[n] = (metrics, loc)
+
+        return [(loc, metrics) for metrics, loc in best]
+
+    def _simulate_option(self, state, loc, num_scouts, support_locations, sweep=False):
+        """
+        (survived, dmg_to_scout, dmg_turret, dmg_wall, dmg_support) of num_scouts scouts from loc and the
+        evaluation cache footprint of their walk, or the list of them for every wave size up to num_scouts if sweep.
+        """
+        if sweep:
+            footprints = {}  # sizes that walked the same cells share a footprint
+            results = []
+            for metrics in self._sweep_path(state, loc, num_scouts, support_locations):
+                walked = tuple(map(tuple, metrics[-1]))
+                if walked not in footprints:
+                    footprints[walked] = self.evaluation_cache.footprint(metrics[-1])
+                results.append((metrics[:5], footprints[walked]))
+            return results
+        metrics = self._simulate_path(state, loc, num_scouts, support_locations)
+        return metrics[:5], self.evaluation_cache.footprint(metrics[-1])
+
+    def _sweep_path(self, state, loc, max_scouts, support_locations=None):
+        """
+        _simulate_path for every wave size from 1 to max_scouts. Returns one
+        (survived, dmg_to_scout, dmg_turret, dmg_wall, dmg_support, walked) tuple per size.
+
+        The attackers, shield and possible targets of a location are computed once and shared by every
+        size, minus what that size destroyed. Paths are computed once per set of destroyed structures,
+        each from a fork of the path finder of the set it grew from. Only health, losses and damage
+        totals and the cells walked are tracked per size.
+        """
+        if support_locations is None:
+            support_locations = self.support_locations
+        scout_unit = GameUnit(SCOUT, state.config)
+        SC_HP, SC_DMG = scout_unit.max_health, scout_unit.damage_f
+        sup_info = self.config["unitInformation"][1]
+        shield_amt = sup_info.get("shieldAmount", 0)
+        base_rng   = sup_info.get("attackRange", 0)
+
+        edge = state.get_target_edge(loc)
+        edge_locations = state.game_map.get_edge_locations(edge)
+        start_path = state.find_path_to_edge(loc) or []
+        finders = {}  # destroyed structures -> persistent path finder
+        paths = {}  # (destroyed structures, location) -> path
+        cells = {}  # location -> (attackers, shielded, targets)
+
+        def cell_info(pt):
+            key = tuple(pt)
+            info = cells.get(key)
+            if info is None:
+                attackers = [((atk.x, atk.y), atk.damage_i) for atk in state.get_attackers(pt, 0)]
+                shielded = False
+                for sup_loc in support_locations:
+                    sup = state.contains_stationary_unit(sup_loc)
+                    if sup and sup.unit_type == SUPPORT:
+                        rng = base_rng + (1 if sup.upgraded else 0)
+                        if self.manhattan(sup_loc, pt) <= rng:
+                            shielded = True
+                            break
+                # Everything get_target compares but health, in the order it scans the units
+                targets = []
+                for tgt_loc in state.game_map._locations_in_range(pt, scout_unit.attackRange):
+                    for unit in state.game_map[tgt_loc]:
+                        if unit.player_index != 0:
+                            targets.append(((unit.x, unit.y), unit, unit.stationary, state.game_map.distance_between_locations(tgt_loc, pt),
+                                            unit.y, -abs(state.HALF_ARENA - 0.5 - unit.x)))
+                info = cells[key] = (attackers, shielded, targets)
+            return info
+
+        results = []
+        for num_scouts in range(1, max_scouts + 1):
+            layout = frozenset()
+            path = start_path
+            health = {}  # damaged structures -> health left
+            dead = 0
+            dmg_turret = dmg_wall = dmg_support = dmg_to_scout = 0
+            walked = []
+            cur_hp = SC_HP
+
+            idx = 0
+            while idx < len(path):
+                pt = path[idx]
+                walked.append(pt)
+                atkers, shielded, targets = cell_info(pt)
+                # a structure destroyed here still fires at this location, as in _simulate_path
+                standing = layout
+
+                # shield buff
+                if shielded:
+                    cur_hp = min(cur_hp + shield_amt, SC_HP + shield_amt)
+
+                # scouts attack structures, choosing as get_target does with this wave's health
+                rem = num_scouts - dead
+                tgt, best_key = None, None
+                for tgt_loc, unit, stationary, distance, y, x_distance in targets:
+                    if tgt_loc in layout:
+                        continue
+                    key = (stationary, distance, health.get(tgt_loc, unit.health), y, x_distance)
+                    if best_key is None or key < best_key:
+                        tgt, best_key = unit, key
+                if tgt is not None:
+                    tgt_hp, maxd = best_key[2], rem * SC_DMG
+                    dealt = tgt_hp if tgt_hp <= maxd else maxd
+                    if tgt.unit_type == TURRET:   dmg_turret += dealt
+                    elif tgt.unit_type == WALL:    dmg_wall   += dealt
+                    elif tgt.unit_type == SUPPORT: dmg_support+= dealt
+                    if tgt_hp <= maxd:
+                        destroyed = layout | {(tgt.x, tgt.y)}
+                        if destroyed not in finders:
+                            if layout:
+                                pathing = finders[layout].fork()
+                            else:
+                                pathing = gamelib.ShortestPathFinder()
+                                pathing.track_edge(state, edge_locations)
+                            pathing.unblock([tgt.x, tgt.y])
+                            finders[destroyed] = pathing
+                        layout = destroyed
+                        path_key = (layout, tuple(pt))
+                        if path_key not in paths:
+                            paths[path_key] = finders[layout].path_from(pt)
+                        path = paths[path_key]
+                        idx = -1
+                    else:
+                        health[(tgt.x, tgt.y)] = tgt_hp - maxd
+
+                # turrets attack scouts
+                for atk_loc, damage in atkers:
+                    if atk_loc in standing:
+                        continue
+                    dmg_to_scout += min(damage, cur_hp)
+                    cur_hp -= damage
+                    if cur_hp <= 0:
+                        dead += 1
+                        cur_hp = SC_HP + shield_amt
+                        if dead >= num_scouts:
+                            break
+                if dead >= num_scouts:
+                    break
+                idx += 1
+
+            survived = num_scouts - dead
+            if not path or path[-1] not in edge_locations:
+                survived = 0
+            results.append((survived, dmg_to_scout, dmg_turret, dmg_wall, dmg_support, walked))
+
+        return results
+
+    def _simulate_path(self, state, loc, num_scouts, support_locations=None):
+        """Helper to simulate a single scout path. Returns tuple of metrics + attackers set + locations walked."""
+        if support_locations is None:
+            support_locations = self.support_locations
+        temp = state.fork()
         scout_unit = GameUnit(SCOUT, state.config)
         SC_HP, SC_DMG = scout_unit.max_health, scout_unit.damage_f
         sup_info = self.config["unitInformation"][1]
@@ -912,19 +1123,22 @@ class AlgoStrategy(gamelib.AlgoCore):
 
         edge = temp.get_target_edge(loc)
         path = temp.find_path_to_edge(loc)
+        pathing = None  # persistent path finder, created on the first kill
         dead = 0
         dmg_turret = dmg_wall = dmg_support = dmg_to_scout = 0
         attackers = set()
+        walked = []
         cur_hp = SC_HP
 
         idx = 0
         while idx < len(path):
             pt = path[idx]
+            walked.append(pt)
             atkers = temp.get_attackers(pt, 0)
             temp.game_map.add_unit(SCOUT, pt)
 
             # shield buff
-            for sup_loc in self.support_locations:
+            for sup_loc in support_locations:
                 sup = temp.contains_stationary_unit(sup_loc)
                 if sup and sup.unit_type == SUPPORT:
                     rng = base_rng + (1 if sup.upgraded else 0)
@@ -945,7 +1159,12 @@ class AlgoStrategy(gamelib.AlgoCore):
                     elif tgt.unit_type == WALL:    dmg_wall   += tgt.health
                     elif tgt.unit_type == SUPPORT: dmg_support+= tgt.health
                     temp.game_map.remove_unit([tgt.x, tgt.y])
-                    path = temp.find_path_to_edge(pt, edge)
+                    if pathing is None:
+                        pathing = gamelib.ShortestPathFinder()
+                        pathing.track_edge(temp, temp.game_map.get_edge_locations(edge))
+                    else:
+                        pathing.unblock([tgt.x, tgt.y])
+                    path = pathing.path_from(pt)
                     idx = -1
                     rem -= math.ceil(tgt.health / SC_DMG)
                     break
@@ -975,7 +1194,7 @@ class AlgoStrategy(gamelib.AlgoCore):
         if not path or path[-1] not in state.game_map.get_edge_locations(edge):
             survived = 0
 
-        return survived, dmg_to_scout, dmg_turret, dmg_wall, dmg_support, loc, attackers
+        return survived, dmg_to_scout, dmg_turret, dmg_wall, dmg_support, loc, attackers, walked
 
     # ------------------------
     # Utility sequences
@@ -1018,42 +1237,28 @@ class AlgoStrategy(gamelib.AlgoCore):
             'SP': state.get_resource(SP)
         }
 
-        # Clear and update current units
+        # Clear and update current units, only our structures need looking at
         current_units = {}
-
-        # Scan the entire map
-        for x in range(28):
-            for y in range(28):
-                loc = [x, y]
-                unit = state.contains_stationary_unit(loc)
-                if unit and unit.player_index == 0:  # Only our units
-                    health_percent = (unit.health / unit.max_health) * 100
-                    current_units[tuple(loc)] = {
-                        'type': unit.unit_type,
-                        'health': health_percent,
-                        'max_health': unit.max_health,
-                        'current_health': unit.health,
-                        'upgraded': unit.upgraded
-                    }
-
-        # Calculate damage taken since last turn
-        if self.monitoring_history:
-            last_turn_units = self.monitoring_history[-1]['units']
-            for loc, unit in current_units.items():
-                if loc in last_turn_units:
-                    last_health = last_turn_units[loc]['current_health']
-                    damage_taken = last_health - unit['current_health']
-                    if damage_taken > 0:
-                        unit['damage_taken'] = damage_taken
-                        unit['damage_history'] = last_turn_units[loc].get('damage_history', []) + [damage_taken]
-                    else:
-                        unit['damage_taken'] = 0
-                        unit['damage_history'] = last_turn_units[loc].get('damage_history', [])
-                else:
-                    unit['damage_taken'] = 0
-                    unit['damage_history'] = []
-        else:
-            for unit in current_units.values():
+        for x, y in bitboard.locations_of(state.game_map.structure_mask(0)):
+            unit = state.game_map.get_structure([x, y])
+            health_percent = (unit.health / unit.max_health) * 100
+            current_units[(x, y)] = {
+                'type': unit.unit_type,
+                'health': health_percent,
+                'max_health': unit.max_health,
+                'current_health': unit.health,
+                'upgraded': unit.upgraded
+            }
+
+        # Damage taken since last turn, from the damage events of the last action phase
+        damage_received = self.event_stream.damage_by_cell(state.turn_number - 1, player_index=0)
+        last_turn_units = self.monitoring_history[-1]['units'] if self.monitoring_history else {}
+        for loc, unit in current_units.items():
+            if loc in last_turn_units:
+                damage_taken = damage_received.get(loc, 0)
+                unit['damage_taken'] = damage_taken
+                unit['damage_history'] = last_turn_units[loc].get('damage_history', []) + ([damage_taken] if damage_taken > 0 else [])
+            else:
                 unit['damage_taken'] = 0
                 unit['damage_history'] = []
 
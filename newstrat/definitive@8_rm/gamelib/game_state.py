@@ -3,7 +3,10 @@ import json
 import sys
 
 from .navigation import ShortestPathFinder
-from .util import send_command, debug_write
+from . import geometry
+from .path_cache import PATH_CACHE
+from .reachability import REACHABILITY_CACHE
+from .util import send_command, debug_write, parse_message
 from .unit import GameUnit
 from .game_map import GameMap
 
@@ -44,6 +47,7 @@ class GameState:
         * my_time (int): The time you took to submit your previous turn
         * enemy_health (int): Your opponents current remaining health
         * enemy_time (int): Your opponents current remaining time
+        * path_cache (:obj: PathCache): Cache used by find_path_to_edge, shared across turns by default. Set to None to disable caching
 
     """
 
@@ -52,9 +56,17 @@ class GameState:
 
         Args:
             * config (JSON): A json object containing information about the game
-            * serialized_string (string): A string containing information about the game state at the start of this turn
+            * serialized_string (string): A string containing information about the game state at the start of this turn.
+              A ParsedMessage from AlgoCore or an already decoded dict is used without parsing it again, see from_parsed.
+              When AlgoCore.persistent_state is on, the message carries a state AlgoCore already brought up to date and that state is used as is
 
         """
+        prepared = getattr(serialized_string, "game_state", None)
+        if prepared is not None and prepared.config is config:
+            # Hand the prepared state out once, a second GameState built from the same message must not share its map
+            serialized_string.game_state = None
+            self.__dict__.update(prepared.__dict__)
+            return
         self.serialized_string = serialized_string
         self.config = config
         self.enable_warnings = True
@@ -91,20 +103,100 @@ class GameState:
 
         self.game_map = GameMap(self.config)
         self._shortest_path_finder = ShortestPathFinder()
+        self.path_cache = PATH_CACHE
         self._build_stack = []
         self._deploy_stack = []
         self._player_resources = [
                 {'SP': 0, 'MP': 0},  # player 0, which is you
                 {'SP': 0, 'MP': 0}]  # player 1, which is the opponent
+        # What the turn message put on each cell id: (unit_type, player_index, health) per unit and the RM and UP flags.
+        # apply_turn compares the next message against these. changed_cells is None for a freshly parsed state
+        self._parsed_units = {}
+        self._parsed_flags = {}
+        self.changed_cells = None
         self.__parse_state(serialized_string)
 
+    @classmethod
+    def from_parsed(cls, config, state):
+        """Builds a GameState from a turn message that was already decoded, skipping the JSON parsing
+
+        Args:
+            * config (JSON): A json object containing information about the game
+            * state (dict): The decoded game state at the start of this turn
+
+        Returns:
+            A new GameState, the same as GameState(config, json.dumps(state))
+
+        """
+        return cls(config, state)
+
+    def fork(self):
+        """Gets an independent copy of this GameState, much cheaper than copy.deepcopy
+
+        The copy shares the config, the serialized string and the path cache with this state.
+        Units are only copied once the copy, or this state, touches their location, so forking
+        costs about the same whatever is on the board. Changes made to either state never show up in the other.
+
+        Returns:
+            A new GameState
+
+        """
+        clone = GameState.__new__(GameState)
+        clone.__dict__.update(self.__dict__)
+        clone.game_map = self.game_map._fork()
+        clone._shortest_path_finder = ShortestPathFinder()
+        clone._build_stack = list(self._build_stack)
+        clone._deploy_stack = list(self._deploy_stack)
+        clone._player_resources = [dict(resources) for resources in self._player_resources]
+        return clone
+
+    def savepoint(self):
+        """Marks the current state so that later changes can be undone with rollback.
+        Covers the game map, upgrades, resources and the build and deploy stacks, not changes made directly to units such as their health.
+        Savepoints can be nested, rolling back to one also discards every savepoint taken after it.
+
+        Returns:
+            A savepoint to pass to rollback
+
+        """
+        return (self.game_map._savepoint(), len(self._build_stack), len(self._deploy_stack),
+                [dict(resources) for resources in self._player_resources])
+
+    def rollback(self, savepoint):
+        """Undoes every change made to the map, resources and stacks since savepoint was taken
+
+        Args:
+            savepoint: A value returned by savepoint since the last commit
+
+        """
+        map_mark, build_length, deploy_length, resources = savepoint
+        if not self.game_map._rollback(map_mark):
+            self.warn("Attempted to roll back to a savepoint that is no longer valid. Was commit called since?")
+            return
+        del self._build_stack[build_length:]
+        del self._deploy_stack[deploy_length:]
+        self._player_resources = [dict(player_resources) for player_resources in resources]
+
+    def commit(self):
+        """Keeps every change made since the first savepoint and stops recording them. Earlier savepoints can no longer be rolled back to
+        """
+        self.game_map._commit()
+
     def __parse_state(self, state_line):
         """
         Fills in map based on the serialized game state so that self.game_map[x,y] is a list of GameUnits at that location.
-        state_line is the game state as a json string.
+        state_line is the game state as a json string, a ParsedMessage or a decoded dict.
         """
-        state = json.loads(state_line)
+        state = parse_message(state_line)
+        self.__parse_stats(state)
 
+        p1units = state["p1Units"]
+        p2units = state["p2Units"]
+
+        self.__create_parsed_units(p1units, 0)
+        self.__create_parsed_units(p2units, 1)
+
+    def __parse_stats(self, state):
         turn_info = state["turnInfo"]
         self.turn_number = int(turn_info[1])
 
@@ -120,12 +212,6 @@ class GameState:
             {'SP': p1_SP, 'MP': p1_MP},
             {'SP': p2_SP, 'MP': p2_MP}]
 
-        p1units = state["p1Units"]
-        p2units = state["p2Units"]
-
-        self.__create_parsed_units(p1units, 0)
-        self.__create_parsed_units(p2units, 1)
-
     def __create_parsed_units(self, units, player_number):
         """
         Helper function for __parse_state to add units to the map.
@@ -138,16 +224,90 @@ class GameState:
                 x, y = map(int, [sx, sy])
                 hp = float(shp)
                 # This depends on RM and UP always being the last types to be processed
+                if unit_type == REMOVE or unit_type == UPGRADE:
+                    self._parsed_flags.setdefault(x * self.ARENA_SIZE + y, set()).add(unit_type)
                 if unit_type == REMOVE:
                     # Quick fix will deploy engine fix soon
                     if self.contains_stationary_unit([x,y]):
                         self.game_map[x,y][0].pending_removal = True
                 elif unit_type == UPGRADE:
                     if self.contains_stationary_unit([x,y]):
-                        self.game_map[x,y][0].upgrade()
+                        self.game_map._upgrade([x, y])
                 else:
                     unit = GameUnit(unit_type, self.config, player_number, hp, x, y)
-                    self.game_map[x,y].append(unit)
+                    self.game_map._place_unit(unit)
+                    self._parsed_units.setdefault(x * self.ARENA_SIZE + y, []).append((unit_type, player_number, hp))
+
+    def apply_turn(self, serialized_string):
+        """Brings this state to a new turn by changing only the locations whose units differ from the new turn message
+
+        Units that are still there keep their GameUnit, with health and the removal flag updated in place.
+        Locations whose units changed otherwise are rebuilt, which keeps the structure masks, layout and ThreatMap of the map in step,
+        and caches keyed by the structure layout, like the path and reachability caches, stay valid wherever the layout did not change.
+        Resources, health, the turn number and the build and deploy stacks are reset from the message.
+
+        This expects the map to still hold the previous turn as it was parsed, so apply turns to a state and do your
+        spawning and simulations on forks of it. AlgoCore does this for you when persistent_state is on.
+
+        Args:
+            serialized_string: The new turn message, as a string, a ParsedMessage or a decoded dict
+
+        Returns:
+            The set of cell ids (x * ARENA_SIZE + y) whose units changed, also kept in changed_cells
+
+        """
+        state = parse_message(serialized_string)
+        self.serialized_string = serialized_string
+        self.__parse_stats(state)
+        self._build_stack = []
+        self._deploy_stack = []
+
+        typedef = self.config.get("unitInformation")
+        wanted = {}
+        flags = {}
+        for player_number, units in ((0, state["p1Units"]), (1, state["p2Units"])):
+            for i, unit_types in enumerate(units):
+                unit_type = typedef[i].get("shorthand")
+                for uinfo in unit_types:
+                    cell = int(uinfo[0]) * self.ARENA_SIZE + int(uinfo[1])
+                    if unit_type == REMOVE or unit_type == UPGRADE:
+                        flags.setdefault(cell, set()).add(unit_type)
+                    else:
+                        wanted.setdefault(cell, []).append((unit_type, player_number, float(uinfo[2])))
+
+        changed = set()
+        previous_units, previous_flags = self._parsed_units, self._parsed_flags
+        for cell in previous_units.keys() | wanted.keys():
+            expected = wanted.get(cell, [])
+            previous = previous_units.get(cell, [])
+            cell_flags = flags.get(cell, set())
+            previous_cell_flags = previous_flags.get(cell, set())
+            if expected == previous and cell_flags == previous_cell_flags:
+                continue
+            changed.add(cell)
+            x, y = divmod(cell, self.ARENA_SIZE)
+            stationary = bool(expected) and is_stationary(expected[0][0])
+            if ([entry[:2] for entry in expected] == [entry[:2] for entry in previous]
+                    and (UPGRADE in cell_flags) == (UPGRADE in previous_cell_flags)):
+                # Same units as last turn, only their health or removal flag moved
+                for index, (unit, (_, _, health)) in enumerate(zip(self.game_map[x, y], expected)):
+                    unit.health = health
+                    unit.pending_removal = index == 0 and stationary and REMOVE in cell_flags
+                continue
+
+            self.game_map.remove_unit([x, y])
+            for index, (unit_type, player_number, health) in enumerate(expected):
+                unit = GameUnit(unit_type, self.config, player_number, health, x, y)
+                if index == 0 and stationary:
+                    unit.pending_removal = REMOVE in cell_flags
+                    if UPGRADE in cell_flags:
+                        unit.upgrade()
+                self.game_map._place_unit(unit)
+
+        self._parsed_units = wanted
+        self._parsed_flags = flags
+        self.changed_cells = changed
+        return changed
 
     def __resource_required(self, unit_type):
         return self.SP if is_stationary(unit_type) else self.MP
@@ -331,9 +491,9 @@ class GameState:
 
         affordable = self.number_affordable(unit_type) >= num
         stationary = is_stationary(unit_type)
-        blocked = self.contains_stationary_unit(location) or (stationary and len(self.game_map[location[0],location[1]]) > 0)
+        blocked = self.contains_stationary_unit(location) or (stationary and self.game_map.unit_count(location) > 0)
         correct_territory = location[1] < self.HALF_ARENA
-        on_edge = location in (self.game_map.get_edge_locations(self.game_map.BOTTOM_LEFT) + self.game_map.get_edge_locations(self.game_map.BOTTOM_RIGHT))
+        on_edge = (location[0], location[1]) in geometry.SPAWN_EDGE_SETS[0]
 
         if self.enable_warnings:
             fail_reason = ""
@@ -374,6 +534,22 @@ class GameState:
         if type(locations[0]) == int:
             locations = [locations]
         spawned_units = 0
+        if not is_stationary(unit_type):
+            # Mobile units stack, so whatever stops a spawn at a location stops every later one: spawn them all at once
+            costs = self.type_cost(unit_type)
+            for location in locations:
+                if not self.can_spawn(unit_type, location, 1):
+                    continue
+                x, y = map(int, location)
+                count = min(num, self.number_affordable(unit_type))
+                if count < num and self.enable_warnings:
+                    self.can_spawn(unit_type, location, count + 1)
+                self.__set_resource(SP, 0 - costs[SP] * count)
+                self.__set_resource(MP, 0 - costs[MP] * count)
+                self.game_map.add_units(unit_type, location, count, 0)
+                self._deploy_stack.extend([(unit_type, x, y)] * count)
+                spawned_units += count
+            return spawned_units
         for location in locations:
             for i in range(num):
                 if self.can_spawn(unit_type, location, 1):
@@ -382,10 +558,7 @@ class GameState:
                     self.__set_resource(SP, 0 - costs[SP])
                     self.__set_resource(MP, 0 - costs[MP])
                     self.game_map.add_unit(unit_type, location, 0)
-                    if is_stationary(unit_type):
-                        self._build_stack.append((unit_type, x, y))
-                    else:
-                        self._deploy_stack.append((unit_type, x, y))
+                    self._build_stack.append((unit_type, x, y))
                     spawned_units += 1
                 else:
                     break
@@ -445,7 +618,7 @@ class GameState:
                     if resources[SP] >= costs[SP] and resources[MP] >= costs[MP]:
                         self.__set_resource(SP, 0 - costs[SP])
                         self.__set_resource(MP, 0 - costs[MP])
-                        existing_unit.upgrade()
+                        self.game_map._upgrade([x, y])
                         self._build_stack.append((UPGRADE, x, y))
                         spawned_units += 1
             else:
@@ -488,6 +661,9 @@ class GameState:
             to get from it's starting location to the best available end location
 
         """
+        if not self.game_map.in_arena_bounds(start_location):
+            self.warn("Attempted to perform pathing from starting location {} outside of the arena bounds".format(start_location))
+            return
         if self.contains_stationary_unit(start_location):
             self.warn("Attempted to perform pathing from blocked starting location {}".format(start_location))
             return
@@ -495,8 +671,68 @@ class GameState:
         if target_edge is None:
             target_edge = self.get_target_edge(start_location)
 
-        end_points = self.game_map.get_edge_locations(target_edge)
-        return self._shortest_path_finder.navigate_multiple_endpoints(start_location, end_points, self)
+        if self.path_cache is None:
+            end_points = self.game_map.get_edge_locations(target_edge)
+            return self._shortest_path_finder.navigate_multiple_endpoints(start_location, end_points, self)
+
+        layout = self.game_map.structure_layout()
+        path = self.path_cache.get(layout, start_location, target_edge)
+        if path is None:
+            end_points = self.game_map.get_edge_locations(target_edge)
+            path = self._shortest_path_finder.navigate_multiple_endpoints(start_location, end_points, self)
+            if path is not None:
+                self.path_cache.put(layout, start_location, target_edge, path)
+        return path
+
+    def find_paths_to_edge_many(self, start_locations, target_edge=None):
+        """Gets the paths units at several locations would take, sharing the pathing work between them.
+        Equivalent to calling find_path_to_edge for each location, but the board is only searched
+        about once per target edge instead of once per location.
+
+        Args:
+            start_locations: A list of locations of hypothetical units
+            target_edge: The edge the units want to reach. Induced from each start location if None.
+
+        Returns:
+            A list with the path for each start location, in the same order.
+            Blocked start locations and those outside of the arena get None.
+
+        """
+        layout = self.game_map.structure_layout()
+        paths = [None] * len(start_locations)
+        pending = {}
+        for index, start_location in enumerate(start_locations):
+            if not self.game_map.in_arena_bounds(start_location):
+                self.warn("Attempted to perform pathing from starting location {} outside of the arena bounds".format(start_location))
+                continue
+            if self.contains_stationary_unit(start_location):
+                self.warn("Attempted to perform pathing from blocked starting location {}".format(start_location))
+                continue
+            edge = self.get_target_edge(start_location) if target_edge is None else target_edge
+            if self.path_cache is not None:
+                paths[index] = self.path_cache.get(layout, start_location, edge)
+            if paths[index] is None:
+                pending.setdefault(edge, []).append(index)
+
+        for edge, indices in pending.items():
+            end_points = self.game_map.get_edge_locations(edge)
+            starts = [start_locations[index] for index in indices]
+            for index, path in zip(indices, self._shortest_path_finder.navigate_many_starts(starts, end_points, self)):
+                paths[index] = path
+                if self.path_cache is not None and path is not None:
+                    self.path_cache.put(layout, start_locations[index], edge, path)
+        return paths
+
+    def get_reachability(self):
+        """Gets the connected components of the free cells on the current board.
+        Each board version is labeled once, after that questions like "can a unit at this location
+        reach that edge" or "which of our edge cells can the enemy walk to" are answered in constant time.
+
+        Returns:
+            A Reachability for the current structure layout
+
+        """
+        return REACHABILITY_CACHE.get(self.game_map)
 
     def contains_stationary_unit(self, location):
         """Check if a location is blocked, return structures unit if it is
@@ -511,11 +747,7 @@ class GameState:
         if not self.game_map.in_arena_bounds(location):
             self.warn('Checked for stationary unit outside of arena bounds')
             return False
-        x, y = map(int, location)
-        for unit in self.game_map[x,y]:
-            if unit.stationary:
-                return unit
-        return False
+        return self.game_map.get_structure(location) or False
 
     def warn(self, message):
         """ Used internally by game_state to print warnings
@@ -555,7 +787,7 @@ class GameState:
             return
 
         attacker_location = [attacking_unit.x, attacking_unit.y]
-        possible_locations = self.game_map.get_locations_in_range(attacker_location, attacking_unit.attackRange)
+        possible_locations = self.game_map._locations_in_range(attacker_location, attacking_unit.attackRange)
         target = None
         target_stationary = True
         target_distance = sys.maxsize
@@ -563,8 +795,10 @@ class GameState:
         target_y = self.ARENA_SIZE
         target_x_distance = 0
 
+        target_index = None
+        # Scans shared cells of a forked map without copying them, only the cell of the target is copied
         for location in possible_locations:
-            for unit in self.game_map[location]:
+            for index, unit in enumerate(self.game_map._peek(location[0], location[1])):
                 if unit.player_index == attacking_unit.player_index or (attacking_unit.damage_f == 0 and is_stationary(unit.unit_type)) or (attacking_unit.damage_i == 0 and not(is_stationary(unit.unit_type))):
                     continue
 
@@ -607,11 +841,14 @@ class GameState:
                 
                 if new_target:
                     target = unit
+                    target_index = index
                     target_stationary = unit_stationary
                     target_distance = unit_distance
                     target_health = unit_health
                     target_y = unit_y
                     target_x_distance = unit_x_distance
+        if target is not None:
+            target = self.game_map[target.x, target.y][target_index]
         return target
 
     def get_attackers(self, location, player_index):
@@ -630,6 +867,8 @@ class GameState:
             self._invalid_player_index(player_index)
         if not self.game_map.in_arena_bounds(location):
             self.warn("Location {} is not in the arena bounds.".format(location))
+        elif player_index in (0, 1):
+            return self.game_map._threats().get_attackers(location, player_index)
 
         attackers = []
         """
@@ -639,7 +878,7 @@ class GameState:
         for unit in self.config["unitInformation"]:
             if unit.get('attackRange', 0) >= max_range:
                 max_range = unit.get('attackRange', 0)
-        possible_locations= self.game_map.get_locations_in_range(location, max_range)
+        possible_locations = self.game_map._locations_in_range(location, max_range)
         for location_unit in possible_locations:
             for unit in self.game_map[location_unit]:
                 if unit.damage_i + unit.damage_f > 0 and unit.player_index != player_index and self.game_map.distance_between_locations(location, location_unit) <= unit.attackRange:
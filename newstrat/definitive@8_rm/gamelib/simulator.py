@@ -0,0 +1,647 @@
+"""
+Frame by frame simulation of the action phase.
+
+Simulator copies the structures and the mobile units waiting on the edges of a GameState into flat
+arrays indexed by cell id (x * ARENA_SIZE + y) and plays the action phase on them one frame at a time,
+in the order the engine resolves a frame:
+
+    1. Every support shields the friendly mobile units in its shieldRange that it has not shielded yet,
+       by shieldPerUnit plus shieldBonusPerY for every row the support stands away from its own edge
+    2. Every mobile unit whose turn it is moves one cell, once every 1 / speed frames starting on frame 1.
+       A unit that steps onto its target edge breaches and leaves the board. A unit at the end of a path
+       that does not reach the edge self destructs, hurting the enemies in selfDestructRange if it walked
+       at least selfDestructStepsRequired cells
+    3. Every unit attacks the target GameState.get_target would pick, structures first then mobile units
+       in the order they were spawned. Units that dropped to 0 health earlier in the frame still attack
+       but are not targeted again
+    4. Units at 0 health or less are removed. Paths are recomputed from where each unit stands when a
+       structure is destroyed, keeping the axis of its last move
+
+Paths come from a ShortestPathFinder in persistent mode per target edge, so a destroyed structure costs
+one local repair of the distance field instead of a new search of the board.
+
+When only one player has mobile units left, run jumps over the frames in which none of them can meet a
+structure, moving them along their paths in one go: until then nothing but step 2 happens.
+"""
+import time
+from array import array
+
+from . import bitboard
+from .geometry import ARENA_SIZE, NUM_CELLS, DISTANCES, EDGES, HALF_ARENA, locations_in_range
+from .navigation import ShortestPathFinder, EDGE_TABLES
+from .unit import compile_unit_specs
+
+_HORIZONTAL = 1
+_VERTICAL = 2
+
+# {(radius, hit_radius): for every cell id, the cell ids GameMap.get_locations_in_range returns, ordered by id}
+_RANGE_CELLS = {}
+
+
+def _cells_in_range(cell, radius, hit_radius):
+    table = _RANGE_CELLS.get((radius, hit_radius))
+    if table is None:
+        table = _RANGE_CELLS[radius, hit_radius] = [None] * NUM_CELLS
+    cells = table[cell]
+    if cells is None:
+        x, y = divmod(cell, ARENA_SIZE)
+        cells = table[cell] = tuple(sorted(target_x * ARENA_SIZE + target_y
+                                           for target_x, target_y in locations_in_range(x, y, radius, hit_radius)))
+    return cells
+
+
+def _target_edge(cell):
+    """Same as GameState.get_target_edge, as an index into geometry.EDGES"""
+    x, y = divmod(cell, ARENA_SIZE)
+    if x < HALF_ARENA:
+        return 0 if y < HALF_ARENA else 3
+    return 1 if y < HALF_ARENA else 2
+
+
+class SimulationResult:
+    """What happened during a simulated action phase
+
+    Attributes :
+        * frames (int): The number of frames played
+        * seconds (float): The time the simulation took
+        * breaches (list): (x, y, damage, unit_type, player_index, frame) for every unit that reached its target edge
+        * breach_damage (list): The damage each player dealt to the other by breaching, indexed by player_index
+        * structure_damage (dict): The damage each structure took, from (x, y) to the health it lost
+        * destroyed (list): (x, y, unit_type, player_index, frame) for every structure destroyed
+        * self_destructs (list): (x, y, unit_type, player_index, frame) for every mobile unit that self destructed
+        * breach_cells (dict): The breach damage scored by the units that walked through each location, from (x, y)
+          to damage, for both players. Spawn locations count as walked through
+        * units_lost (list): The mobile units each player lost to attacks and self destructs, indexed by player_index
+        * survivors (list): The mobile units each player still had when the simulation stopped
+
+    """
+    def __init__(self):
+        self.frames = 0
+        self.seconds = 0.0
+        self.breaches = []
+        self.breach_damage = [0.0, 0.0]
+        self.structure_damage = {}
+        self.destroyed = []
+        self.self_destructs = []
+        self.breach_cells = {}
+        self.units_lost = [0, 0]
+        self.survivors = [0, 0]
+
+    @property
+    def frames_per_second(self):
+        return self.frames / self.seconds if self.seconds else 0.0
+
+    def __repr__(self):
+        return "SimulationResult(frames={}, breach_damage={}, destroyed={}, units_lost={}, {:.0f} frames/s)".format(
+            self.frames, self.breach_damage, len(self.destroyed), self.units_lost, self.frames_per_second)
+
+
+class Simulator:
+    """Plays the action phase of a GameState frame by frame, see the module docstring for the rules
+
+    The GameState is only read, the simulation never changes it.
+
+    Attributes :
+        * frame (int): The next frame to play
+        * result (:obj: SimulationResult): What happened so far
+        * structure_health (array): The health of the structure on every cell id, 0 where there is none
+        * structure_owner (bytearray): player_index + 1 of the structure on every cell id, 0 where there is none
+        * unit_cell (array): The cell id of every mobile unit, in spawn order
+        * unit_health (array): The health of every mobile unit
+        * unit_owner (bytearray): The player_index of every mobile unit
+        * unit_alive (bytearray): 1 for every mobile unit still on the board
+
+    """
+    def __init__(self, game_state):
+        self.game_state = game_state
+        self.config = game_state.config
+        unit_information = self.config["unitInformation"]
+        self.hit_radius = unit_information[0].get("getHitRadius", 0)
+        self.__specs = compile_unit_specs(self.config)
+        self.__type_index = {info["shorthand"]: index for index, info in enumerate(unit_information) if "unitCategory" in info}
+        # Per mobile unit type: (move period, breach damage, self destruct range, damage to mobile units, damage to structures, steps required)
+        self.__mobile_rules = {}
+        for info in unit_information:
+            if info.get("unitCategory") == 1:
+                self.__mobile_rules[info["shorthand"]] = (
+                    max(1, round(1 / info["speed"])) if info.get("speed") else 1,
+                    info.get("playerBreachDamage", 1), info.get("selfDestructRange", 0),
+                    info.get("selfDestructDamageWalker", 0), info.get("selfDestructDamageTower", 0),
+                    info.get("selfDestructStepsRequired", 0))
+
+        self.frame = 0
+        self.result = SimulationResult()
+
+        self.structure_spec = [None] * NUM_CELLS
+        self.structure_owner = bytearray(NUM_CELLS)
+        self.structure_health = array("d", bytes(8 * NUM_CELLS))
+        # Attacking structures of each player covering each cell, and supports of each player covering each cell
+        self.__covering = ([[] for _ in range(NUM_CELLS)], [[] for _ in range(NUM_CELLS)])
+        self.__shielding = ([[] for _ in range(NUM_CELLS)], [[] for _ in range(NUM_CELLS)])
+        self.__dying_structures = []
+        self.__destroyed_cells = []
+        # Breach damage scored this frame by trail, see __move
+        self.__breach_trails = {}
+
+        self.unit_spec = []
+        self.unit_cell = array("h")
+        self.unit_health = array("d")
+        self.unit_owner = bytearray()
+        self.unit_alive = bytearray()
+        self.__unit_path = []
+        self.__unit_layout = array("i")
+        self.__unit_position = array("h")
+        self.__unit_direction = bytearray()
+        self.__unit_steps = array("h")
+        self.__unit_edge = bytearray()
+        self.__unit_shielded = []
+        # The cells every mobile unit walked through, starting with its spawn cell
+        self.__unit_trail = []
+        # Alive mobile units of each player by cell
+        self.__occupancy = ({}, {})
+        self.__finders = [None] * 4
+        # Bumped whenever a structure is destroyed, paths computed on an older layout are recomputed
+        self.__layout = 0
+        # Paths of the current layout by (cell, target edge, last move direction), units of one stack share them
+        self.__paths = {}
+        # Owners of the structures the simulation started with. No structure is ever added, so the structures
+        # an attacker can target are found among these once per (cell, player_index, range), and forks share the lists
+        self.__initial_owner = None
+        self.__structure_targets = {}
+        # Per player, 1 on the cells where their mobile units may meet a structure, see _interacts
+        self.__contact = [None, None]
+        self.__mobile_reach = max((spec.attackRange for spec in self.__specs.values() if spec.unit_type in self.__mobile_rules), default=0)
+
+        game_map = game_state.game_map
+        for x, y in bitboard.locations_of(game_map.structure_mask()):
+            unit = game_map.get_structure([x, y])
+            self.__add_structure(x * ARENA_SIZE + y, unit.spec, unit.player_index, unit.health)
+        for edge in EDGES:
+            for x, y in edge:
+                for stack in game_map.unit_stacks([x, y]):
+                    for health in stack.healths:
+                        self.__add_unit(stack.spec, x * ARENA_SIZE + y, stack.player_index, health)
+        self.__initial_owner = bytes(self.structure_owner)
+
+    def __add_structure(self, cell, spec, player_index, health):
+        self.structure_spec[cell] = spec
+        self.structure_owner[cell] = player_index + 1
+        self.structure_health[cell] = health
+        if spec.damage_i > 0 or spec.damage_f > 0:
+            covering = self.__covering[player_index]
+            for target in _cells_in_range(cell, spec.attackRange, self.hit_radius):
+                covering[target].append(cell)
+        if spec.shieldRange > 0 and (spec.shieldPerUnit > 0 or spec.shieldBonusPerY > 0):
+            shielding = self.__shielding[player_index]
+            for target in _cells_in_range(cell, spec.shieldRange, self.hit_radius):
+                shielding[target].append(cell)
+
+    def __remove_structure(self, cell):
+        spec = self.structure_spec[cell]
+        player_index = self.structure_owner[cell] - 1
+        for lists, radius in ((self.__covering[player_index], spec.attackRange), (self.__shielding[player_index], spec.shieldRange)):
+            if radius > 0:
+                for target in _cells_in_range(cell, radius, self.hit_radius):
+                    if cell in lists[target]:
+                        # Replaced rather than changed in place, forks share these lists
+                        lists[target] = [other for other in lists[target] if other != cell]
+        self.structure_spec[cell] = None
+        self.structure_owner[cell] = 0
+        self.structure_health[cell] = 0
+        self.__destroyed_cells.append(cell)
+        for finder in self.__finders:
+            if finder is not None:
+                finder.unblock(divmod(cell, ARENA_SIZE))
+        self.__layout += 1
+        self.__paths = {}
+
+    def __add_unit(self, spec, cell, player_index, health):
+        self.unit_spec.append(spec)
+        self.unit_cell.append(cell)
+        self.unit_health.append(health)
+        self.unit_owner.append(player_index)
+        self.unit_alive.append(1)
+        self.__unit_path.append(None)
+        self.__unit_layout.append(-1)
+        self.__unit_position.append(0)
+        self.__unit_direction.append(0)
+        self.__unit_steps.append(0)
+        self.__unit_edge.append(_target_edge(cell))
+        self.__unit_shielded.append(None)
+        self.__unit_trail.append([cell])
+        self.__occupancy[player_index].setdefault(cell, []).append(len(self.unit_cell) - 1)
+
+    def spawn(self, unit_type, location, num=1, player_index=0):
+        """Adds mobile units to the simulation, on top of the ones already spawned in the GameState
+
+        Args:
+            unit_type: The type of mobile unit
+            location: Where to place them, a free cell of the arena
+            num: How many to place
+            player_index: Their owner, 0 for you 1 for your opponent
+
+        Returns:
+            The number of units placed, 0 if the location holds a structure
+
+        """
+        cell = int(location[0]) * ARENA_SIZE + int(location[1])
+        if self.structure_owner[cell]:
+            return 0
+        spec = self.__specs[unit_type]
+        for _ in range(num):
+            self.__add_unit(spec, cell, player_index, spec.max_health)
+        return num
+
+    def fork(self):
+        """Gets an independent copy of this simulation, to play several continuations of one position,
+        such as a different wave spawned on each copy. Much cheaper than a new Simulator of the same GameState.
+        The path finders of this simulation are built first, so every fork shares that work
+
+        Returns:
+            A new Simulator
+
+        """
+        for edge in range(len(EDGES)):
+            self.__finder(edge)
+        for player_index in (0, 1):
+            self.__contact_map(player_index)
+        clone = Simulator.__new__(Simulator)
+        clone.__dict__.update(self.__dict__)
+        result = clone.result = SimulationResult()
+        for name, value in self.result.__dict__.items():
+            setattr(result, name, value.copy() if hasattr(value, "copy") else value)
+        clone.structure_spec = list(self.structure_spec)
+        clone.structure_owner = bytearray(self.structure_owner)
+        clone.structure_health = array("d", self.structure_health)
+        clone.__covering = tuple(list(lists) for lists in self.__covering)
+        clone.__shielding = tuple(list(lists) for lists in self.__shielding)
+        clone.__dying_structures = list(self.__dying_structures)
+        clone.__destroyed_cells = list(self.__destroyed_cells)
+        clone.unit_spec = list(self.unit_spec)
+        clone.unit_cell = array("h", self.unit_cell)
+        clone.unit_health = array("d", self.unit_health)
+        clone.unit_owner = bytearray(self.unit_owner)
+        clone.unit_alive = bytearray(self.unit_alive)
+        clone.__unit_path = list(self.__unit_path)
+        clone.__unit_layout = array("i", self.__unit_layout)
+        clone.__unit_position = array("h", self.__unit_position)
+        clone.__unit_direction = bytearray(self.__unit_direction)
+        clone.__unit_steps = array("h", self.__unit_steps)
+        clone.__unit_edge = bytearray(self.__unit_edge)
+        clone.__unit_shielded = [None if shielded is None else set(shielded) for shielded in self.__unit_shielded]
+        clone.__unit_trail = [list(trail) for trail in self.__unit_trail]
+        clone.__occupancy = tuple({cell: list(units) for cell, units in occupancy.items()} for occupancy in self.__occupancy)
+        clone.__finders = [finder.fork() for finder in self.__finders]
+        clone.__paths = dict(self.__paths)
+        clone.__contact = list(self.__contact)
+        return clone
+
+    def __finder(self, edge):
+        finder = self.__finders[edge]
+        if finder is None:
+            finder = self.__finders[edge] = ShortestPathFinder()
+            finder.track_edge(self.game_state, list(EDGES[edge]))
+            for cell in self.__destroyed_cells:
+                finder.unblock(divmod(cell, ARENA_SIZE))
+        return finder
+
+    def __path(self, unit):
+        cell = self.unit_cell[unit]
+        key = (cell, self.__unit_edge[unit], self.__unit_direction[unit])
+        path = self.__paths.get(key)
+        if path is None:
+            path = self.__finder(key[1]).path_from(divmod(cell, ARENA_SIZE), key[2])
+            path = self.__paths[key] = [x * ARENA_SIZE + y for x, y in path]
+        self.__unit_path[unit] = path
+        self.__unit_layout[unit] = self.__layout
+        self.__unit_position[unit] = 0
+        return self.__unit_path[unit]
+
+    def __leave(self, unit):
+        self.unit_alive[unit] = 0
+        cell = self.unit_cell[unit]
+        units = self.__occupancy[self.unit_owner[unit]][cell]
+        units.remove(unit)
+        if not units:
+            del self.__occupancy[self.unit_owner[unit]][cell]
+
+    def __hurt_structure(self, cell, damage):
+        health = self.structure_health[cell]
+        dealt = min(damage, health)
+        location = divmod(cell, ARENA_SIZE)
+        self.result.structure_damage[location] = self.result.structure_damage.get(location, 0) + dealt
+        self.structure_health[cell] = health - damage
+        if health > 0 >= health - damage:
+            self.__dying_structures.append(cell)
+
+    def _target(self, cell, player_index, spec):
+        """The mobile unit index or structure cell id the attacker would hit, as (is_structure, index), or None
+        """
+        reach = spec.attackRange + self.hit_radius
+        x, y = divmod(cell, ARENA_SIZE)
+        if spec.damage_i > 0:
+            enemies = self.__occupancy[1 - player_index]
+            health = self.unit_health
+            best = best_key = None
+            for other in sorted(enemies):
+                other_x, other_y = divmod(other, ARENA_SIZE)
+                distance = DISTANCES[abs(x - other_x)][abs(y - other_y)]
+                if distance >= reach:
+                    continue
+                y_key = other_y if player_index == 0 else -other_y
+                x_key = -abs(HALF_ARENA - 0.5 - other_x)
+                for unit in enemies[other]:
+                    if health[unit] <= 0:
+                        continue
+                    key = (distance, health[unit], y_key, x_key)
+                    if best_key is None or key < best_key:
+                        best, best_key = unit, key
+            if best is not None:
+                return False, best
+        if spec.damage_f > 0:
+            owner = 2 - player_index
+            structure_owner = self.structure_owner
+            health = self.structure_health
+            candidates = self.__structure_targets.get((cell, player_index, spec.attackRange))
+            if candidates is None:
+                candidates = self.__structure_candidates(cell, player_index, spec.attackRange)
+            best = best_key = None
+            for other, distance, y_key, x_key in candidates:
+                if structure_owner[other] != owner or health[other] <= 0:
+                    continue
+                key = (distance, health[other], y_key, x_key)
+                if best_key is None or key < best_key:
+                    best, best_key = other, key
+            if best is not None:
+                return True, best
+        return None
+
+    def __structure_candidates(self, cell, player_index, radius):
+        """The enemy structures the simulation started with in range of cell, with the parts of their target key that never change
+        """
+        owner = 2 - player_index
+        x, y = divmod(cell, ARENA_SIZE)
+        candidates = []
+        for other in _cells_in_range(cell, radius, self.hit_radius):
+            if self.__initial_owner[other] == owner:
+                other_x, other_y = divmod(other, ARENA_SIZE)
+                candidates.append((other, DISTANCES[abs(x - other_x)][abs(y - other_y)],
+                                   other_y if player_index == 0 else -other_y, -abs(HALF_ARENA - 0.5 - other_x)))
+        candidates = self.__structure_targets[cell, player_index, radius] = tuple(candidates)
+        return candidates
+
+    def _interacts(self, cell, player_index):
+        """True if a mobile unit of player_index on cell could be attacked or shielded by a structure, or attack one.
+        Structures destroyed since the first call still count, so it may be True where nothing is left, never False where something is
+        """
+        return bool(self.__contact_map(player_index)[cell])
+
+    def __contact_map(self, player_index):
+        contact = self.__contact[player_index]
+        if contact is None:
+            contact = bytearray(NUM_CELLS)
+            covering = self.__covering[1 - player_index]
+            shielding = self.__shielding[player_index]
+            for cell in range(NUM_CELLS):
+                if covering[cell] or shielding[cell]:
+                    contact[cell] = 1
+            for cell, owner in enumerate(self.__initial_owner):
+                if owner == 2 - player_index:
+                    for target in _cells_in_range(cell, self.__mobile_reach, self.hit_radius):
+                        contact[target] = 1
+            contact = self.__contact[player_index] = bytes(contact)
+        return contact
+
+    def __attack(self, cell, player_index, spec, targets=None):
+        """Hits the target of an attacker, targets keeps the ones picked this frame by attackers sharing a cell, player and spec
+        """
+        if targets is None:
+            target = self._target(cell, player_index, spec)
+        else:
+            key = (cell, player_index, id(spec))
+            target = targets.get(key, False)
+            # A hit only lowers the health of the target, which keeps it the best one until it dies
+            if target is False or (target is not None and (self.structure_health if target[0] else self.unit_health)[target[1]] <= 0):
+                target = targets[key] = self._target(cell, player_index, spec)
+        if target is None:
+            return
+        is_structure, index = target
+        if is_structure:
+            self.__hurt_structure(index, spec.damage_f)
+        else:
+            self.unit_health[index] -= spec.damage_i
+
+    def __self_destruct(self, unit):
+        spec = self.unit_spec[unit]
+        cell = self.unit_cell[unit]
+        player_index = self.unit_owner[unit]
+        _, _, radius, damage_i, damage_f, steps_required = self.__mobile_rules[spec.unit_type]
+        x, y = divmod(cell, ARENA_SIZE)
+        self.result.self_destructs.append((x, y, spec.unit_type, player_index, self.frame))
+        self.result.units_lost[player_index] += 1
+        self.__leave(unit)
+        if self.__unit_steps[unit] < steps_required or radius <= 0:
+            return
+        enemies = self.__occupancy[1 - player_index]
+        for other in _cells_in_range(cell, radius, self.hit_radius):
+            if self.structure_owner[other] == 2 - player_index and self.structure_health[other] > 0:
+                self.__hurt_structure(other, damage_f)
+            for target in enemies.get(other, ()):
+                self.unit_health[target] -= damage_i
+
+    def __move(self, unit):
+        path = self.__unit_path[unit]
+        if self.__unit_layout[unit] != self.__layout:
+            path = self.__path(unit)
+        position = self.__unit_position[unit]
+        if position + 1 >= len(path):
+            self.__self_destruct(unit)
+            return
+        cell = self.unit_cell[unit]
+        next_cell = path[position + 1]
+        player_index = self.unit_owner[unit]
+        self.__unit_direction[unit] = _VERTICAL if cell // ARENA_SIZE == next_cell // ARENA_SIZE else _HORIZONTAL
+        self.__unit_position[unit] = position + 1
+        self.__unit_steps[unit] += 1
+        occupancy = self.__occupancy[player_index]
+        units = occupancy[cell]
+        units.remove(unit)
+        if not units:
+            del occupancy[cell]
+        occupancy.setdefault(next_cell, []).append(unit)
+        self.unit_cell[unit] = next_cell
+        self.__unit_trail[unit].append(next_cell)
+        if EDGE_TABLES[self.__unit_edge[unit]].is_target[next_cell]:
+            spec = self.unit_spec[unit]
+            damage = self.__mobile_rules[spec.unit_type][1]
+            x, y = divmod(next_cell, ARENA_SIZE)
+            self.result.breaches.append((x, y, damage, spec.unit_type, player_index, self.frame))
+            self.result.breach_damage[player_index] += damage
+            # Units of a stack breach together on the same trail, step credits each trail once
+            trail = tuple(self.__unit_trail[unit])
+            self.__breach_trails[trail] = self.__breach_trails.get(trail, 0) + damage
+            self.__leave(unit)
+
+    def __skip_quiet_frames(self, max_frames):
+        """Moves the mobile units of a lone player through the frames where none of them can meet a structure or breach,
+        without playing them. Nothing but these moves happens in such frames
+        """
+        if self.__occupancy[0] and self.__occupancy[1]:
+            return
+        player_index = 0 if self.__occupancy[0] else 1
+        contact = self.__contact_map(player_index)
+        if not self.__occupancy[player_index] or any(contact[cell] for cell in self.__occupancy[player_index]):
+            return
+        alive = self.unit_alive
+        units = [unit for unit in range(len(alive)) if alive[unit]]
+        first = max(self.frame, 1)
+        stop = max_frames
+        plans = []
+        for unit in units:
+            path = self.__unit_path[unit]
+            if self.__unit_layout[unit] != self.__layout:
+                path = self.__path(unit)
+            position = self.__unit_position[unit]
+            is_target = EDGE_TABLES[self.__unit_edge[unit]].is_target
+            end = position + 1
+            while end < len(path) - 1 and not contact[path[end]] and not is_target[path[end]]:
+                end += 1
+            # Units move on the frames their period divides, the move onto path[end] is the first one that matters
+            period = self.__mobile_rules[self.unit_spec[unit].unit_type][0]
+            move_frame = -(-first // period) * period
+            stop = min(stop, move_frame + (end - position - 1) * period)
+            plans.append((unit, path, position, move_frame, period))
+        if stop <= self.frame:
+            return
+
+        arrivals = []
+        for unit, path, position, move_frame, period in plans:
+            if stop <= move_frame:
+                continue
+            moves = (stop - 1 - move_frame) // period + 1
+            cell = path[position + moves]
+            self.__unit_direction[unit] = _VERTICAL if path[position + moves - 1] // ARENA_SIZE == cell // ARENA_SIZE else _HORIZONTAL
+            self.__unit_position[unit] = position + moves
+            self.__unit_steps[unit] += moves
+            self.__unit_trail[unit].extend(path[position + 1:position + moves + 1])
+            arrivals.append((move_frame + (moves - 1) * period, unit, cell))
+        # Units join a cell in the order they reached it, which breaks ties between targets
+        occupancy = self.__occupancy[player_index]
+        for _, unit, cell in sorted(arrivals):
+            units = occupancy[self.unit_cell[unit]]
+            units.remove(unit)
+            if not units:
+                del occupancy[self.unit_cell[unit]]
+            occupancy.setdefault(cell, []).append(unit)
+            self.unit_cell[unit] = cell
+        self.frame = self.result.frames = stop
+
+    def step(self):
+        """Plays one frame
+
+        Returns:
+            True if mobile units are left on the board after the frame
+
+        """
+        frame = self.frame
+        alive = self.unit_alive
+        units = [unit for unit in range(len(alive)) if alive[unit]]
+
+        for player_index in (0, 1):
+            shielding = self.__shielding[player_index]
+            for cell, stack in self.__occupancy[player_index].items():
+                supports = shielding[cell]
+                if not supports:
+                    continue
+                for unit in stack:
+                    shielded = self.__unit_shielded[unit]
+                    if shielded is None:
+                        shielded = self.__unit_shielded[unit] = set()
+                    for support in supports:
+                        if support not in shielded:
+                            shielded.add(support)
+                            spec = self.structure_spec[support]
+                            support_y = support % ARENA_SIZE
+                            rows = support_y if player_index == 0 else ARENA_SIZE - 1 - support_y
+                            self.unit_health[unit] += spec.shieldPerUnit + spec.shieldBonusPerY * rows
+
+        if frame > 0:
+            self.__breach_trails = {}
+            for unit in units:
+                if frame % self.__mobile_rules[self.unit_spec[unit].unit_type][0] == 0:
+                    self.__move(unit)
+            breach_cells = self.result.breach_cells
+            for trail, damage in self.__breach_trails.items():
+                for cell in trail:
+                    location = divmod(cell, ARENA_SIZE)
+                    breach_cells[location] = breach_cells.get(location, 0) + damage
+
+        active = set()
+        for player_index in (0, 1):
+            covering = self.__covering[player_index]
+            for cell in self.__occupancy[1 - player_index]:
+                active.update(covering[cell])
+        for cell in sorted(active):
+            if self.structure_owner[cell]:
+                self.__attack(cell, self.structure_owner[cell] - 1, self.structure_spec[cell])
+        targets = {}
+        for unit in units:
+            if alive[unit]:
+                self.__attack(self.unit_cell[unit], self.unit_owner[unit], self.unit_spec[unit], targets)
+
+        for cell in self.__dying_structures:
+            spec = self.structure_spec[cell]
+            x, y = divmod(cell, ARENA_SIZE)
+            self.result.destroyed.append((x, y, spec.unit_type, self.structure_owner[cell] - 1, frame))
+            self.__remove_structure(cell)
+        self.__dying_structures = []
+        health = self.unit_health
+        remaining = False
+        for unit in units:
+            if alive[unit]:
+                if health[unit] <= 0:
+                    self.result.units_lost[self.unit_owner[unit]] += 1
+                    self.__leave(unit)
+                else:
+                    remaining = True
+
+        self.frame += 1
+        self.result.frames = self.frame
+        return remaining
+
+    def run(self, max_frames=1000):
+        """Plays frames until no mobile unit is left or max_frames were played
+
+        Returns:
+            The SimulationResult
+
+        """
+        start = time.perf_counter()
+        while self.frame < max_frames:
+            self.__skip_quiet_frames(max_frames)
+            if self.frame >= max_frames or not self.step():
+                break
+        self.result.seconds += time.perf_counter() - start
+        self.result.survivors = [0, 0]
+        for unit, alive in enumerate(self.unit_alive):
+            if alive:
+                self.result.survivors[self.unit_owner[unit]] += 1
+        return self.result
+
+    def get_units(self, player_index):
+        """Gets the units of a player as an action frame lists them, to compare the simulation with recorded frames
+
+        Returns:
+            A list with one list of [x, y, health] per unit type, ordered like the config, see ActionFrame.get_units
+
+        """
+        units = [[] for _ in self.__type_index]
+        for cell, owner in enumerate(self.structure_owner):
+            if owner == player_index + 1:
+                x, y = divmod(cell, ARENA_SIZE)
+                units[self.__type_index[self.structure_spec[cell].unit_type]].append([x, y, self.structure_health[cell]])
+        for unit, alive in enumerate(self.unit_alive):
+            if alive and self.unit_owner[unit] == player_index:
+                x, y = divmod(self.unit_cell[unit], ARENA_SIZE)
+                units[self.__type_index[self.unit_spec[unit].unit_type]].append([x, y, self.unit_health[unit]])
+        return units
@@ -1,4 +1,5 @@
 import sys
+import json
 
 
 BANNER_TEXT = "---------------- Starting Your Algo --------------------"
@@ -21,6 +22,34 @@ def get_command():
         exit()
     return ret
 
+class ParsedMessage(str):
+    """A line received from the game engine that keeps its decoded JSON in data, so it only has to be parsed once
+
+    It is still the original str, so code that calls json.loads on it keeps working.
+    """
+    def __new__(cls, line, data):
+        message = super().__new__(cls, line)
+        message.data = data
+        return message
+
+
+def parse_message(message):
+    """Gets the decoded JSON of a message from the game engine
+
+    Args:
+        message: A ParsedMessage, an already decoded dict or a JSON string
+
+    Returns:
+        The decoded message, without parsing it again if that was already done
+
+    """
+    if isinstance(message, dict):
+        return message
+    data = getattr(message, "data", None)
+    if data is not None:
+        return data
+    return json.loads(message)
+
 def send_command(cmd):
     """Sends your turn to standard output.
     Should usually only be called by 'GameState.submit_turn()'
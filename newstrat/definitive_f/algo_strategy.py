@@ -4,7 +4,7 @@ import math
 import copy
 import json
 from sys import maxsize
-from gamelib import GameState, GameMap, GameUnit
+from gamelib import GameState, GameMap, GameUnit, bitboard
 
 # Shorthand constants set in on_game_start
 WALL = SUPPORT = TURRET = SCOUT = DEMOLISHER = INTERCEPTOR = None
@@ -18,6 +18,7 @@ class AlgoStrategy(gamelib.AlgoCore):
     """
     def __init__(self):
         super().__init__()
+        self.subscribe("breach", self.on_breach)
         seed = random.randrange(maxsize)
         random.seed(seed)
         gamelib.debug_write(f"Random seed: {seed}")
@@ -65,6 +66,9 @@ class AlgoStrategy(gamelib.AlgoCore):
         # self.start_points = [[4,12], [10,12], [17,12], [23,12]]
         self.start_points = [[2,12], [5,12], [8,12], [11,12], [14,12], [17,12], [20,12], [23,12], [25,12]]
 
+        # Forked last, so the workers see everything set up above
+        self.simulation_pool = gamelib.SimulationPool(config, self._simulate_path)
+
     def on_turn(self, turn_state):
         """Main turn entry: offense, defense, support."""
         state = GameState(self.config, turn_state)
@@ -105,14 +109,12 @@ class AlgoStrategy(gamelib.AlgoCore):
 
         state.submit_turn()
 
-    def on_action_frame(self, turn_str):
+    def on_breach(self, breach, frame):
         """Track where opponent scores to build reactive defense."""
-        data = json.loads(turn_str)
-        for breach in data.get("events", {}).get("breach", []):
-            loc, owner = breach[0], breach[4]
-            if owner != 1:
-                gamelib.debug_write(f"Opponent scored at {loc}")
-                self.scored_on.append(loc)
+        loc, owner = breach[0], breach[4]
+        if owner != 1:
+            gamelib.debug_write(f"Opponent scored at {loc}")
+            self.scored_on.append(loc)
 
     # ------------------------
     # Initial defense
@@ -604,18 +606,22 @@ class AlgoStrategy(gamelib.AlgoCore):
                 if orig_state.can_spawn(SCOUT, pt):
                     options.append(pt)
 
+        # Batch the starting paths, when evaluating in this process _simulate_path then reads them from the shared path cache
+        orig_state.find_paths_to_edge_many(options)
+
         best = (-1, None, None)  # (survived, loc, attackers_set)
-        for loc in options:
-            state = copy.deepcopy(orig_state)
-            survive, _, _, _, _, _, atk = self._simulate_path(state, loc, num_scouts)
+        results = self.simulation_pool.evaluate_spawns(orig_state, options, num_scouts, self.support_locations)
+        for loc, (survive, _, _, _, _, _, atk) in zip(options, results):
             if survive > best[0]:
                 best = (survive, loc, atk)
 
         return best[1], best[0]
 
-    def _simulate_path(self, state, loc, num_scouts):
+    def _simulate_path(self, state, loc, num_scouts, support_locations=None):
         """Helper to simulate a single scout path. Returns tuple of metrics + attackers set."""
-        temp = copy.deepcopy(state)
+        if support_locations is None:
+            support_locations = self.support_locations
+        temp = state.fork()
         scout_unit = GameUnit(SCOUT, state.config)
         SC_HP, SC_DMG = scout_unit.max_health, scout_unit.damage_f
         sup_info = self.config["unitInformation"][1]
@@ -624,6 +630,7 @@ class AlgoStrategy(gamelib.AlgoCore):
 
         edge = temp.get_target_edge(loc)
         path = temp.find_path_to_edge(loc)
+        pathing = None  # persistent path finder, created on the first kill
         dead = 0
         dmg_turret = dmg_wall = dmg_support = dmg_to_scout = 0
         attackers = set()
@@ -636,7 +643,7 @@ class AlgoStrategy(gamelib.AlgoCore):
             temp.game_map.add_unit(SCOUT, pt)
 
             # shield buff
-            for sup_loc in self.support_locations:
+            for sup_loc in support_locations:
                 sup = temp.contains_stationary_unit(sup_loc)
                 if sup and sup.unit_type == SUPPORT:
                     rng = base_rng + (1 if sup.upgraded else 0)
@@ -657,7 +664,12 @@ class AlgoStrategy(gamelib.AlgoCore):
                     elif tgt.unit_type == WALL:    dmg_wall   += tgt.health
                     elif tgt.unit_type == SUPPORT: dmg_support+= tgt.health
                     temp.game_map.remove_unit([tgt.x, tgt.y])
-                    path = temp.find_path_to_edge(pt, edge)
+                    if pathing is None:
+                        pathing = gamelib.ShortestPathFinder()
+                        pathing.track_edge(temp, temp.game_map.get_edge_locations(edge))
+                    else:
+                        pathing.unblock([tgt.x, tgt.y])
+                    path = pathing.path_from(pt)
                     idx = -1
                     rem -= math.ceil(tgt.health / SC_DMG)
                     break
@@ -758,21 +770,19 @@ class AlgoStrategy(gamelib.AlgoCore):
         Also removes units that are in the right location but wrong type.
         """
         wall_locations, turret_locations = self._get_funnel_locations()
-        
-        # Iterate through all possible positions on the board
-        for x in range(28):
-            for y in range(28):
-                loc = [x, y]
-                if state.contains_stationary_unit(loc):
-                    unit = state.contains_stationary_unit(loc)
-                    # Remove unit if:
-                    # 1. It's not in any funnel location, OR
-                    # 2. It's in a wall location but not a wall, OR
-                    # 3. It's in a turret location but not a turret
-                    if (loc not in wall_locations and loc not in turret_locations) or \
-                       (loc in wall_locations and unit.unit_type != WALL) or \
-                       (loc in turret_locations and unit.unit_type != TURRET):
-                        state.attempt_remove(loc)
+        wall_mask = bitboard.mask_of(wall_locations)
+        turret_mask = bitboard.mask_of(turret_locations)
+        structures = state.game_map.structure_mask()
+
+        # Remove unit if:
+        # 1. It's not in any funnel location, OR
+        # 2. It's in a wall location but not a wall, OR
+        # 3. It's in a turret location but not a turret
+        to_remove = (structures & ~(wall_mask | turret_mask)) | \
+                    (structures & wall_mask & ~state.game_map.structure_mask(unit_type=WALL)) | \
+                    (structures & turret_mask & ~state.game_map.structure_mask(unit_type=TURRET))
+        for loc in bitboard.locations_of(to_remove):
+            state.attempt_remove(loc)
 
     def _update_resource_evolution(self, state: GameState):
         """Update the resource evolution tracking."""
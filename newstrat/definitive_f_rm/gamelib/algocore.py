@@ -1,7 +1,11 @@
 import json
+import time
 
 from .game_state import GameState
-from .util import get_command, debug_write, BANNER_TEXT, send_command
+from .unit import compile_unit_specs
+from .util import get_command, debug_write, BANNER_TEXT, send_command, ParsedMessage
+from .frames import ActionFrame, peek_turn_info
+from .speculation import BackgroundWorker
 
 class AlgoCore(object):
     """
@@ -10,10 +14,26 @@ class AlgoCore(object):
 
     Attributes :
         * config (JSON): json object containing information about the game
+        * log_parse_times (bool): If true, the time spent decoding each message from the engine is written to the debug output
+        * persistent_state (bool): If true, one GameState is kept for the whole game and only the changes of each turn are applied to it,
+          see GameState.apply_turn. GameState(config, turn_state) in on_turn then gives a fork of it instead of parsing the turn again
+        * event_stream (:obj: EventStream): If set, the events of every action frame are added to it, see events.py
+        * background (:obj: BackgroundWorker): Runs the jobs started with speculate, created on the first call, see speculation.py
+        * speculation_wait (float): The longest a turn waits, in seconds, for background jobs on its board that have not finished when its message arrives.
+          0 by default, so turns never wait unless the algo sets it
 
     """
     def __init__(self):
         self.config = None
+        self.log_parse_times = True
+        self._frame_parse_count = 0
+        self._frame_parse_seconds = 0
+        self._event_handlers = {}
+        self.persistent_state = False
+        self.event_stream = None
+        self._game_state = None
+        self.background = None
+        self.speculation_wait = 0
 
     def on_game_start(self, config):
         """
@@ -27,6 +47,7 @@ class AlgoCore(object):
         """
         This step function is called at the start of each turn.
         It is passed the current game state, which can be used to initiate a new GameState object. 
+        The game state is a ParsedMessage, a str that also holds the decoded JSON, so GameState does not parse it again. 
         By default, it sends empty commands to the game engine. \n
         algo_strategy.py inherits from AlgoCore and overrides this on turn function. 
         Adjusting the on_turn function in algo_strategy is the main way to adjust your algo's logic. 
@@ -39,11 +60,66 @@ class AlgoCore(object):
         After each deploy phase, the game engine will run the action phase of the round.
         The action phase is made up of a sequence of distinct frames. 
         Each of these frames is sent to the algo in order. 
-        They can be handled in this function. 
+        They can be handled in this function, or with subscribe for specific event types. 
+        The frame is an ActionFrame, a str that decodes its events and unit arrays only when they are read. 
         """
         pass
 
 
+    def subscribe(self, event_type, handler):
+        """Calls handler for every event of event_type in the action phase, before on_action_frame gets the frame
+
+        Only the events of a frame are decoded to do this, the unit arrays stay undecoded unless on_action_frame reads them.
+
+        Args:
+            event_type: An event type such as "breach", "damage", "death", "shield", "move", "spawn", "attack" or "selfDestruct"
+            handler: A function taking the event, as the list the engine sent, and the ActionFrame it came from
+
+        """
+        self._event_handlers.setdefault(event_type, []).append(handler)
+
+    def _dispatch_events(self, frame):
+        for event_type, handlers in self._event_handlers.items():
+            for event in frame.get_events(event_type):
+                for handler in handlers:
+                    handler(event, frame)
+
+    def speculate(self, name, frame, function, *args, include_health=False):
+        """Runs function(*args) on a background thread during the action phase, for on_turn to pick up with collect
+
+        Call it from on_action_frame with work that only depends on the structures on the board, for example
+        analysing the enemy defense of GameState(self.config, frame). The job is only started again when the
+        structures change, and the next turn only uses its result if its board still has the same structures.
+        The function runs alongside the main thread and may still be running when on_turn starts, so it should
+        not change anything on_turn reads nor use its caches: give the GameStates it builds their own PathCache.
+
+        Args:
+            name: The key to collect the result with
+            frame: The ActionFrame the work is based on
+            function: The function to run
+            include_health: Also require every structure to have the same health on the next turn
+
+        """
+        if self.background is None:
+            self.background = BackgroundWorker()
+        self.background.schedule(name, frame, function, *args, include_health=include_health)
+
+    def collect(self, name, turn_state, timeout=0):
+        """Gets the result of the job started with speculate under name, if the turn starts from the board it was computed on
+
+        Args:
+            name: The name given to speculate
+            turn_state: The message on_turn received
+            timeout: How long to wait for the job if it is still running, in seconds
+
+        Returns:
+            The result, or None if there is no usable one and the work has to be done now
+
+        """
+        if self.background is None:
+            return None
+        return self.background.collect(name, turn_state, timeout)
+
     def start(self):
         """ 
         Start the parsing loop.
@@ -57,31 +133,59 @@ class AlgoCore(object):
             # Note: Python blocks and hangs on stdin. Can cause issues if connections aren't setup properly and may need to
             # manually kill this Python program.
             game_state_string = get_command()
-            if "replaySave" in game_state_string:
+            # Every line is decoded at most once, the handlers get a ParsedMessage that carries the result.
+            # Action frames only have their turnInfo read here, the rest is decoded when a handler asks for it
+            parse_start = time.perf_counter()
+            turn_info = peek_turn_info(game_state_string)
+            if turn_info is not None and turn_info[0] == 1:
+                message = ActionFrame(game_state_string, turn_info)
+            else:
+                try:
+                    message = ParsedMessage(game_state_string, json.loads(game_state_string))
+                except ValueError:
+                    message = None
+            self._log_parse_time(message, time.perf_counter() - parse_start)
+            if isinstance(message, ActionFrame):
+                """
+                This game_state_string string represents a single frame of an action phase
+                """
+                if self.event_stream is not None:
+                    self.event_stream.add_frame(message)
+                self._dispatch_events(message)
+                self.on_action_frame(message)
+            elif message is None or not isinstance(message.data, dict):
+                """
+                Something is wrong? Received an incorrect or improperly formatted string.
+                """
+                debug_write("Got unexpected string : {}".format(game_state_string))
+            elif "unitInformation" in message.data:
                 """
                 This means this must be the config file. So, load in the config file as a json and add it to your AlgoStrategy class.
                 """
-                parsed_config = json.loads(game_state_string)
+                parsed_config = message.data
+                compile_unit_specs(parsed_config)
                 self.on_game_start(parsed_config)
-            elif "turnInfo" in game_state_string:
-                state = json.loads(game_state_string)
-                stateType = int(state.get("turnInfo")[0])
+            elif "turnInfo" in message.data:
+                stateType = int(message.data.get("turnInfo")[0])
                 if stateType == 0:
                     """
                     This is the game turn game state message. Algo must now print to stdout 2 lines, one for build phase one for
                     deploy phase. Printing is handled by the provided functions.
                     """
-                    self.on_turn(game_state_string)
-                elif stateType == 1:
-                    """
-                    If stateType == 1, this game_state_string string represents a single frame of an action phase
-                    """
-                    self.on_action_frame(game_state_string)
+                    if self.background is not None:
+                        self.background.settle(self.speculation_wait, message)
+                    if self.persistent_state:
+                        message.game_state = self._next_game_state(message)
+                    self.on_turn(message)
+                    if self.background is not None and self.log_parse_times:
+                        debug_write("Background results: {} used, {} missed".format(self.background.hits, self.background.misses))
                 elif stateType == 2:
                     """
                     This is the end game message. This means the game is over so break and finish the program.
                     """
                     debug_write("Got end state, game over. Stopping algo.")
+                    if self.background is not None:
+                        self.background.shutdown()
                     break
                 else:
                     """
@@ -93,3 +197,36 @@ class AlgoCore(object):
                 Something is wrong? Received an incorrect or improperly formatted string.
                 """
                 debug_write("Got unexpected string : {}".format(game_state_string))
+
+    def _next_game_state(self, message):
+        """Applies a turn message to the long lived GameState and returns a fork of it for on_turn
+        """
+        start = time.perf_counter()
+        if self._game_state is None or self._game_state.config is not self.config:
+            self._game_state = GameState(self.config, message)
+        else:
+            changed = self._game_state.apply_turn(message)
+            if self.log_parse_times:
+                debug_write("Applied turn {} to the kept state, {} locations changed in {:.2f} ms".format(
+                    self._game_state.turn_number, len(changed), (time.perf_counter() - start) * 1000))
+        return self._game_state.fork()
+
+    def _log_parse_time(self, message, seconds):
+        """Logs how long decoding a message took. Action frames are summed and logged with the next turn message
+        """
+        if not self.log_parse_times:
+            return
+        if isinstance(message, ActionFrame):
+            self._frame_parse_count += 1
+            self._frame_parse_seconds += seconds
+            return
+        turn_info = message.data.get("turnInfo") if message is not None and isinstance(message.data, dict) else None
+        if self._frame_parse_count:
+            debug_write("Read {} action frames in {:.2f} ms".format(self._frame_parse_count, self._frame_parse_seconds * 1000))
+            self._frame_parse_count = 0
+            self._frame_parse_seconds = 0
+        if turn_info is None:
+            kind = "config" if message is not None and isinstance(message.data, dict) and "unitInformation" in message.data else "unexpected"
+        else:
+            kind = "turn {}".format(turn_info[1]) if int(turn_info[0]) == 0 else "end of game"
+        debug_write("Parsed {} message in {:.2f} ms".format(kind, seconds * 1000))
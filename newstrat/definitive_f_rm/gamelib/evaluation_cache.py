@@ -0,0 +1,165 @@
+from collections import OrderedDict
+
+from . import bitboard
+
+
+def structure_signatures(game_state):
+    """Gets what an attack evaluation can depend on for every structure of a GameState
+
+    Returns:
+        A dict from cell id (x * ARENA_SIZE + y) to (unit_type, player_index, health, upgraded)
+
+    """
+    game_map = game_state.game_map
+    signatures = {}
+    for x, y in bitboard.locations_of(game_map.structure_mask()):
+        unit = game_map.get_structure([x, y])
+        signatures[x * game_state.ARENA_SIZE + y] = (unit.unit_type, unit.player_index, unit.health, unit.upgraded)
+    return signatures
+
+
+class EvaluationCache:
+    """A least recently used cache of attack evaluations, kept across turns
+
+    Entries are keyed by (board key, support key, spawn location, unit mix, count). The board key hashes every
+    structure with its health and upgrade, see board_key, the support key is whatever the caller hashes the
+    supports it counts on into. Each entry also keeps a footprint, the bitboard of the cells the evaluation
+    depended on: the cells its units walked through and everything in range of them, see footprint.
+
+    When a turn starts, advance moves every entry whose footprint saw no structure change to the new board
+    and drops the others, so an attack down one side stays cached while the other side is rebuilt.
+
+    Attributes :
+        * capacity (int): The maximum number of evaluations kept before the least recently used one is evicted
+        * radius (float): The longest attack or shield range in the config, anything further from a walked cell cannot affect it
+        * hits (int): Lookups answered from the cache
+        * misses (int): Lookups that found nothing usable
+        * evictions (int): Entries dropped to respect capacity
+        * carried (int): Entries advance moved to a new board
+        * invalidations (int): Entries advance dropped because a structure in their footprint changed
+
+    """
+    def __init__(self, config, capacity=2048):
+        self.capacity = capacity
+        unit_information = config["unitInformation"]
+        self.hit_radius = unit_information[0].get("getHitRadius", 0.51)
+        self.radius = max(info.get(key, 0) for unit in unit_information for info in (unit, unit.get("upgrade") or {})
+                          for key in ("attackRange", "shieldRange"))
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.carried = 0
+        self.invalidations = 0
+        self.__entries = OrderedDict()
+        # The structures of every board an entry may have been stored on since the last advance
+        self.__boards = {}
+
+    def __len__(self):
+        return len(self.__entries)
+
+    def board_key(self, game_state):
+        """Hashes the structures of a GameState, see structure_signatures
+
+        Returns:
+            An int to pass as the board of get and put
+
+        """
+        signatures = structure_signatures(game_state)
+        key = hash(frozenset(signatures.items()))
+        self.__boards.setdefault(key, signatures)
+        return key
+
+    def footprint(self, locations):
+        """Gets the footprint of an evaluation whose units walked through locations
+        """
+        return bitboard.within_range(locations, self.radius, self.hit_radius)
+
+    def get(self, board, support, location, unit_mix, count, path=None):
+        """Gets a cached evaluation
+
+        Args:
+            board: The board key of the state evaluated on, see board_key
+            support: A hashable description of the supports the evaluation counts on
+            location: The spawn location
+            unit_mix: A hashable description of the units sent, such as a tuple of unit types
+            count: The number of units sent
+            path: The path the first unit would now take from location. Entries stored with another path are
+                  misses: a structure removed outside the footprint of an entry can still open a shorter path
+
+        Returns:
+            The cached result, or None on a miss
+
+        """
+        key = (board, support, int(location[0]), int(location[1]), unit_mix, count)
+        entry = self.__entries.get(key)
+        if entry is None or (path is not None and entry[2] != tuple(map(tuple, path))):
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.__entries.move_to_end(key)
+        return entry[0]
+
+    def put(self, board, support, location, unit_mix, count, result, footprint, path=None):
+        """Stores an evaluation, evicting the least recently used entries if the cache is full. See get for the arguments
+        """
+        key = (board, support, int(location[0]), int(location[1]), unit_mix, count)
+        self.__entries[key] = (result, footprint, None if path is None else tuple(map(tuple, path)))
+        self.__entries.move_to_end(key)
+        while len(self.__entries) > self.capacity:
+            self.__entries.popitem(last=False)
+            self.evictions += 1
+
+    def advance(self, game_state):
+        """Moves the entries that are still valid on the board of game_state to it and drops the others.
+        Call it once a turn, before the first lookup
+
+        Returns:
+            The board key of game_state
+
+        """
+        signatures = structure_signatures(game_state)
+        key = hash(frozenset(signatures.items()))
+        changed = {}
+        for board, previous in self.__boards.items():
+            mask = 0
+            for cell in previous.keys() | signatures.keys():
+                if previous.get(cell) != signatures.get(cell):
+                    mask |= 1 << cell
+            changed[board] = mask
+        entries = OrderedDict()
+        for entry_key, entry in self.__entries.items():
+            board = entry_key[0]
+            if board == key:
+                entries[entry_key] = entry
+            elif board in changed and not entry[1] & changed[board]:
+                entries[(key,) + entry_key[1:]] = entry
+                self.carried += 1
+            else:
+                self.invalidations += 1
+        self.__entries = entries
+        self.__boards = {key: signatures}
+        return key
+
+    def clear(self):
+        """Drops every entry, the counters are kept
+        """
+        self.__entries.clear()
+        self.__boards.clear()
+
+    def stats(self):
+        """Gets the cache counters
+
+        Returns:
+            A dict with hits, misses, evictions, carried, invalidations, size and hit_rate
+
+        """
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "carried": self.carried,
+            "invalidations": self.invalidations,
+            "size": len(self.__entries),
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
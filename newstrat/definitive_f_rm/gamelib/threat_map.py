@@ -0,0 +1,122 @@
+from . import geometry
+from .geometry import ARENA_SIZE, NUM_CELLS, ARENA_CELLS
+
+
+class ThreatMap:
+    """The structures threatening every cell of the board, kept up to date as structures change
+
+    Everything is indexed by [attacking player_index][cell id], where cell id = x * ARENA_SIZE + y.
+    GameMap keeps one ThreatMap per board, shared with its forks until one of them changes, and updates it whenever a structure is added or removed,
+    so GameState.get_attackers and path damage sums are lookups instead of range scans.
+
+    Attributes :
+        * max_range (float): The largest base attackRange in the config, the same search radius get_attackers always used
+        * attackers (list): The attacking structures of each player that reach each cell, ordered by their location
+        * damage_i (list): The summed damage_i those structures deal to a mobile unit on each cell
+        * damage_f (list): The summed damage_f those structures deal to a structure on each cell
+
+    """
+    def __init__(self, game_map):
+        self.game_map = game_map
+        unit_information = game_map.config["unitInformation"]
+        self.hit_radius = unit_information[0]['getHitRadius']
+        self.max_range = 0
+        for unit in unit_information:
+            if unit.get('attackRange', 0) >= self.max_range:
+                self.max_range = unit.get('attackRange', 0)
+        self.attackers = [[[] for _ in range(NUM_CELLS)] for _ in range(2)]
+        self.damage_i = [[0] * NUM_CELLS for _ in range(2)]
+        self.damage_f = [[0] * NUM_CELLS for _ in range(2)]
+        # The registration of the structure standing on each cell: (unit, damage_i, damage_f, covered cell ids)
+        self.__sources = [None] * NUM_CELLS
+
+        for cell, x, y in ARENA_CELLS:
+            unit = game_map.get_structure([x, y])
+            if unit is not None:
+                self.__add(cell, unit)
+
+    def _fork(self, game_map):
+        """Gets an independent copy of this ThreatMap for game_map, a fork of the map it follows. Used by GameMap
+        """
+        clone = ThreatMap.__new__(ThreatMap)
+        clone.__dict__.update(self.__dict__)
+        clone.game_map = game_map
+        # The per-cell lists are replaced instead of modified, so the copies can share them
+        clone.attackers = [list(attackers) for attackers in self.attackers]
+        clone.damage_i = [list(damage) for damage in self.damage_i]
+        clone.damage_f = [list(damage) for damage in self.damage_f]
+        clone.__sources = list(self.__sources)
+        return clone
+
+    def __add(self, cell, unit):
+        if unit.damage_i + unit.damage_f <= 0 or unit.player_index not in (0, 1):
+            return
+        x, y = divmod(cell, ARENA_SIZE)
+        covered = tuple(target_x * ARENA_SIZE + target_y
+                        for target_x, target_y in geometry.locations_in_range(x, y, self.max_range, self.hit_radius)
+                        if geometry.distance(x, y, target_x, target_y) <= unit.attackRange)
+        player_index = unit.player_index
+        attackers = self.attackers[player_index]
+        damage_i = self.damage_i[player_index]
+        damage_f = self.damage_f[player_index]
+        for target in covered:
+            # Keep attackers in the order a scan over the board finds them
+            units = attackers[target]
+            position = len(units)
+            while position and units[position - 1].x * ARENA_SIZE + units[position - 1].y > cell:
+                position -= 1
+            attackers[target] = units[:position] + [unit] + units[position:]
+            damage_i[target] += unit.damage_i
+            damage_f[target] += unit.damage_f
+        self.__sources[cell] = (unit, unit.damage_i, unit.damage_f, covered)
+
+    def __remove(self, cell):
+        source = self.__sources[cell]
+        if source is None:
+            return
+        unit, unit_damage_i, unit_damage_f, covered = source
+        attackers = self.attackers[unit.player_index]
+        damage_i = self.damage_i[unit.player_index]
+        damage_f = self.damage_f[unit.player_index]
+        for target in covered:
+            attackers[target] = [other for other in attackers[target] if other is not unit]
+            damage_i[target] -= unit_damage_i
+            damage_f[target] -= unit_damage_f
+        self.__sources[cell] = None
+
+    def update(self, location):
+        """Re-reads the structure at a location. GameMap calls this when a structure is added, removed or upgraded
+        through GameState, call it yourself after upgrading a unit that is already on the map with GameUnit.upgrade
+
+        Args:
+            location: The location of the structure that changed
+
+        """
+        cell = int(location[0]) * ARENA_SIZE + int(location[1])
+        self.__remove(cell)
+        unit = self.game_map.get_structure(location)
+        if unit is not None:
+            self.__add(cell, unit)
+
+    def get_attackers(self, location, player_index):
+        """Gets the structures that would attack a unit of player_index standing at location
+
+        Returns:
+            A new list of GameUnits, in the same order GameState.get_attackers has always returned them
+
+        """
+        return list(self.attackers[1 - player_index][int(location[0]) * ARENA_SIZE + int(location[1])])
+
+    def path_damage(self, path, player_index):
+        """Sums the damage_i every cell of a path takes from the structures threatening a unit of player_index
+
+        Args:
+            path: A list of locations, for example from GameState.find_path_to_edge
+            player_index: The owner of the unit walking the path
+
+        Returns:
+            The damage a unit would take if it stayed one attack cycle on every cell of the path
+
+        """
+        damage_i = self.damage_i[1 - player_index]
+        return sum(damage_i[int(x) * ARENA_SIZE + int(y)] for x, y in path)
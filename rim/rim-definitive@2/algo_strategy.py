@@ -4,7 +4,7 @@ import math
 import copy
 import json
 from sys import maxsize
-from gamelib import GameState, GameMap, GameUnit
+from gamelib import GameState, GameMap, GameUnit, bitboard
 
 # Shorthand constants set in on_game_start
 WALL = SUPPORT = TURRET = SCOUT = DEMOLISHER = INTERCEPTOR = None
@@ -18,6 +18,7 @@ class AlgoStrategy(gamelib.AlgoCore):
     """
     def __init__(self):
         super().__init__()
+        self.subscribe("breach", self.on_breach)
         seed = random.randrange(maxsize)
         random.seed(seed)
         gamelib.debug_write(f"Random seed: {seed}")
@@ -97,6 +98,9 @@ class AlgoStrategy(gamelib.AlgoCore):
                 for x in range(x_min, x_max + 1):
                     self.support_mask[x][y] = True
 
+        # Forked last, so the workers see everything set up above
+        self.simulation_pool = gamelib.SimulationPool(config, self._simulate_path)
+
     def on_turn(self, turn_state):
         """Main turn entry: offense, defense, support."""
         state = GameState(self.config, turn_state)
@@ -163,18 +167,16 @@ class AlgoStrategy(gamelib.AlgoCore):
 
         state.submit_turn()
 
-    def on_action_frame(self, turn_str):
+    def on_breach(self, breach, frame):
         """Stamp breaches with turn so we know where+when they happen."""
-        data = json.loads(turn_str)
-        for breach in data.get("events", {}).get("breach", []):
-            loc, owner = tuple(breach[0]), breach[4]
-            if owner != 1:
-                # record both location and the turn number
-                self.scored_on.append({
-                    "loc": loc,
-                    "turn": self.last_turn  # we'll set last_turn in on_turn
-                })
-                gamelib.debug_write(f"Opponent breached at {loc} on turn {self.last_turn}")
+        loc, owner = tuple(breach[0]), breach[4]
+        if owner != 1:
+            # record both location and the turn number
+            self.scored_on.append({
+                "loc": loc,
+                "turn": self.last_turn  # we'll set last_turn in on_turn
+            })
+            gamelib.debug_write(f"Opponent breached at {loc} on turn {self.last_turn}")
 
     # ------------------------
     # Initial defense
@@ -357,14 +359,9 @@ class AlgoStrategy(gamelib.AlgoCore):
         """
         Return True if every location in self.wallresnd has an intact WALL unit.
         """
-        for loc in self.wallresnd:
-            # retrieve the stationary unit (not just a boolean)
-            unit = state.contains_stationary_unit(loc)
-            # if there's no unit here, or it's not a WALL, integrity is broken
-            if getattr(unit, 'unit_type', None) != WALL:
-                return False
-
-        return True
+        # if any location has no unit, or it's not a WALL, integrity is broken
+        wall_line = bitboard.mask_of(self.wallresnd)
+        return (state.game_map.structure_mask(unit_type=WALL) & wall_line) == wall_line
 
     def try_build_upgraded_turret(self, state: GameState, seq):
         if state.get_resource(MP) < 8:
@@ -547,18 +544,22 @@ class AlgoStrategy(gamelib.AlgoCore):
                 if orig_state.can_spawn(SCOUT, pt):
                     options.append(pt)
 
+        # Batch the starting paths, when evaluating in this process _simulate_path then reads them from the shared path cache
+        orig_state.find_paths_to_edge_many(options)
+
         best = (-1, None, None)  # (survived, loc, attackers_set)
-        for loc in options:
-            state = copy.deepcopy(orig_state)
-            survive, _, _, _, _, _, atk = self._simulate_path(state, loc, num_scouts)
+        results = self.simulation_pool.evaluate_spawns(orig_state, options, num_scouts, self.support_locations)
+        for loc, (survive, _, _, _, _, _, atk) in zip(options, results):
             if survive > best[0]:
                 best = (survive, loc, atk)
 
         return best[1], best[0]
 
-    def _simulate_path(self, state, loc, num_scouts):
+    def _simulate_path(self, state, loc, num_scouts, support_locations=None):
         """Helper to simulate a single scout path. Returns tuple of metrics + attackers set."""
-        temp = copy.deepcopy(state)
+        if support_locations is None:
+            support_locations = self.support_locations
+        temp = state.fork()
         scout_unit = GameUnit(SCOUT, state.config)
         SC_HP, SC_DMG = scout_unit.max_health, scout_unit.damage_f
         sup_info = self.config["unitInformation"][1]
@@ -567,6 +568,7 @@ class AlgoStrategy(gamelib.AlgoCore):
 
         edge = temp.get_target_edge(loc)
         path = temp.find_path_to_edge(loc)
+        pathing = None  # persistent path finder, created on the first kill
         dead = 0
         dmg_turret = dmg_wall = dmg_support = dmg_to_scout = 0
         attackers = set()
@@ -579,7 +581,7 @@ class AlgoStrategy(gamelib.AlgoCore):
             temp.game_map.add_unit(SCOUT, pt)
 
             # shield buff
-            for sup_loc in self.support_locations:
+            for sup_loc in support_locations:
                 sup = temp.contains_stationary_unit(sup_loc)
                 if sup and sup.unit_type == SUPPORT:
                     rng = base_rng + (1 if sup.upgraded else 0)
@@ -600,7 +602,12 @@ class AlgoStrategy(gamelib.AlgoCore):
                     elif tgt.unit_type == WALL:    dmg_wall   += tgt.health
                     elif tgt.unit_type == SUPPORT: dmg_support+= tgt.health
                     temp.game_map.remove_unit([tgt.x, tgt.y])
-                    path = temp.find_path_to_edge(pt, edge)
+                    if pathing is None:
+                        pathing = gamelib.ShortestPathFinder()
+                        pathing.track_edge(temp, temp.game_map.get_edge_locations(edge))
+                    else:
+                        pathing.unblock([tgt.x, tgt.y])
+                    path = pathing.path_from(pt)
                     idx = -1
                     rem -= math.ceil(tgt.health / SC_DMG)
                     break
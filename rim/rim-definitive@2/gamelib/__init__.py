@@ -16,14 +16,53 @@ Investigating it is useful for advanced players interested in getting data from
 The Navigation class in navigation.py contains functions related to path-finding, which are used by GameState in pathing related functions. 
 Investigating it is useful for advanced player who want to optimize the slow default pathing algorithm we provide. \n 
 
-util.py contains a small handful of functions that help with communication, including the debug-printing function, debug_write().
+The PathCache class in path_cache.py remembers paths across turns for as long as the structure layout they were computed on stays the same. \n
+
+The EvaluationCache class in evaluation_cache.py keeps attack evaluations across turns, dropping only those whose units walked near a structure that changed. \n
+
+The Reachability class in reachability.py labels the connected free areas of the board, answering "can this location reach that edge" without pathing. \n
+
+The ActionFrame class in frames.py is what on_action_frame receives: an action phase frame that only decodes its events and unit arrays when they are read.
+AlgoCore.subscribe calls a handler for every event of a given type without decoding the rest of the frame. \n
+
+The EventStream class in events.py keeps every action phase event of the game as typed columns,
+with helpers such as the damage each structure took in a turn. Set AlgoCore.event_stream to fill it. \n
+
+The BackgroundWorker class in speculation.py runs work on a background thread during the action phase. AlgoCore.speculate starts it from a frame
+and AlgoCore.collect hands the result to the next turn, if that turn starts with the same structures on the board. \n
+
+The Simulator class in simulator.py plays the action phase of a GameState frame by frame: movement at each unit's speed,
+targeting, shields, self destructs and breaches, on flat arrays so a whole wave takes a few milliseconds. \n
+
+The BreachForecast class in forecast.py sends a wave from every free spawn location of a player, your opponent by default,
+and keeps the lanes that scored and the breach damage expected through every location. Spawn locations that meet the same
+structures share one simulation. \n
+
+The SimulationPool class in parallel.py evaluates many spawn locations at once on worker processes forked at the start of the game,
+and evaluates them one after the other when processes are not available. \n
+
+geometry.py holds precomputed tables about the arena: bounds, edges, iteration order and distances between cells. \n
+
+bitboard.py holds helpers for bitboards, ints with one bit per cell, such as the structure masks returned by GameMap.structure_mask(). \n
+
+util.py contains a small handful of functions that help with communication, including the debug-printing function, debug_write(),
+and parse_message(), which reads the JSON AlgoCore already decoded from a message instead of parsing it again.
 """
 
 from .algocore import AlgoCore
-from .util import debug_write
+from .util import debug_write, parse_message
 from .game_state import GameState
 from .unit import GameUnit
 from .game_map import GameMap
+from .navigation import ShortestPathFinder
+from .path_cache import PathCache
+from .evaluation_cache import EvaluationCache
+from .reachability import Reachability
+from .frames import ActionFrame
+from .events import EventStream
+from .simulator import Simulator
+from .forecast import BreachForecast
+from .parallel import SimulationPool
 
-__all__ = ["algocore", "game_state", "game_map", "navigation", "unit", "util"]
+__all__ = ["algocore", "bitboard", "evaluation_cache", "events", "forecast", "frames", "game_state", "game_map", "geometry", "navigation", "parallel", "path_cache", "reachability", "simulator", "speculation", "unit", "util"]
  
\ No newline at end of file
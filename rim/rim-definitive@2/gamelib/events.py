@@ -0,0 +1,191 @@
+"""
+Action phase events stored as typed columns.
+
+Every frame of the action phase lists what happened during it: damage, deaths, shields, attacks,
+moves, spawns, breaches and self destructs. EventStream keeps these for the whole game in one
+array per field and event type, each row tagged with its turn and frame, and answers questions
+like "how much damage did each of our structures take last turn" from them.
+
+Player indexes follow the rest of gamelib: 0 for you and 1 for your opponent, where the engine sends 1 and 2.
+"""
+from array import array
+from bisect import bisect_left, bisect_right
+
+from .util import parse_message
+
+# The columns kept for each event type: (name, array typecode, where to read it in the event list)
+_XY = (("x", "b", (0, 0)), ("y", "b", (0, 1)))
+_TARGET = (("target_x", "b", (1, 0)), ("target_y", "b", (1, 1)))
+EVENT_COLUMNS = {
+    "breach": _XY + (("damage", "d", 1), ("unit_type", "b", 2), ("unit_id", "q", 3), ("player", "b", 4)),
+    "damage": _XY + (("damage", "d", 1), ("unit_type", "b", 2), ("unit_id", "q", 3), ("player", "b", 4)),
+    "death": _XY + (("unit_type", "b", 1), ("unit_id", "q", 2), ("player", "b", 3), ("removed", "b", 4)),
+    "spawn": _XY + (("unit_type", "b", 1), ("unit_id", "q", 2), ("player", "b", 3)),
+    "move": _XY + _TARGET + (("unit_type", "b", 3), ("unit_id", "q", 4), ("player", "b", 5)),
+    "shield": _XY + _TARGET + (("amount", "d", 2), ("unit_type", "b", 3), ("unit_id", "q", 4), ("target_id", "q", 5), ("player", "b", 6)),
+    "attack": _XY + _TARGET + (("damage", "d", 2), ("unit_type", "b", 3), ("unit_id", "q", 4), ("target_id", "q", 5), ("player", "b", 6)),
+    "melee": _XY + _TARGET + (("damage", "d", 2), ("unit_type", "b", 3), ("unit_id", "q", 4), ("target_id", "q", 5), ("player", "b", 6)),
+    "selfDestruct": _XY + (("damage", "d", 2), ("unit_type", "b", 3), ("unit_id", "q", 4), ("player", "b", 5)),
+}
+
+
+def _read(event, where, typecode):
+    value = event
+    for index in (where if isinstance(where, tuple) else (where,)):
+        value = value[index]
+    if typecode == "d":
+        return float(value)
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        # Ids are sent as digit strings, anything else is kept as unknown
+        return -1
+
+
+class EventTable:
+    """The events of one type, one array per field
+
+    Attributes :
+        * event_type (string): The event type, a key of EVENT_COLUMNS
+        * columns (dict): Maps every field, plus "turn" and "frame", to an array with one entry per event
+
+    """
+    def __init__(self, event_type):
+        self.event_type = event_type
+        self.__fields = EVENT_COLUMNS[event_type]
+        self.columns = {"turn": array("i"), "frame": array("i")}
+        for name, typecode, _ in self.__fields:
+            self.columns[name] = array(typecode)
+
+    def __len__(self):
+        return len(self.columns["turn"])
+
+    def append(self, event, turn, frame):
+        """Adds one event as the engine sent it
+        """
+        values = [_read(event, where, typecode) for _, typecode, where in self.__fields]
+        self.columns["turn"].append(turn)
+        self.columns["frame"].append(frame)
+        for (name, _, _), value in zip(self.__fields, values):
+            self.columns[name].append(value)
+
+    def column(self, name):
+        return self.columns[name]
+
+    def rows(self, turn=None, player_index=None):
+        """Gets the indexes of the events of a turn and player, every turn or player if None
+        """
+        turns = self.columns["turn"]
+        # Frames arrive in order, so the events of one turn are a single run of rows
+        rows = range(len(turns)) if turn is None else range(bisect_left(turns, turn), bisect_right(turns, turn))
+        if player_index is None:
+            return list(rows)
+        players = self.columns["player"]
+        return [row for row in rows if players[row] == player_index + 1]
+
+    def discard_before(self, turn):
+        """Drops every event of the turns before turn, to bound memory in long games
+        """
+        keep = bisect_left(self.columns["turn"], turn)
+        for column in self.columns.values():
+            del column[:keep]
+
+
+class EventStream:
+    """Every action phase event of the game, by type, see EventTable
+
+    Set AlgoCore.event_stream to an EventStream and every action frame is added to it,
+    or call add_frame yourself from on_action_frame.
+
+    Attributes :
+        * tables (dict): Maps every event type to its EventTable
+        * structure_types (tuple): The unit type indexes, as sent in events, of the structures
+
+    """
+    def __init__(self, config=None):
+        self.tables = {event_type: EventTable(event_type) for event_type in EVENT_COLUMNS}
+        if config is None:
+            self.structure_types = (0, 1, 2)
+        else:
+            self.structure_types = tuple(index for index, unit in enumerate(config["unitInformation"]) if unit.get("unitCategory") == 0)
+
+    def __getitem__(self, event_type):
+        return self.tables[event_type]
+
+    def add_frame(self, frame):
+        """Adds the events of one action frame
+
+        Args:
+            frame: An ActionFrame, a ParsedMessage, a decoded frame or its JSON string
+
+        """
+        if hasattr(frame, "get_events"):
+            turn_info, events = frame.turn_info, frame.events
+        else:
+            data = parse_message(frame)
+            turn_info, events = data["turnInfo"], data.get("events", {})
+        turn, frame_number = int(turn_info[1]), int(turn_info[2])
+        for event_type, frame_events in events.items():
+            table = self.tables.get(event_type)
+            if table is not None:
+                for event in frame_events:
+                    table.append(event, turn, frame_number)
+
+    def discard_before(self, turn):
+        """Drops every event of the turns before turn
+        """
+        for table in self.tables.values():
+            table.discard_before(turn)
+
+    def damage_by_cell(self, turn=None, player_index=0, structures_only=True):
+        """Sums the damage taken on each location
+
+        Args:
+            turn: Only count this turn's action phase, every turn if None
+            player_index: The owner of the damaged units, 0 for you 1 for your opponent
+            structures_only: Only count damage to structures
+
+        Returns:
+            A dict from (x, y) to the damage taken there
+
+        """
+        table = self.tables["damage"]
+        xs, ys, damage, unit_types = table.column("x"), table.column("y"), table.column("damage"), table.column("unit_type")
+        totals = {}
+        for row in table.rows(turn, player_index):
+            if not structures_only or unit_types[row] in self.structure_types:
+                location = (xs[row], ys[row])
+                totals[location] = totals.get(location, 0) + damage[row]
+        return totals
+
+    def breaches(self, turn=None, player_index=None):
+        """Gets the breaches of a turn
+
+        Args:
+            turn: Only this turn's action phase, every turn if None
+            player_index: The owner of the units that scored, both players if None
+
+        Returns:
+            A list of ((x, y), damage) in the order they happened
+
+        """
+        table = self.tables["breach"]
+        xs, ys, damage = table.column("x"), table.column("y"), table.column("damage")
+        return [((xs[row], ys[row]), damage[row]) for row in table.rows(turn, player_index)]
+
+    def deaths(self, turn=None, player_index=None, structures_only=False):
+        """Gets the locations units died on, not counting units their owner removed
+
+        Returns:
+            A list of (x, y) in the order the units died
+
+        """
+        table = self.tables["death"]
+        xs, ys, unit_types, removed = table.column("x"), table.column("y"), table.column("unit_type"), table.column("removed")
+        return [(xs[row], ys[row]) for row in table.rows(turn, player_index)
+                if not removed[row] and (not structures_only or unit_types[row] in self.structure_types)]
+
+    def count(self, event_type, turn=None, player_index=None):
+        """Counts the events of a type
+        """
+        return len(self.tables[event_type].rows(turn, player_index))
@@ -2,7 +2,64 @@ import heapq
 import math
 import sys
 import queue
+from collections import deque
 from .util import debug_write
+from .geometry import ARENA_SIZE, HALF_ARENA, NUM_CELLS, NEIGHBORS, EDGES
+
+_NO_BLOCKERS = bytes(NUM_CELLS)
+_NO_PATHLENGTHS = [-1] * NUM_CELLS
+
+
+class EdgeTable:
+    """Precomputed pathing data for one set of endpoints
+
+    Attributes :
+        * targets (tuple): The cell ids of the endpoints, in the order they were given
+        * is_target (bytes): 1 for every cell id that is an endpoint
+        * idealness (tuple): The idealness of every cell id, sys.maxsize for endpoints
+        * direction (tuple): (x, y) direction of the edge, for example (1, 1) for the top right
+
+    """
+    __slots__ = ("targets", "is_target", "idealness", "direction")
+
+    def __init__(self, end_points):
+        self.targets = tuple(int(x) * ARENA_SIZE + int(y) for x, y in end_points)
+        x, y = end_points[0]
+        self.direction = (-1 if x < HALF_ARENA else 1, -1 if y < HALF_ARENA else 1)
+        is_target = bytearray(NUM_CELLS)
+        for cell in self.targets:
+            is_target[cell] = 1
+        self.is_target = bytes(is_target)
+
+        # Better self destruct locations are further towards the edge, rows count more than columns
+        idealness = []
+        for cell in range(NUM_CELLS):
+            x, y = divmod(cell, ARENA_SIZE)
+            if is_target[cell]:
+                idealness.append(sys.maxsize)
+                continue
+            row = y if self.direction[1] == 1 else 27 - y
+            column = x if self.direction[0] == 1 else 27 - x
+            idealness.append(28 * row + column)
+        self.idealness = tuple(idealness)
+
+
+# One table per GameMap edge constant, indexed the same way
+EDGE_TABLES = tuple(EdgeTable(edge) for edge in EDGES)
+_EDGE_TABLES_BY_TARGETS = {table.targets: table for table in EDGE_TABLES}
+
+
+def edge_table(end_points):
+    """Gets the EdgeTable for a list of endpoints, one of the static EDGE_TABLES for the four standard edges
+    """
+    table = _EDGE_TABLES_BY_TARGETS.get(tuple(int(x) * ARENA_SIZE + int(y) for x, y in end_points))
+    if table is None:
+        table = EdgeTable(end_points)
+        # Custom endpoint lists are rare, keep a handful around
+        if len(_EDGE_TABLES_BY_TARGETS) < 64:
+            _EDGE_TABLES_BY_TARGETS[table.targets] = table
+    return table
+
 
 class Node:
     """A path-finding node
@@ -21,13 +78,405 @@ class Node:
         self.pathlength = -1
 
 """
-This class helps with pathfinding. We guarantee the results will
-be accurate, but top players may want to write their own pathfinding
-code to maximise time efficiency
+This class helps with pathfinding. It follows exactly the same rules as the
+original LegacyShortestPathFinder, but keeps its working data in flat arrays
+indexed by cell id instead of allocating a Node per tile on every call.
 """
 class ShortestPathFinder:
     """Handles path-finding
 
+    Attributes :
+        * HORIZONTAL (int): A constant representing a horizontal movement
+        * VERTICAL (int): A constant representing a vertical movement
+
+        * game_state (:obj: GameState): The current gamestate
+        * blocked (bytearray): 1 for every cell id holding a structure
+        * pathlength (list): The distance between each cell id and the target location, -1 if unvisited
+        * visited_idealness (bytearray): 1 for every cell id reached during the idealness search step
+        * tracked_end_points (list): The end points of the persistent distance field, None outside of persistent mode
+        * tracked_edge (:obj: EdgeTable): Pathing tables for tracked_end_points
+
+    """
+    def __init__(self):
+        self.HORIZONTAL = 1
+        self.VERTICAL = 2
+        self.initialized = False
+        self.game_state = None
+        self.blocked = bytearray(NUM_CELLS)
+        self.pathlength = list(_NO_PATHLENGTHS)
+        self.visited_idealness = bytearray(NUM_CELLS)
+        self.tracked_end_points = None
+        self.tracked_edge = None
+
+    def initialize_map(self, game_state):
+        """Initializes the map
+
+        Args:
+            game_state: A GameState object representing the gamestate we want to traverse
+        """
+        self.initialized = True
+        self.game_state = game_state
+        self.tracked_end_points = None
+        self.pathlength[:] = _NO_PATHLENGTHS
+        self.visited_idealness[:] = _NO_BLOCKERS
+        self.blocked[:] = game_state.game_map.structure_layout()
+
+    def navigate_multiple_endpoints(self, start_point, end_points, game_state):
+        """Finds the path a unit would take to reach a set of endpoints
+
+        Args:
+            * start_point: The starting location of the unit
+            * end_points: The end points of the unit, should be a list of edge locations
+            * game_state: The current game state
+
+        Returns:
+            The path a unit at start_point would take when trying to reach end_points given the current game state.
+            Note that this path can change if a tower is destroyed during pathing, or if you or your enemy places structures.
+
+        """
+        if game_state.contains_stationary_unit(start_point):
+            return
+
+        self.initialize_map(game_state)
+        start = int(start_point[0]) * ARENA_SIZE + int(start_point[1])
+        edge = edge_table(end_points)
+        self._validate(self._idealness_search(start, edge), edge)
+        return self._get_path(start_point, start, edge)
+
+    def navigate_many_starts(self, start_points, end_points, game_state):
+        """Finds the paths units at several start points would take to reach the same set of endpoints
+
+        The pathlengths only depend on the structures and on the pocket of free space a start
+        is in, so they are computed once per pocket and shared by every start inside it.
+        When the endpoints are reachable that is a single search for the whole board.
+
+        Args:
+            * start_points: The starting locations of the units
+            * end_points: The end points of the units, should be a list of edge locations
+            * game_state: The current game state
+
+        Returns:
+            A list with the path for each start point, in the same order. Starts that are blocked
+            or outside the arena get None.
+
+        """
+        self.initialize_map(game_state)
+        blocked = self.blocked
+        pathlength = self.pathlength
+        edge = edge_table(end_points)
+        in_arena_bounds = game_state.game_map.in_arena_bounds
+
+        paths = []
+        for start_point in start_points:
+            if not in_arena_bounds(start_point):
+                paths.append(None)
+                continue
+            start = int(start_point[0]) * ARENA_SIZE + int(start_point[1])
+            if blocked[start]:
+                paths.append(None)
+                continue
+            if pathlength[start] == -1:
+                self._validate(self._idealness_search(start, edge), edge)
+            paths.append(self._get_path(start_point, start, edge))
+        return paths
+
+    def track_edge(self, game_state, end_points):
+        """Enters persistent mode: computes the distance field to a set of endpoints once and keeps it
+        up to date through block and unblock instead of searching the board again for every path.
+
+        Args:
+            * game_state: The game state whose structures make up the initial blockers
+            * end_points: The end points to track, should be a list of edge locations
+
+        """
+        self.initialize_map(game_state)
+        self.tracked_end_points = end_points
+        self.tracked_edge = edge_table(end_points)
+        self._validate(self.tracked_edge.targets[0], self.tracked_edge)
+
+    def path_from(self, start_point, move_direction=0):
+        """Gets the path from a start point to the tracked endpoints, see track_edge
+
+        Args:
+            * start_point: The starting location of the unit
+            * move_direction: HORIZONTAL or VERTICAL if the unit is already walking and its last move was along that axis
+
+        Returns:
+            The same path navigate_multiple_endpoints would return for the current blockers, or None if the start is blocked
+
+        """
+        if self.tracked_end_points is None:
+            debug_write("Attempted to use path_from outside of persistent mode. Use 'this_object.track_edge(game_state, end_points)' first")
+            return
+        start = int(start_point[0]) * ARENA_SIZE + int(start_point[1])
+        if self.blocked[start]:
+            return
+        if self.pathlength[start] != -1:
+            return self._get_path(start_point, start, self.tracked_edge, move_direction)
+
+        # The start's pocket cannot reach the edge, its self destruct path needs a search of its own
+        pocket_finder = ShortestPathFinder()
+        pocket_finder.initialized = True
+        pocket_finder.game_state = self.game_state
+        pocket_finder.blocked[:] = self.blocked
+        pocket_finder._validate(pocket_finder._idealness_search(start, self.tracked_edge), self.tracked_edge)
+        return pocket_finder._get_path(start_point, start, self.tracked_edge, move_direction)
+
+    def fork(self):
+        """Gets an independent copy of this finder, in the same persistent mode if it is in one.
+        Much cheaper than track_edge when exploring several sequences of block and unblock from one layout
+
+        Returns:
+            A new ShortestPathFinder
+
+        """
+        clone = ShortestPathFinder()
+        clone.initialized = self.initialized
+        clone.game_state = self.game_state
+        clone.blocked[:] = self.blocked
+        clone.pathlength[:] = self.pathlength
+        clone.tracked_end_points = self.tracked_end_points
+        clone.tracked_edge = self.tracked_edge
+        return clone
+
+    def unblock(self, location):
+        """Removes a blocker in persistent mode and repairs the distance field.
+        Opening a cell can only shorten distances, so this is a BFS wave spreading out from that cell.
+
+        Args:
+            * location: The location of the destroyed or removed structure
+
+        """
+        cell = int(location[0]) * ARENA_SIZE + int(location[1])
+        blocked = self.blocked
+        if not blocked[cell]:
+            return
+        blocked[cell] = 0
+        pathlength = self.pathlength
+        # Endpoints keep the 0 they were seeded with even while blocked
+        if pathlength[cell] != 0:
+            reachable = [pathlength[neighbor] for neighbor in NEIGHBORS[cell] if not blocked[neighbor] and pathlength[neighbor] != -1]
+            pathlength[cell] = min(reachable) + 1 if reachable else -1
+        if pathlength[cell] == -1:
+            return
+
+        current = deque((cell,))
+        pop = current.popleft
+        push = current.append
+        while current:
+            cell = pop()
+            next_length = pathlength[cell] + 1
+            for neighbor in NEIGHBORS[cell]:
+                if blocked[neighbor]:
+                    continue
+                if pathlength[neighbor] == -1 or pathlength[neighbor] > next_length:
+                    pathlength[neighbor] = next_length
+                    push(neighbor)
+
+    def block(self, location):
+        """Adds a blocker in persistent mode and repairs the distance field.
+        Only the cells whose every shortest route went through the new blocker are recomputed.
+
+        Args:
+            * location: The location of the new structure
+
+        """
+        cell = int(location[0]) * ARENA_SIZE + int(location[1])
+        blocked = self.blocked
+        if blocked[cell]:
+            return
+        blocked[cell] = 1
+        pathlength = self.pathlength
+        if pathlength[cell] == -1:
+            return
+        if pathlength[cell] != 0:
+            pathlength[cell] = -1
+
+        # Collect the cells left without a neighbor one step closer to the target
+        orphans = set()
+        pending = [neighbor for neighbor in NEIGHBORS[cell] if not blocked[neighbor] and pathlength[neighbor] > 0]
+        while pending:
+            candidate = pending.pop()
+            if candidate in orphans:
+                continue
+            parent_length = pathlength[candidate] - 1
+            if any(not blocked[neighbor] and neighbor not in orphans and pathlength[neighbor] == parent_length
+                   for neighbor in NEIGHBORS[candidate]):
+                continue
+            orphans.add(candidate)
+            pending.extend(neighbor for neighbor in NEIGHBORS[candidate]
+                           if not blocked[neighbor] and pathlength[neighbor] == parent_length + 2)
+
+        # Re-grow the orphaned region from its surviving border, nearest first
+        frontier = []
+        for orphan in orphans:
+            pathlength[orphan] = -1
+        for orphan in orphans:
+            reachable = [pathlength[neighbor] for neighbor in NEIGHBORS[orphan]
+                         if not blocked[neighbor] and neighbor not in orphans and pathlength[neighbor] != -1]
+            if reachable:
+                heapq.heappush(frontier, (min(reachable) + 1, orphan))
+        while frontier:
+            length, orphan = heapq.heappop(frontier)
+            if pathlength[orphan] != -1:
+                continue
+            pathlength[orphan] = length
+            for neighbor in NEIGHBORS[orphan]:
+                if neighbor in orphans and pathlength[neighbor] == -1:
+                    heapq.heappush(frontier, (length + 1, neighbor))
+
+    def _idealness_search(self, start, edge):
+        """
+        Finds the most ideal tile in our 'pocket' of pathable space. 
+        The edge if it is available, or the best self destruct location otherwise
+        """
+        is_target = edge.is_target
+        if is_target[start]:
+            return start
+        blocked = self.blocked
+        visited = self.visited_idealness
+        idealness = edge.idealness
+        visited[start] = 1
+        best_idealness = idealness[start]
+        most_ideal = start
+
+        current = deque((start,))
+        pop = current.popleft
+        push = current.append
+        while current:
+            for neighbor in NEIGHBORS[pop()]:
+                if blocked[neighbor] or visited[neighbor]:
+                    continue
+                # Any reachable endpoint is perfectly ideal and _validate seeds them all, so stop here
+                if is_target[neighbor]:
+                    return neighbor
+                visited[neighbor] = 1
+                if idealness[neighbor] > best_idealness:
+                    best_idealness = idealness[neighbor]
+                    most_ideal = neighbor
+                push(neighbor)
+
+        return most_ideal
+
+    def _validate(self, ideal_tile, edge):
+        """Breadth first search of the grid, setting the pathlengths of each cell
+
+        """
+        blocked = self.blocked
+        pathlength = self.pathlength
+        seeds = edge.targets if edge.is_target[ideal_tile] else (ideal_tile,)
+        for cell in seeds:
+            pathlength[cell] = 0
+
+        current = deque(seeds)
+        pop = current.popleft
+        push = current.append
+        while current:
+            cell = pop()
+            # Blocked endpoints are seeded but never expanded
+            if blocked[cell]:
+                continue
+            next_length = pathlength[cell] + 1
+            for neighbor in NEIGHBORS[cell]:
+                if blocked[neighbor] or pathlength[neighbor] != -1:
+                    continue
+                pathlength[neighbor] = next_length
+                push(neighbor)
+
+    def _get_path(self, start_point, start, edge, move_direction=0):
+        """Once all cells are validated, and a target is found, the unit can path to its target
+
+        """
+        pathlength = self.pathlength
+        path = [start_point]
+        current = start
+
+        while pathlength[current] != 0:
+            next_move = self._choose_next_move(current, move_direction, edge.direction)
+            if current // ARENA_SIZE == next_move // ARENA_SIZE:
+                move_direction = self.VERTICAL
+            else:
+                move_direction = self.HORIZONTAL
+            path.append(list(divmod(next_move, ARENA_SIZE)))
+            current = next_move
+
+        return path
+
+    def _choose_next_move(self, current_point, previous_move_direction, direction):
+        """Given the current cell and adjacent cells, return the best 'next step' for a given unit to take
+        """
+        blocked = self.blocked
+        pathlength = self.pathlength
+        ideal_neighbor = current_point
+        best_pathlength = pathlength[current_point]
+        for neighbor in NEIGHBORS[current_point]:
+            if blocked[neighbor]:
+                continue
+            current_pathlength = pathlength[neighbor]
+            if current_pathlength > best_pathlength:
+                continue
+            if current_pathlength == best_pathlength and not self._better_direction(current_point, neighbor, ideal_neighbor, previous_move_direction, direction):
+                continue
+            ideal_neighbor = neighbor
+            best_pathlength = current_pathlength
+
+        return ideal_neighbor
+
+    def _better_direction(self, prev_tile, new_tile, prev_best, previous_move_direction, direction):
+        """Compare two cells and return True if the unit would rather move to the new one
+
+        """
+        prev_x, prev_y = divmod(prev_tile, ARENA_SIZE)
+        new_x, new_y = divmod(new_tile, ARENA_SIZE)
+        best_x, best_y = divmod(prev_best, ARENA_SIZE)
+        # Prefer changing axis after each move, see LegacyShortestPathFinder._better_direction
+        if previous_move_direction == self.HORIZONTAL and not new_x == best_x:
+            return prev_y != new_y
+        if previous_move_direction == self.VERTICAL and not new_y == best_y:
+            return prev_x != new_x
+        if previous_move_direction == 0:
+            return prev_y != new_y
+
+        # Both moves are on the same axis, prefer the one towards the target edge
+        if new_y == best_y:
+            return (direction[0] == 1 and new_x > best_x) or (direction[0] == -1 and new_x < best_x)
+        if new_x == best_x:
+            return (direction[1] == 1 and new_y > best_y) or (direction[1] == -1 and new_y < best_y)
+        return True
+
+    def print_map(self):
+        """Prints an ASCII version of the current game map for debug purposes
+
+        """
+        if not self.initialized:
+            debug_write("Attempted to print_map before pathfinder initialization. Use 'this_object.initialize_map(game_state)' to initialize the map first")
+            return
+
+        for y in range(28):
+            for x in range(28):
+                cell = x * ARENA_SIZE + 28 - y - 1
+                if not self.blocked[cell] and not self.pathlength[cell] == -1:
+                    self._print_justified(self.pathlength[cell])
+                else:
+                    sys.stderr.write("   ")
+            debug_write("")
+
+    def _print_justified(self, number):
+        """Prints a number between 100 and -10 in 3 spaces
+
+        """
+        if number < 10 and number > -1:
+            sys.stderr.write(" ")
+        sys.stderr.write(str(number))
+        sys.stderr.write(" ")
+
+
+class LegacyShortestPathFinder:
+    """The original node based path-finder.
+
+    Kept as the reference implementation that ShortestPathFinder is tested
+    and benchmarked against. Prefer ShortestPathFinder in algo code.
+
     Attributes :
         * HORIZONTAL (int): A constant representing a horizontal movement
         * VERTICAL (int): A constant representing a vertical movement
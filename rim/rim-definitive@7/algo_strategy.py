@@ -4,7 +4,7 @@ import math
 import copy
 import json
 from sys import maxsize
-from gamelib import GameState, GameMap, GameUnit
+from gamelib import GameState, GameMap, GameUnit, bitboard
 
 # Shorthand constants set in on_game_start
 WALL = SUPPORT = TURRET = SCOUT = DEMOLISHER = INTERCEPTOR = None
@@ -18,6 +18,7 @@ class AlgoStrategy(gamelib.AlgoCore):
     """
     def __init__(self):
         super().__init__()
+        self.subscribe("breach", self.on_breach)
         seed = random.randrange(maxsize)
         random.seed(seed)
         gamelib.debug_write(f"Random seed: {seed}")
@@ -116,6 +117,9 @@ class AlgoStrategy(gamelib.AlgoCore):
                 for x in range(x_min, x_max + 1):
                     self.support_mask[x][y] = True
 
+        # Forked last, so the workers see everything set up above
+        self.simulation_pool = gamelib.SimulationPool(config, self._simulate_path)
+
     def on_turn(self, turn_state):
         """Main turn entry: offense, defense, support."""
         state = GameState(self.config, turn_state)
@@ -202,18 +206,16 @@ class AlgoStrategy(gamelib.AlgoCore):
 
         state.submit_turn()
 
-    def on_action_frame(self, turn_str):
+    def on_breach(self, breach, frame):
         """Stamp breaches with turn so we know where+when they happen."""
-        data = json.loads(turn_str)
-        for breach in data.get("events", {}).get("breach", []):
-            loc, owner = tuple(breach[0]), breach[4]
-            if owner != 1:
-                # record both location and the turn number
-                self.scored_on.append({
-                    "loc": loc,
-                    "turn": self.last_turn  # we'll set last_turn in on_turn
-                })
-                gamelib.debug_write(f"Opponent breached at {loc} on turn {self.last_turn}")
+        loc, owner = tuple(breach[0]), breach[4]
+        if owner != 1:
+            # record both location and the turn number
+            self.scored_on.append({
+                "loc": loc,
+                "turn": self.last_turn  # we'll set last_turn in on_turn
+            })
+            gamelib.debug_write(f"Opponent breached at {loc} on turn {self.last_turn}")
 
     # ------------------------
     # Initial defense
@@ -293,19 +295,12 @@ class AlgoStrategy(gamelib.AlgoCore):
         }
         totals = {'l': 0.0, 'r': 0.0}
 
-        for x in range(28):
-            for y in range(14, 28):
-                loc = [x, y]
-                cell = state.game_map[loc] or []    # treat None as empty
-                for unit in cell:
-                    # skip your own units
-                    if unit.player_index == 0:
-                        continue
-                    weight = WEIGHTS.get((unit.unit_type, unit.upgraded))
-                    if weight is None:
-                        continue
-                    side = 'l' if x < 14 else 'r'
-                    totals[side] += weight
+        # Only enemy walls and turrets on their side carry a weight
+        enemy_defense = (state.game_map.structure_mask(1, WALL) | state.game_map.structure_mask(1, TURRET)) & bitboard.HALF_MASKS[1]
+        for x, y in bitboard.locations_of(enemy_defense):
+            unit = state.game_map.get_structure([x, y])
+            side = 'l' if x < 14 else 'r'
+            totals[side] += WEIGHTS[(unit.unit_type, unit.upgraded)]
 
         gamelib.debug_write(
             f"Enemy defense weighted L={totals['l']:.1f}, R={totals['r']:.1f}"
@@ -589,18 +584,22 @@ class AlgoStrategy(gamelib.AlgoCore):
                 if orig_state.can_spawn(SCOUT, pt):
                     options.append(pt)
 
+        # Batch the starting paths, when evaluating in this process _simulate_path then reads them from the shared path cache
+        orig_state.find_paths_to_edge_many(options)
+
         best = (-1, None, None)  # (survived, loc, attackers_set)
-        for loc in options:
-            state = copy.deepcopy(orig_state)
-            survive, _, _, _, _, _, atk = self._simulate_path(state, loc, num_scouts)
+        results = self.simulation_pool.evaluate_spawns(orig_state, options, num_scouts, self.support_locations)
+        for loc, (survive, _, _, _, _, _, atk) in zip(options, results):
             if survive > best[0]:
                 best = (survive, loc, atk)
 
         return best[1], best[0]
 
-    def _simulate_path(self, state, loc, num_scouts):
+    def _simulate_path(self, state, loc, num_scouts, support_locations=None):
         """Helper to simulate a single scout path. Returns tuple of metrics + attackers set."""
-        temp = copy.deepcopy(state)
+        if support_locations is None:
+            support_locations = self.support_locations
+        temp = state.fork()
         scout_unit = GameUnit(SCOUT, state.config)
         SC_HP, SC_DMG = scout_unit.max_health, scout_unit.damage_f
         sup_info = self.config["unitInformation"][1]
@@ -609,6 +608,7 @@ class AlgoStrategy(gamelib.AlgoCore):
 
         edge = temp.get_target_edge(loc)
         path = temp.find_path_to_edge(loc)
+        pathing = None  # persistent path finder, created on the first kill
         dead = 0
         dmg_turret = dmg_wall = dmg_support = dmg_to_scout = 0
         attackers = set()
@@ -621,7 +621,7 @@ class AlgoStrategy(gamelib.AlgoCore):
             temp.game_map.add_unit(SCOUT, pt)
 
             # shield buff
-            for sup_loc in self.support_locations:
+            for sup_loc in support_locations:
                 sup = temp.contains_stationary_unit(sup_loc)
                 if sup and sup.unit_type == SUPPORT:
                     rng = base_rng + (1 if sup.upgraded else 0)
@@ -642,7 +642,12 @@ class AlgoStrategy(gamelib.AlgoCore):
                     elif tgt.unit_type == WALL:    dmg_wall   += tgt.health
                     elif tgt.unit_type == SUPPORT: dmg_support+= tgt.health
                     temp.game_map.remove_unit([tgt.x, tgt.y])
-                    path = temp.find_path_to_edge(pt, edge)
+                    if pathing is None:
+                        pathing = gamelib.ShortestPathFinder()
+                        pathing.track_edge(temp, temp.game_map.get_edge_locations(edge))
+                    else:
+                        pathing.unblock([tgt.x, tgt.y])
+                    path = pathing.path_from(pt)
                     idx = -1
                     rem -= math.ceil(tgt.health / SC_DMG)
                     break
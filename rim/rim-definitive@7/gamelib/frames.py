@@ -0,0 +1,127 @@
+"""
+Lazy decoding of action phase frames.
+
+The engine sends a frame for every tick of the action phase and each one holds the full unit
+arrays of both players, while most algos only look at a few events. ActionFrame decodes turnInfo
+and events straight out of the line and leaves everything else as text until it is asked for.
+"""
+import json
+
+_DECODER = json.JSONDecoder()
+_WHITESPACE = " \t\n\r"
+
+
+def _decode_key(line, key):
+    """Decodes the value of a top level key of a JSON object line without decoding the rest of it
+
+    Returns:
+        The decoded value, or None if the key is not in the line
+
+    """
+    start = line.find('"{}"'.format(key))
+    if start == -1:
+        return None
+    start = line.index(":", start + len(key) + 2) + 1
+    while line[start] in _WHITESPACE:
+        start += 1
+    return _DECODER.raw_decode(line, start)[0]
+
+
+def peek_turn_info(line):
+    """Gets the turnInfo of an engine message without decoding the whole line
+
+    Returns:
+        The turnInfo list, or None if the message has none, like the config
+
+    """
+    try:
+        return _decode_key(line, "turnInfo")
+    except ValueError:
+        return None
+
+
+class ActionFrame(str):
+    """One frame of the action phase, as the line the engine sent, decoded piece by piece when read
+
+    It is still the original str, so json.loads and gamelib.parse_message work on it,
+    they decode the whole frame.
+
+    Attributes :
+        * turn_info (list): [state type, turn number, frame number]
+        * turn_number (int): The turn this frame belongs to
+        * frame_number (int): The index of this frame in the action phase
+        * events (dict): The events of this frame by type, such as "breach", "damage" or "death"
+        * data (dict): The whole decoded frame
+
+    """
+    def __new__(cls, line, turn_info=None):
+        frame = super().__new__(cls, line)
+        frame.__turn_info = turn_info
+        frame.__events = None
+        frame.__data = None
+        return frame
+
+    def __read(self, key):
+        if self.__data is None:
+            try:
+                value = _decode_key(self, key)
+            except ValueError:
+                value = None
+            if value is not None:
+                return value
+        return self.data.get(key)
+
+    @property
+    def turn_info(self):
+        if self.__turn_info is None:
+            self.__turn_info = self.__read("turnInfo")
+        return self.__turn_info
+
+    @property
+    def turn_number(self):
+        return int(self.turn_info[1])
+
+    @property
+    def frame_number(self):
+        return int(self.turn_info[2])
+
+    @property
+    def events(self):
+        if self.__events is None:
+            self.__events = self.__read("events") or {}
+        return self.__events
+
+    @property
+    def data(self):
+        if self.__data is None:
+            self.__data = json.loads(self)
+        return self.__data
+
+    def get_events(self, event_type):
+        """Gets the events of one type in this frame
+
+        Args:
+            event_type: An event type such as "breach", "damage", "death", "shield", "move", "spawn", "attack" or "selfDestruct"
+
+        Returns:
+            The list of events, empty if there were none
+
+        """
+        return self.events.get(event_type, [])
+
+    def get_units(self, player_index):
+        """Gets the unit arrays of a player, decoding them on the first call
+
+        Args:
+            player_index: 0 for you, 1 for the enemy
+
+        Returns:
+            A list with one list of [x, y, health, id] per unit type, ordered like the config
+
+        """
+        return self.__read("p1Units" if player_index == 0 else "p2Units")
+
+    def get_stats(self, player_index):
+        """Gets [health, SP, MP, time] of a player at this frame
+        """
+        return self.__read("p1Stats" if player_index == 0 else "p2Stats")
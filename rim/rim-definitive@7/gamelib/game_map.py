@@ -1,5 +1,8 @@
+import copy
 import math
-from .unit import GameUnit
+from . import geometry
+from .unit import GameUnit, UnitStack, compile_unit_specs
+from .threat_map import ThreatMap
 from .util import debug_write
 
 class GameMap:
@@ -7,7 +10,9 @@ class GameMap:
     useful for getting information related to the map.
 
     game_map[x, y] will return a list of Units located at that location, 
-    or an empty list if there are no units at the location
+    or an empty list if there are no units at the location.
+    Mobile units added with add_unit, add_units or GameState.attempt_spawn are stored as UnitStacks
+    and only become GameUnits once their location is read this way, see unit_stacks and unit_count.
 
     Attributes :
         * config (JSON): Contains information about the current game rules
@@ -36,36 +41,56 @@ class GameMap:
         self.BOTTOM_LEFT = 2
         self.BOTTOM_RIGHT = 3
         self.__map = self.__empty_grid()
-        self.__start = [13,0]
+        # Structure per cell id (x * ARENA_SIZE + y) and its occupancy mask, kept in sync with __map
+        self.__structures = [None] * (self.ARENA_SIZE * self.ARENA_SIZE)
+        self.__occupancy = bytearray(self.ARENA_SIZE * self.ARENA_SIZE)
+        self.__structure_layout = None
+        # Bitboard of the structures for each (player_index, unit_type), see bitboard.py
+        self.__structure_masks = {}
+        # UnitStacks per cell id of the mobile units that were not read through game_map[x, y] yet.
+        # Stacks and their lists are replaced instead of modified, so forks and the undo log can share them
+        self.__stacks = {}
+        # Built on first use by threat_map(). Shared with forks until either map changes a structure, see __update_threats
+        self.__threat_map = None
+        self.__threat_shared = False
+        # 1 for every cell id whose unit list may still be shared with a fork, None if nothing is shared
+        self.__shared = None
+        # (x, y, previous units, previous stacks, (upgraded unit, previous spec) or None) for every cell changed since the first open savepoint,
+        # None outside of a transaction
+        self.__undo_log = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        # Copies rebuild the threat map on demand, that is cheaper than copying all of its per-cell lists
+        state["_GameMap__threat_map"] = None
+        state["_GameMap__threat_shared"] = False
+        return state
     
     def __getitem__(self, location):
         if len(location) == 2 and self.in_arena_bounds(location):
             x,y = location
+            if self.__shared is not None:
+                self.__own(x, y)
+            if self.__stacks:
+                self.__unstack(x, y)
             return self.__map[x][y]
         self._invalid_coordinates(location)
 
     def __setitem__(self, location, val):
         if type(location) == tuple and len(location) == 2 and self.in_arena_bounds(location):
-            self.__map[location[0]][location[1]] = val
+            x, y = location
+            if self.__shared is not None:
+                self.__own(x, y)
+            if self.__undo_log is not None:
+                self.__log(x, y, self.__map[x][y])
+            self.__map[x][y] = val
+            self.__stacks.pop(x * self.ARENA_SIZE + y, None)
+            self.__set_structure(x, y, next((unit for unit in val if unit.stationary), None))
             return
         self._invalid_coordinates(location)
 
     def __iter__(self):
-        self.__start = [13,0]
-        return self
-    
-    def __next__(self):
-        location = self.__start
-        if location == [15,27]:
-            raise StopIteration
-        new_location = [location[0]+1, location[1]]
-        while not self.in_arena_bounds(new_location) and not location == [14,27]:
-            if new_location[0] == self.ARENA_SIZE:
-                new_location = [0, new_location[1]+1]
-            else:
-                new_location = [new_location[0]+1, new_location[1]]
-        self.__start = new_location
-        return location 
+        return ([x, y] for x, y in geometry.DIAMOND_ORDER)
 
     def __empty_grid(self):
         grid = []
@@ -75,6 +100,115 @@ class GameMap:
                 grid[x].append([])
         return grid
 
+    def _fork(self):
+        """Gets an independent copy of this map without copying any units up front. Used by GameState.fork
+
+        Both maps start sharing every cell and the ThreatMap. A cell is copied, units included, the first time
+        either map changes it or hands out its unit list through game_map[x, y], so changes to one map or to those
+        units never show up in the other. Reads such as get_structure go to the shared cells without copying them.
+        The ThreatMap is copied the first time either map has to update it.
+        """
+        clone = GameMap.__new__(GameMap)
+        clone.__dict__.update(self.__dict__)
+        clone.__map = [list(column) for column in self.__map]
+        clone.__structures = list(self.__structures)
+        clone.__occupancy = bytearray(self.__occupancy)
+        clone.__structure_masks = dict(self.__structure_masks)
+        clone.__stacks = dict(self.__stacks)
+        clone.__undo_log = None
+        clone.__shared = bytearray(b"\x01" * (self.ARENA_SIZE * self.ARENA_SIZE))
+        self.__shared = bytearray(clone.__shared)
+        if self.__threat_map is not None:
+            clone.__threat_shared = self.__threat_shared = True
+        return clone
+
+    def __own(self, x, y):
+        cell = x * self.ARENA_SIZE + y
+        if not self.__shared[cell]:
+            return
+        self.__shared[cell] = 0
+        units = self.__map[x][y]
+        copies = [copy.copy(unit) for unit in units]
+        self.__map[x][y] = copies
+        structure = self.__structures[cell]
+        if structure is not None:
+            self.__structures[cell] = copies[next(index for index, unit in enumerate(units) if unit is structure)]
+            if self.__threat_map is not None:
+                # The ThreatMap still refers to the shared structure
+                self.__update_threats(x, y)
+
+    def __update_threats(self, x, y):
+        if self.__threat_shared:
+            self.__threat_map = self.__threat_map._fork(self)
+            self.__threat_shared = False
+        self.__threat_map.update([x, y])
+
+    def __unstack(self, x, y):
+        stacks = self.__stacks.pop(x * self.ARENA_SIZE + y, None)
+        if stacks:
+            units = list(self.__map[x][y])
+            for stack in stacks:
+                units.extend(stack.units())
+            self.__map[x][y] = units
+
+    def __log(self, x, y, units, upgraded=None):
+        self.__undo_log.append((x, y, units, self.__stacks.get(x * self.ARENA_SIZE + y), upgraded))
+
+    def __set_structure(self, x, y, unit):
+        cell = x * self.ARENA_SIZE + y
+        previous = self.__structures[cell]
+        if previous is not None:
+            self.__structure_masks[previous.player_index, previous.unit_type] &= ~(1 << cell)
+        if unit is not None:
+            key = (unit.player_index, unit.unit_type)
+            self.__structure_masks[key] = self.__structure_masks.get(key, 0) | 1 << cell
+        self.__structures[cell] = unit
+        if self.__threat_map is not None and (previous is not None or unit is not None):
+            self.__update_threats(x, y)
+        occupied = 0 if unit is None else 1
+        if self.__occupancy[cell] != occupied:
+            self.__occupancy[cell] = occupied
+            self.__structure_layout = None
+
+    def _place_unit(self, unit):
+        """Adds an already built GameUnit at its own location. Used by GameState when parsing the turn
+        """
+        if self.__shared is not None:
+            self.__own(unit.x, unit.y)
+        if self.__undo_log is not None:
+            self.__log(unit.x, unit.y, list(self.__map[unit.x][unit.y]))
+        self.__map[unit.x][unit.y].append(unit)
+        if unit.stationary and self.__structures[unit.x * self.ARENA_SIZE + unit.y] is None:
+            self.__set_structure(unit.x, unit.y, unit)
+
+    def _upgrade(self, location):
+        """Upgrades the structure at a location and keeps the ThreatMap in step. Used by GameState
+
+        Returns:
+            The upgraded structure, or None if there is no structure at the location
+
+        """
+        x, y = int(location[0]), int(location[1])
+        if self.__shared is not None:
+            self.__own(x, y)
+        unit = self.__structures[x * self.ARENA_SIZE + y]
+        if unit is None:
+            return None
+        if self.__undo_log is not None:
+            self.__log(x, y, self.__map[x][y], (unit, unit.spec))
+        unit.upgrade()
+        if self.__threat_map is not None:
+            self.__update_threats(x, y)
+        return unit
+
+    def _peek(self, x, y):
+        """Gets the GameUnits at [x, y] like game_map[x, y], without taking a copy of a cell shared with a fork.
+        The list and units must not be modified
+        """
+        if self.__stacks:
+            self.__unstack(x, y)
+        return self.__map[x][y]
+
     def _invalid_coordinates(self, location):
         self.warn("{} is out of bounds.".format(str(location)))
 
@@ -89,19 +223,7 @@ class GameMap:
         
         """
         x, y = location
-        half_board = self.HALF_ARENA
-
-        row_size = y + 1
-        startx = half_board - row_size
-        endx = startx + (2 * row_size) - 1
-        top_half_check = (y < self.HALF_ARENA and x >= startx and x <= endx)
-
-        row_size = (self.ARENA_SIZE - 1 - y) + 1
-        startx = half_board - row_size
-        endx = startx + (2 * row_size) - 1
-        bottom_half_check = (y >= self.HALF_ARENA and x >= startx and x <= endx)
-
-        return bottom_half_check or top_half_check
+        return geometry.in_arena_bounds(x, y)
 
     def get_edge_locations(self, quadrant_description):
         """Takes in an edge description and returns a list of locations.
@@ -117,8 +239,7 @@ class GameMap:
             self.warn("Passed invalid quadrant_description '{}'. See the documentation for valid inputs for get_edge_locations.".format(quadrant_description))
             return
 
-        edges = self.get_edges()
-        return edges[quadrant_description]
+        return [[x, y] for x, y in geometry.EDGES[quadrant_description]]
 
     def get_edges(self):
         """Gets all of the edges and their edge locations
@@ -127,27 +248,7 @@ class GameMap:
             A list with four lists inside of it of locations corresponding to the four edges.
             [0] = top_right, [1] = top_left, [2] = bottom_left, [3] = bottom_right.
         """
-        top_right = []
-        for num in range(0, self.HALF_ARENA):
-            x = self.HALF_ARENA + num
-            y = self.ARENA_SIZE - 1 - num
-            top_right.append([int(x), int(y)])
-        top_left = []
-        for num in range(0, self.HALF_ARENA):
-            x = self.HALF_ARENA - 1 - num
-            y = self.ARENA_SIZE - 1 - num
-            top_left.append([int(x), int(y)])
-        bottom_left = []
-        for num in range(0, self.HALF_ARENA):
-            x = self.HALF_ARENA - 1 - num
-            y = num
-            bottom_left.append([int(x), int(y)])
-        bottom_right = []
-        for num in range(0, self.HALF_ARENA):
-            x = self.HALF_ARENA + num
-            y = num
-            bottom_right.append([int(x), int(y)])
-        return [top_right, top_left, bottom_left, bottom_right]
+        return [[[x, y] for x, y in edge] for edge in geometry.EDGES]
     
     def add_unit(self, unit_type, location, player_index=0):
         """Add a single GameUnit to the map at the given location.
@@ -167,11 +268,57 @@ class GameMap:
             self.warn("Player index {} is invalid. Player index should be 0 or 1.".format(player_index))
 
         x, y = location
+        if not compile_unit_specs(self.config)[unit_type].stationary:
+            self.__push(UnitStack(unit_type, self.config, player_index, 1, x, y))
+            return
         new_unit = GameUnit(unit_type, self.config, player_index, None, location[0], location[1])
-        if not new_unit.stationary:
-            self.__map[x][y].append(new_unit)
+        if self.__shared is not None:
+            self.__own(x, y)
+        if self.__undo_log is not None:
+            self.__log(x, y, self.__map[x][y])
+        self.__map[x][y] = [new_unit]
+        self.__stacks.pop(x * self.ARENA_SIZE + y, None)
+        self.__set_structure(x, y, new_unit)
+
+    def add_units(self, unit_type, location, num=1, player_index=0):
+        """Add num mobile units of the same type to the map at the given location.
+
+        The units join the UnitStack of that type and owner at the location, so this costs the same for any num.
+        Structures do not stack, for a structure unit_type this is the same as add_unit.
+
+        Args:
+            unit_type: The type of the new units. Use the constants provided in algo_strategy.
+            location: A list of two integers representing the [x,y] coordinate of the new units
+            num: The number of units to add
+            player_index: The index corresponding to the player controlling the new units, 0 for you 1 for the enemy
+
+        Like add_unit, this only changes the data stored in GameMap and does not affect your turn.
+        """
+        if compile_unit_specs(self.config)[unit_type].stationary:
+            self.add_unit(unit_type, location, player_index)
+            return
+        if not self.in_arena_bounds(location):
+            self._invalid_coordinates(location)
+        if player_index < 0 or player_index > 1:
+            self.warn("Player index {} is invalid. Player index should be 0 or 1.".format(player_index))
+
+        self.__push(UnitStack(unit_type, self.config, player_index, num, location[0], location[1]))
+
+    def __push(self, stack):
+        x, y = stack.x, stack.y
+        if self.__undo_log is not None:
+            self.__log(x, y, self.__map[x][y])
+        cell = x * self.ARENA_SIZE + y
+        stacks = list(self.__stacks.get(cell, ()))
+        for index, other in enumerate(stacks):
+            if other.spec is stack.spec and other.player_index == stack.player_index:
+                merged = copy.copy(other)
+                merged.healths.extend(stack.healths)
+                stacks[index] = merged
+                break
         else:
-            self.__map[x][y] = [new_unit]
+            stacks.append(stack)
+        self.__stacks[cell] = stacks
 
     def remove_unit(self, location):
         """Remove all units on the map in the given location.
@@ -186,7 +333,159 @@ class GameMap:
             self._invalid_coordinates(location)
         
         x, y = location
+        if self.__shared is not None:
+            self.__own(x, y)
+        if self.__undo_log is not None:
+            self.__log(x, y, self.__map[x][y])
         self.__map[x][y] = []
+        self.__stacks.pop(x * self.ARENA_SIZE + y, None)
+        self.__set_structure(x, y, None)
+
+    def _savepoint(self):
+        """Starts logging changes if needed and returns a mark for _rollback. Used by GameState.savepoint
+        """
+        if self.__undo_log is None:
+            self.__undo_log = []
+        return len(self.__undo_log)
+
+    def _rollback(self, mark):
+        """Undoes every change logged after mark, newest first. Used by GameState.rollback
+
+        Returns:
+            False if there is no open log that mark belongs to, True otherwise
+
+        """
+        if self.__undo_log is None or mark > len(self.__undo_log):
+            return False
+        while len(self.__undo_log) > mark:
+            x, y, units, stacks, upgraded = self.__undo_log.pop()
+            if upgraded is not None:
+                upgraded[0].spec = upgraded[1]
+            self.__map[x][y] = units
+            if stacks is None:
+                self.__stacks.pop(x * self.ARENA_SIZE + y, None)
+            else:
+                self.__stacks[x * self.ARENA_SIZE + y] = stacks
+            self.__set_structure(x, y, next((unit for unit in units if unit.stationary), None))
+        return True
+
+    def _commit(self):
+        """Stops logging changes and forgets the log. Used by GameState.commit
+        """
+        self.__undo_log = None
+
+    def get_structure(self, location):
+        """Gets the structure at a location without scanning its units
+
+        Args:
+            location: A map location inside the arena
+
+        Returns:
+            The structure GameUnit at the location, or None if there is none.
+            On a forked map it may still be shared with the other map, change it through game_map[x, y] or GameState
+
+        """
+        return self.__structures[int(location[0]) * self.ARENA_SIZE + int(location[1])]
+
+    def unit_stacks(self, location):
+        """Gets the mobile units at a location grouped by type and owner, without building a GameUnit per unit
+
+        Args:
+            location: A map location inside the arena
+
+        Returns:
+            A new list of UnitStacks, one per unit type and player_index, that can be modified freely
+
+        """
+        x, y = int(location[0]), int(location[1])
+        stacks = {}
+        for unit in self.__map[x][y]:
+            if not unit.stationary:
+                key = (unit.unit_type, unit.player_index)
+                if key not in stacks:
+                    stacks[key] = UnitStack(unit.unit_type, self.config, unit.player_index, 0, x, y)
+                stacks[key].healths.append(unit.health)
+        for stack in self.__stacks.get(x * self.ARENA_SIZE + y, ()):
+            key = (stack.unit_type, stack.player_index)
+            if key in stacks:
+                stacks[key].healths.extend(stack.healths)
+            else:
+                stacks[key] = copy.copy(stack)
+        return list(stacks.values())
+
+    def unit_count(self, location, unit_type=None, player_index=None):
+        """Counts the units at a location, same as len(game_map[x, y]) when no filter is given but without building GameUnits
+
+        Args:
+            location: A map location inside the arena
+            unit_type: Only count units of this type, every type if None
+            player_index: Only count units of this player, both players if None
+
+        Returns:
+            The number of matching units
+
+        """
+        x, y = int(location[0]), int(location[1])
+        count = 0
+        for unit in self.__map[x][y]:
+            if (unit_type is None or unit.unit_type == unit_type) and (player_index is None or unit.player_index == player_index):
+                count += 1
+        for stack in self.__stacks.get(x * self.ARENA_SIZE + y, ()):
+            if (unit_type is None or stack.unit_type == unit_type) and (player_index is None or stack.player_index == player_index):
+                count += len(stack.healths)
+        return count
+
+    def threat_map(self):
+        """Gets the ThreatMap of this map, building it on first use. It follows every later add_unit and remove_unit
+
+        Returns:
+            A ThreatMap, see threat_map.py
+
+        """
+        threats = self._threats()
+        if self.__threat_shared:
+            # Callers may update it themselves, it must not be the one shared with a fork
+            self.__threat_map = threats = threats._fork(self)
+            self.__threat_shared = False
+        return threats
+
+    def _threats(self):
+        """Same as threat_map, but the ThreatMap may be shared with a fork and must not be updated. Used by GameState.get_attackers
+        """
+        if self.__threat_map is None:
+            self.__threat_map = ThreatMap(self)
+            self.__threat_shared = False
+        return self.__threat_map
+
+    def structure_layout(self):
+        """Gets the cells currently occupied by structures
+
+        Returns:
+            A bytes object with one entry per cell id (x * ARENA_SIZE + y), 1 if a structure is there and 0 otherwise.
+            The same object is returned until a structure is added or removed,
+            so it can be used as a cheap key for anything that only depends on where structures stand.
+
+        """
+        if self.__structure_layout is None:
+            self.__structure_layout = bytes(self.__occupancy)
+        return self.__structure_layout
+
+    def structure_mask(self, player_index=None, unit_type=None):
+        """Gets a bitboard of the structures on the map, see bitboard.py
+
+        Args:
+            player_index: Only count structures of this player, both players if None
+            unit_type: Only count structures of this type, every type if None
+
+        Returns:
+            An int with bit x * ARENA_SIZE + y set for every matching structure at [x, y]
+
+        """
+        mask = 0
+        for (owner, structure_type), bits in self.__structure_masks.items():
+            if (player_index is None or owner == player_index) and (unit_type is None or structure_type == unit_type):
+                mask |= bits
+        return mask
 
     def get_locations_in_range(self, location, radius):
         """Gets locations in a circular area around a location
@@ -204,10 +503,19 @@ class GameMap:
         if not self.in_arena_bounds(location):
             self._invalid_coordinates(location)
 
+        return [list(new_location) for new_location in self._locations_in_range(location, radius)]
+
+    def _locations_in_range(self, location, radius):
+        """Same as get_locations_in_range without the argument checks. Locations may be (x, y) tuples and must not be modified
+        """
         x, y = location
+        getHitRadius = self.config["unitInformation"][0]['getHitRadius']
+        # Cells on the board use the precomputed stencils, anything else falls back to the full search
+        if type(x) is int and type(y) is int and geometry.in_arena_bounds(x, y):
+            return geometry.locations_in_range(x, y, radius, getHitRadius)
+
         locations = []
         search_radius = math.ceil(radius)
-        getHitRadius = self.config["unitInformation"][0]['getHitRadius']
         for i in range(int(x - search_radius), int(x + search_radius + 1)):
             for j in range(int(y - search_radius), int(y + search_radius + 1)):
                 new_location = [i, j]
@@ -230,7 +538,7 @@ class GameMap:
         x1, y1 = location_1
         x2, y2 = location_2
 
-        return math.sqrt((x1 - x2)**2 + (y1 - y2)**2)
+        return geometry.distance(x1, y1, x2, y2)
 
     def warn(self, message):
         """
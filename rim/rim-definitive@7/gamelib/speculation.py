@@ -0,0 +1,219 @@
+"""
+Work done during the action phase, while the algo would otherwise only wait for frames.
+
+The board an action phase ends on is the board the next turn starts from, minus the structures
+flagged for removal and plus nothing the opponent has built yet. Analysis that only depends on
+the structures can therefore run on the latest frame on a background thread, and on_turn picks
+the result up if the board it sees hashes the same as the frame the work was started from.
+
+A thread is used rather than a process: during the action phase the main thread is blocked on
+stdin, which releases the GIL, and the frame does not have to be copied to another process.
+A job may still be running when the turn starts, so it must not share caches or other mutable
+state with on_turn.
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, CancelledError, TimeoutError
+
+from .util import debug_write, parse_message
+
+# Indexes of the unit lists that describe structures: the three structure types and the upgrade flags
+_STRUCTURE_LISTS = (0, 1, 2, 7)
+# Unit type indexes of the structures, as sent in events
+_STRUCTURE_TYPES = (0, 1, 2)
+
+
+def board_hash(message, include_health=False):
+    """Hashes the structures of an engine message, so an action frame can be matched with the next turn
+
+    Args:
+        message: An ActionFrame, a turn message as on_turn receives it, or its decoded JSON
+        include_health: Also hash the health of every structure, for work that depends on it
+
+    Returns:
+        An int that is the same for two messages with the same structures of the same players at the same
+        locations, ignoring unit ids and, unless include_health is set, health
+
+    """
+    if hasattr(message, "get_units"):
+        units = (message.get_units(0), message.get_units(1))
+    else:
+        data = parse_message(message)
+        units = (data["p1Units"], data["p2Units"])
+    structures = []
+    for player_index in (0, 1):
+        player_units = units[player_index]
+        for index in _STRUCTURE_LISTS:
+            # Older engines send no upgrade list
+            if index < len(player_units):
+                if include_health:
+                    structures.extend((player_index, index, unit[0], unit[1], unit[2]) for unit in player_units[index])
+                else:
+                    structures.extend((player_index, index, unit[0], unit[1]) for unit in player_units[index])
+    return hash(frozenset(structures))
+
+
+def structures_changed(frame, include_health=False):
+    """Tells from the events of an action frame whether its structures may differ from the previous frame's
+
+    Args:
+        frame: An ActionFrame
+        include_health: Also count damage to a structure as a change
+
+    Returns:
+        False if no structure was spawned or destroyed during the frame, or damaged when include_health is set,
+        True otherwise and for messages that are not ActionFrames
+
+    """
+    if not hasattr(frame, "get_events"):
+        return True
+    for event_type, type_index in (("spawn", 1), ("death", 1)) + ((("damage", 2),) if include_health else ()):
+        for event in frame.get_events(event_type):
+            if int(event[type_index]) in _STRUCTURE_TYPES:
+                return True
+    return False
+
+
+class _Job:
+    __slots__ = ("board_hash", "include_health", "turn", "future")
+
+    def __init__(self, board_hash, include_health, turn, future):
+        self.board_hash = board_hash
+        self.include_health = include_health
+        self.turn = turn
+        self.future = future
+
+
+class BackgroundWorker:
+    """Runs functions on one background thread, keeping only the latest job of each name
+
+    AlgoCore creates one the first time AlgoCore.speculate is called, see there for the usual way to use it.
+
+    Attributes :
+        * hits (int): Results collected on a matching board
+        * misses (int): Collections that found nothing usable, because the board changed or no job was scheduled
+        * cancelled (int): Jobs dropped before they started, because a newer job of the same name replaced them or the turn began
+
+    """
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.cancelled = 0
+        self.__executor = None
+        self.__jobs = {}
+        self.__lock = threading.Lock()
+
+    def schedule(self, name, message, function, *args, include_health=False):
+        """Queues function(*args) as the job called name, replacing a queued job of that name that has not started yet
+
+        Nothing is queued if the job of that name was already scheduled on a board with the same hash,
+        so calling this on every frame only starts new work when structures change. Later frames of the
+        same action phase are only hashed when their events show a structure change, see structures_changed,
+        so their unit arrays stay undecoded. This expects to be called with every frame of the action phase.
+
+        Args:
+            name: The key the result is collected under
+            message: The message the work is based on, usually the latest ActionFrame, see board_hash
+            function: The function to run on the background thread
+            include_health: Only reuse the result if the health of every structure is the same too
+
+        """
+        turn = message.turn_number if hasattr(message, "get_events") else None
+        with self.__lock:
+            previous = self.__jobs.get(name)
+        if (previous is not None and turn is not None and previous.turn == turn and previous.include_health == include_health
+                and not previous.future.cancelled() and not structures_changed(message, include_health)):
+            return
+        key = board_hash(message, include_health)
+        with self.__lock:
+            previous = self.__jobs.get(name)
+            if previous is not None and previous.board_hash == key and not previous.future.cancelled():
+                previous.turn = turn
+                return
+            if previous is not None and previous.future.cancel():
+                self.cancelled += 1
+            if self.__executor is None:
+                self.__executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="gamelib-speculation")
+            self.__jobs[name] = _Job(key, include_health, turn, self.__executor.submit(function, *args))
+
+    def settle(self, timeout=None, message=None):
+        """Waits for the scheduled jobs, so they rarely run alongside the turn. Jobs that have not started
+        when timeout runs out are dropped
+
+        Args:
+            timeout: The longest to wait in seconds, forever if None
+            message: The turn message the results will be collected with. Jobs computed on another board are
+                     dropped if they have not started and not waited for, collect would not use them
+
+        """
+        deadline = None if timeout is None else time.perf_counter() + timeout
+        with self.__lock:
+            jobs = list(self.__jobs.values())
+        if message is not None:
+            hashes = {}
+            usable = []
+            for job in jobs:
+                if job.include_health not in hashes:
+                    hashes[job.include_health] = board_hash(message, job.include_health)
+                if job.board_hash == hashes[job.include_health]:
+                    usable.append(job)
+                elif job.future.cancel():
+                    self.cancelled += 1
+            jobs = usable
+        for job in jobs:
+            try:
+                job.future.exception(None if deadline is None else max(0, deadline - time.perf_counter()))
+            except CancelledError:
+                pass
+            except TimeoutError:
+                for late in jobs:
+                    if late.future.cancel():
+                        self.cancelled += 1
+                if not all(late.future.done() for late in jobs):
+                    debug_write("A background job is still running after {} s".format(timeout))
+                return
+
+    def collect(self, name, message, timeout=0):
+        """Gets the result of the job called name if it was computed on the same board
+
+        Args:
+            name: The name the job was scheduled under
+            message: The current turn message, as on_turn receives it
+            timeout: How long to wait for a job that is still running, in seconds
+
+        Returns:
+            The result of the job, or None if there was none, it did not finish in time, it failed
+            or the board it ran on differs. The job is forgotten either way
+
+        """
+        with self.__lock:
+            job = self.__jobs.pop(name, None)
+        if job is None or job.board_hash != board_hash(message, job.include_health):
+            self.misses += 1
+            return None
+        try:
+            result = job.future.result(timeout)
+        except CancelledError:
+            self.misses += 1
+            return None
+        except TimeoutError:
+            self.misses += 1
+            job.future.cancel()
+            return None
+        except Exception as error:
+            debug_write("Background job {} failed: {!r}".format(name, error))
+            self.misses += 1
+            return None
+        self.hits += 1
+        return result
+
+    def shutdown(self):
+        """Stops the background thread, dropping jobs that have not started
+        """
+        with self.__lock:
+            for job in self.__jobs.values():
+                job.future.cancel()
+            self.__jobs.clear()
+        if self.__executor is not None:
+            self.__executor.shutdown(wait=False)
+            self.__executor = None
@@ -1,194 +1,214 @@
 import unittest
 import json
+import random
+import copy
+import math
+import os
+import threading
+import time
 from .game_state import GameState
-from .unit import GameUnit
+from .unit import GameUnit, compile_unit_specs
+from .navigation import ShortestPathFinder, LegacyShortestPathFinder, EDGE_TABLES, edge_table
+from .path_cache import PathCache
+from .evaluation_cache import EvaluationCache
+from .util import ParsedMessage, parse_message
+from .frames import ActionFrame, peek_turn_info
+from .algocore import AlgoCore
+from .events import EventStream
+from .speculation import BackgroundWorker, board_hash, structures_changed
+from .simulator import Simulator
+from .forecast import BreachForecast
+from .parallel import SimulationPool, board_snapshot, restore_board, simulate_spawn
+from . import bitboard, geometry
+
+CONFIG = """
+{
+"seasonCompatibilityModeP1": 5,
+"seasonCompatibilityModeP2": 5,
+"debug":{
+    "printMapString":false,
+    "printTStrings":false,
+    "printActStrings":false,
+    "printHitStrings":false,
+    "printPlayerInputStrings":false,
+    "printBotErrors":true,
+    "printPlayerGetHitStrings":false
+},
+"unitInformation": [
+    {
+    "icon": "S3_filter",
+    "iconxScale": 0.4,
+    "iconyScale": 0.4,
+    "cost1": 1.0,
+    "getHitRadius":0.01,
+    "display":"filter",
+    "shorthand":"FF",
+    "startHealth":75.0,
+    "unitCategory": 0,
+    "refundPercentage": 0.75,
+    "turnsRequiredToRemove": 1,
+    "upgrade": {
+        "startHealth": 150.0
+    }
+    },
+    {
+    "icon": "S3_encryptor",
+    "iconxScale": 0.5,
+    "iconyScale": 0.5,
+    "cost1":4.0,
+    "getHitRadius":0.01,
+    "display":"encryptor",
+    "shieldRange":0,
+    "shorthand":"EF",
+    "startHealth":30.0,
+    "unitCategory": 0,
+    "refundPercentage": 0.75,
+    "turnsRequiredToRemove": 1,
+    "generatesResource1": 1,
+    "upgrade": {
+        "generatesResource2": 1
+    }
+    },
+    {
+    "icon": "S3_destructor",
+    "iconxScale": 0.5,
+    "iconyScale": 0.5,
+    "attackDamageWalker":5.0,
+    "cost1":2.0,
+    "getHitRadius":0.01,
+    "display":"destructor",
+    "attackRange":2.5,
+    "shorthand":"DF",
+    "startHealth":90.0,
+    "unitCategory": 0,
+    "refundPercentage": 0.75,
+    "turnsRequiredToRemove": 1,
+    "upgrade": {
+        "cost1": 4.0,
+        "attackRange":3.5,
+        "attackDamageWalker":15.0
+    }
+    },
+    {
+    "icon": "S3_ping",
+    "iconxScale": 0.7,
+    "iconyScale": 0.7,
+    "attackDamageTower":2.0,
+    "attackDamageWalker":2.0,
+    "playerBreachDamage":1.0,
+    "cost2":1.0,
+    "getHitRadius":0.01,
+    "display":"ping",
+    "attackRange":3.5,
+    "shorthand":"PI",
+    "startHealth":15.0,
+    "speed":1,
+    "unitCategory": 1,
+    "selfDestructDamageWalker": 15.0,
+    "selfDestructDamageTower": 15.0,
+    "metalForBreach": 1.0,
+    "selfDestructRange": 1.5,
+    "selfDestructStepsRequired": 5
+    },
+    {
+    "icon": "S3_emp",
+    "iconxScale": 0.47,
+    "iconyScale": 0.47,
+    "attackDamageWalker":6.0,
+    "attackDamageTower":6.0,
+    "playerBreachDamage":1.0,
+    "cost2":3.0,
+    "getHitRadius":0.01,
+    "display":"emp",
+    "attackRange":4.5,
+    "shorthand":"EI",
+    "startHealth":5.0,
+    "speed":0.5,
+    "unitCategory": 1,
+    "selfDestructDamageWalker": 5.0,
+    "selfDestructDamageTower": 5.0,
+    "metalForBreach": 1.0,
+    "selfDestructRange": 1.5,
+    "selfDestructStepsRequired": 5
+    },
+    {
+    "icon": "S3_scrambler",
+    "iconxScale": 0.5,
+    "iconyScale": 0.5,
+    "attackDamageWalker":20.0,
+    "playerBreachDamage":1.0,
+    "cost2":1.0,
+    "getHitRadius":0.01,
+    "display":"scrambler",
+    "attackRange":4.5,
+    "shorthand":"SI",
+    "startHealth":40.0,
+    "speed":0.25,
+    "unitCategory": 1,
+    "selfDestructDamageWalker": 40.0,
+    "selfDestructDamageTower": 40.0,
+    "metalForBreach": 1.0,
+    "selfDestructRange": 1.5,
+    "selfDestructStepsRequired": 5
+    },
+    {
+    "display":"Remove",
+    "shorthand":"RM",
+    "icon": "S3_removal",
+    "iconxScale": 0.4,
+    "iconyScale": 0.4
+    },
+    {
+    "display":"Upgrade",
+    "shorthand":"UP",
+    "icon": "S3_upgrade",
+    "iconxScale": 0.4,
+    "iconyScale": 0.4
+    }
+],
+"timingAndReplay":{
+    "waitTimeBotMax":35000,
+    "playWaitTimeBotMax":40000,
+    "waitTimeManual":1820000,
+    "waitForever":false,
+    "waitTimeBotSoft":5000,
+    "playWaitTimeBotSoft":10000,
+    "replaySave":1,
+    "playReplaySave":0,
+    "storeBotTimes":true,
+    "waitTimeStartGame":3000,
+    "waitTimeEndGame":3000
+},
+"resources":{
+    "turnIntervalForBitCapSchedule":10,
+    "turnIntervalForBitSchedule":10,
+    "bitRampBitCapGrowthRate":5.0,
+    "roundStartBitRamp":10,
+    "bitGrowthRate":1.0,
+    "startingHP":40.0,
+    "maxBits":150.0,
+    "bitsPerRound":5.0,
+    "coresPerRound":5.0,
+    "coresForPlayerDamage":1.0,
+    "startingBits":5.0,
+    "bitDecayPerRound":0.25,
+    "startingCores":20.0
+},
+"misc":{
+    "numBlockedLocations": 0,
+    "blockedLocations": [
+    ]
+}
+}
+"""
+
+TURN_0 = """{"p2Units":[[],[],[],[],[],[],[]],"turnInfo":[0,0,-1],"p1Stats":[30.0,25.0,5.0,0],"p1Units":[[],[],[],[],[],[],[]],"p2Stats":[30.0,25.0,5.0,0],"events":{"selfDestruct":[],"breach":[],"damage":[],"shield":[],"move":[],"spawn":[],"death":[],"attack":[],"melee":[]}}"""
+
 
 class BasicTests(unittest.TestCase):
 
     def make_turn_0_map(self):
-        config = """
-            {
-            "seasonCompatibilityModeP1": 5,
-            "seasonCompatibilityModeP2": 5,
-            "debug":{
-                "printMapString":false,
-                "printTStrings":false,
-                "printActStrings":false,
-                "printHitStrings":false,
-                "printPlayerInputStrings":false,
-                "printBotErrors":true,
-                "printPlayerGetHitStrings":false
-            },
-            "unitInformation": [
-                {
-                "icon": "S3_filter",
-                "iconxScale": 0.4,
-                "iconyScale": 0.4,
-                "cost1": 1.0,
-                "getHitRadius":0.01,
-                "display":"filter",
-                "shorthand":"FF",
-                "startHealth":75.0,
-                "unitCategory": 0,
-                "refundPercentage": 0.75,
-                "turnsRequiredToRemove": 1,
-                "upgrade": {
-                    "startHealth": 150.0
-                }
-                },
-                {
-                "icon": "S3_encryptor",
-                "iconxScale": 0.5,
-                "iconyScale": 0.5,
-                "cost1":4.0,
-                "getHitRadius":0.01,
-                "display":"encryptor",
-                "shieldRange":0,
-                "shorthand":"EF",
-                "startHealth":30.0,
-                "unitCategory": 0,
-                "refundPercentage": 0.75,
-                "turnsRequiredToRemove": 1,
-                "generatesResource1": 1,
-                "upgrade": {
-                    "generatesResource2": 1
-                }
-                },
-                {
-                "icon": "S3_destructor",
-                "iconxScale": 0.5,
-                "iconyScale": 0.5,
-                "attackDamageWalker":5.0,
-                "cost1":2.0,
-                "getHitRadius":0.01,
-                "display":"destructor",
-                "attackRange":2.5,
-                "shorthand":"DF",
-                "startHealth":90.0,
-                "unitCategory": 0,
-                "refundPercentage": 0.75,
-                "turnsRequiredToRemove": 1,
-                "upgrade": {
-                    "cost1": 4.0,
-                    "attackRange":3.5,
-                    "attackDamageWalker":15.0
-                }
-                },
-                {
-                "icon": "S3_ping",
-                "iconxScale": 0.7,
-                "iconyScale": 0.7,
-                "attackDamageTower":2.0,
-                "attackDamageWalker":2.0,
-                "playerBreachDamage":1.0,
-                "cost2":1.0,
-                "getHitRadius":0.01,
-                "display":"ping",
-                "attackRange":3.5,
-                "shorthand":"PI",
-                "startHealth":15.0,
-                "speed":1,
-                "unitCategory": 1,
-                "selfDestructDamageWalker": 15.0,
-                "selfDestructDamageTower": 15.0,
-                "metalForBreach": 1.0,
-                "selfDestructRange": 1.5,
-                "selfDestructStepsRequired": 5
-                },
-                {
-                "icon": "S3_emp",
-                "iconxScale": 0.47,
-                "iconyScale": 0.47,
-                "attackDamageWalker":6.0,
-                "attackDamageTower":6.0,
-                "playerBreachDamage":1.0,
-                "cost2":3.0,
-                "getHitRadius":0.01,
-                "display":"emp",
-                "attackRange":4.5,
-                "shorthand":"EI",
-                "startHealth":5.0,
-                "speed":0.5,
-                "unitCategory": 1,
-                "selfDestructDamageWalker": 5.0,
-                "selfDestructDamageTower": 5.0,
-                "metalForBreach": 1.0,
-                "selfDestructRange": 1.5,
-                "selfDestructStepsRequired": 5
-                },
-                {
-                "icon": "S3_scrambler",
-                "iconxScale": 0.5,
-                "iconyScale": 0.5,
-                "attackDamageWalker":20.0,
-                "playerBreachDamage":1.0,
-                "cost2":1.0,
-                "getHitRadius":0.01,
-                "display":"scrambler",
-                "attackRange":4.5,
-                "shorthand":"SI",
-                "startHealth":40.0,
-                "speed":0.25,
-                "unitCategory": 1,
-                "selfDestructDamageWalker": 40.0,
-                "selfDestructDamageTower": 40.0,
-                "metalForBreach": 1.0,
-                "selfDestructRange": 1.5,
-                "selfDestructStepsRequired": 5
-                },
-                {
-                "display":"Remove",
-                "shorthand":"RM",
-                "icon": "S3_removal",
-                "iconxScale": 0.4,
-                "iconyScale": 0.4
-                },
-                {
-                "display":"Upgrade",
-                "shorthand":"UP",
-                "icon": "S3_upgrade",
-                "iconxScale": 0.4,
-                "iconyScale": 0.4
-                }
-            ],
-            "timingAndReplay":{
-                "waitTimeBotMax":35000,
-                "playWaitTimeBotMax":40000,
-                "waitTimeManual":1820000,
-                "waitForever":false,
-                "waitTimeBotSoft":5000,
-                "playWaitTimeBotSoft":10000,
-                "replaySave":1,
-                "playReplaySave":0,
-                "storeBotTimes":true,
-                "waitTimeStartGame":3000,
-                "waitTimeEndGame":3000
-            },
-            "resources":{
-                "turnIntervalForBitCapSchedule":10,
-                "turnIntervalForBitSchedule":10,
-                "bitRampBitCapGrowthRate":5.0,
-                "roundStartBitRamp":10,
-                "bitGrowthRate":1.0,
-                "startingHP":40.0,
-                "maxBits":150.0,
-                "bitsPerRound":5.0,
-                "coresPerRound":5.0,
-                "coresForPlayerDamage":1.0,
-                "startingBits":5.0,
-                "bitDecayPerRound":0.25,
-                "startingCores":20.0
-            },
-            "misc":{
-                "numBlockedLocations": 0,
-                "blockedLocations": [
-                ]
-            }
-        }
-        """
-        turn_0 = """{"p2Units":[[],[],[],[],[],[],[]],"turnInfo":[0,0,-1],"p1Stats":[30.0,25.0,5.0,0],"p1Units":[[],[],[],[],[],[],[]],"p2Stats":[30.0,25.0,5.0,0],"events":{"selfDestruct":[],"breach":[],"damage":[],"shield":[],"move":[],"spawn":[],"death":[],"attack":[],"melee":[]}}"""
-        
-        state = GameState(json.loads(config), turn_0)
+        state = GameState(json.loads(CONFIG), TURN_0)
         state.suppress_warnings(True)
         return state
 
@@ -271,7 +291,1212 @@ class BasicTests(unittest.TestCase):
         self.future_turn_testing_function(game, 11.6, 2)
         self.future_turn_testing_function(game, 13.7, 3)
 
+    def test_parsed_state(self):
+        config = json.loads(CONFIG)
+        turn = json.loads(TURN_0)
+        turn["p1Units"][2].append([13, 6, 40.0, "1"])
+        turn["p2Stats"][2] = 9.0
+        line = json.dumps(turn)
+        for state in (GameState.from_parsed(config, turn), GameState(config, ParsedMessage(TURN_0, turn)), GameState(config, line)):
+            self.assertEqual(9, state.get_resource(state.MP, 1))
+            self.assertEqual(40, state.game_map.get_structure([13, 6]).health)
+        self.assertIs(turn, parse_message(ParsedMessage(line, turn)), "A ParsedMessage should not be decoded again")
+        self.assertEqual(turn, parse_message(line))
+
     def future_turn_testing_function(self, game, expected, turns):
         actual = game.project_future_MP(turns)
         self.assertAlmostEqual(actual, expected, 0, "Expected {} MP {} turns from now, got {}".format(expected, turns, actual))
 
+
+class UnitSpecTests(unittest.TestCase):
+
+    def test_shared_specs(self):
+        config = json.loads(CONFIG)
+        specs = compile_unit_specs(config)
+        self.assertIs(specs, compile_unit_specs(config), "The config should only be compiled once")
+        self.assertEqual(["FF", "EF", "DF", "PI", "EI", "SI"], list(specs))
+        first, second = GameUnit("DF", config, 0), GameUnit("DF", config, 1)
+        self.assertIs(first.spec, second.spec)
+        self.assertFalse(hasattr(first, "__dict__"), "Units should not carry a __dict__")
+        self.assertEqual((True, 2.5, 5, 90.0, [2, 0]), (first.stationary, first.attackRange, first.damage_i, first.health, first.cost))
+        with self.assertRaises(AttributeError):
+            first.spec.attackRange = 10
+        with self.assertRaises(KeyError):
+            GameUnit("XX", config)
+
+    def test_upgrade(self):
+        config = json.loads(CONFIG)
+        unit = GameUnit("DF", config, 0, 40, 13, 6)
+        unit.upgrade()
+        upgrade = config["unitInformation"][2]["upgrade"]
+        self.assertTrue(unit.upgraded)
+        self.assertEqual(40, unit.health)
+        self.assertEqual(upgrade["attackRange"], unit.attackRange)
+        self.assertEqual(upgrade["attackDamageWalker"], unit.damage_i)
+        self.assertEqual([config["unitInformation"][2]["cost1"] + upgrade.get("cost1", 0), 0], unit.cost)
+        self.assertIs(unit.spec, GameUnit("DF", config).spec.upgrade_spec)
+        self.assertFalse(GameUnit("DF", config).upgraded, "Upgrading one unit changed the others")
+
+    def test_copies(self):
+        unit = GameUnit("FF", json.loads(CONFIG), 1, None, 3, 12)
+        for clone in (copy.copy(unit), copy.deepcopy(unit)):
+            self.assertIs(unit.spec, clone.spec)
+            clone.health = 1
+            clone.upgrade()
+            self.assertEqual((75.0, False, [3, 12]), (unit.health, unit.upgraded, [unit.x, unit.y]))
+
+
+class UnitStackTests(unittest.TestCase):
+
+    def test_attempt_spawn_stacks(self):
+        state = make_random_board(11, 0)
+        state._player_resources[0] = {'SP': 40, 'MP': 7.5}
+        self.assertEqual(7, state.attempt_spawn("PI", [[13, 0], [14, 0]], 1000), "Should spawn as many scouts as we can afford")
+        self.assertEqual(0.5, state.get_resource(state.MP))
+        self.assertEqual([("PI", 13, 0)] * 7, state._deploy_stack)
+        stacks = state.game_map.unit_stacks([13, 0])
+        self.assertEqual([("PI", 0, 7)], [(stack.unit_type, stack.player_index, stack.count) for stack in stacks])
+        self.assertEqual(0, state.game_map.unit_count([14, 0]))
+
+        stacks[0].healths[0] = 1
+        self.assertEqual(7, state.game_map.unit_count([13, 0], "PI", 0), "unit_stacks should return copies")
+        units = state.game_map[13, 0]
+        self.assertEqual(7, len(units))
+        self.assertEqual([(13, 0, 15.0)] * 7, [(unit.x, unit.y, unit.health) for unit in units])
+        self.assertIs(units, state.game_map[13, 0], "Reading a location twice should return the same units")
+        self.assertEqual(7, state.game_map.unit_stacks([13, 0])[0].count)
+
+    def test_mixed_units(self):
+        state = make_random_board(12, 0)
+        game_map = state.game_map
+        game_map.add_unit("EI", [13, 13], 1)
+        game_map.add_units("PI", [13, 13], 3, 0)
+        game_map.add_unit("EI", [13, 13], 1)
+        self.assertEqual([("EI", 1, 2), ("PI", 0, 3)], [(stack.unit_type, stack.player_index, stack.count) for stack in game_map.unit_stacks([13, 13])])
+        self.assertEqual(2, game_map.unit_count([13, 13], player_index=1))
+        fork = state.fork()
+        savepoint = state.savepoint()
+        game_map.add_units("PI", [13, 13], 2, 0)
+        self.assertEqual(7, len(game_map[13, 13]))
+        game_map.add_units("PI", [13, 13], 4, 0)
+        self.assertEqual(11, game_map.unit_count([13, 13]))
+        state.rollback(savepoint)
+        self.assertEqual(["EI", "EI", "PI", "PI", "PI"], [unit.unit_type for unit in game_map[13, 13]])
+        self.assertEqual(5, len(fork.game_map[13, 13]))
+        game_map.add_units("FF", [13, 13], 5, 1)
+        self.assertEqual(["FF"], [unit.unit_type for unit in game_map[13, 13]], "Structures should replace mobile units")
+        self.assertEqual(5, fork.game_map.unit_count([13, 13]))
+
+
+class ActionFrameTests(unittest.TestCase):
+
+    FRAME = ('{"p2Units":[[[13,20,60.0,"7"]],[],[],[],[],[],[]],"turnInfo":[1,4,12],"p1Stats":[28.0,3.0,1.5,900],'
+             '"p1Units":[[],[],[],[[14,0,15.0,"9"]],[],[],[]],"p2Stats":[30.0,5.0,2.0,800],'
+             '"events":{"selfDestruct":[],"breach":[[[14,27],1,3,"9",1]],"damage":[[[13,20],3,0,"7",2]],"shield":[],"move":[],"spawn":[],"death":[],"attack":[],"melee":[]}}')
+
+    def test_lazy_decoding(self):
+        self.assertEqual([1, 4, 12], peek_turn_info(self.FRAME))
+        self.assertIsNone(peek_turn_info(CONFIG))
+        # Broken unit arrays show that reading the events never decodes them
+        broken = ActionFrame(self.FRAME.replace('[[[13,20,60.0,"7"]]', '[[[13,20,oops'))
+        self.assertEqual((4, 12), (broken.turn_number, broken.frame_number))
+        self.assertEqual([[[14, 27], 1, 3, "9", 1]], broken.get_events("breach"))
+        self.assertEqual([], broken.get_events("death"))
+        with self.assertRaises(ValueError):
+            broken.data
+
+        frame = ActionFrame(self.FRAME)
+        self.assertEqual(json.loads(self.FRAME)["events"], frame.events)
+        self.assertEqual([[14, 0, 15.0, "9"]], frame.get_units(0)[3])
+        self.assertEqual([30.0, 5.0, 2.0, 800], frame.get_stats(1))
+        self.assertEqual(json.loads(self.FRAME), parse_message(frame))
+
+    def test_subscriptions(self):
+        core = AlgoCore()
+        seen = []
+        core.subscribe("damage", lambda event, frame: seen.append(("damage", event[0], frame.frame_number)))
+        core.subscribe("breach", lambda event, frame: seen.append(("breach", event[0], frame.frame_number)))
+        core._dispatch_events(ActionFrame(self.FRAME))
+        self.assertEqual([("damage", [13, 20], 12), ("breach", [14, 27], 12)], seen)
+
+
+class EventStreamTests(unittest.TestCase):
+
+    def frame(self, turn, frame, **events):
+        data = json.loads(ActionFrameTests.FRAME)
+        data["turnInfo"] = [1, turn, frame]
+        data["events"] = {event_type: events.get(event_type, []) for event_type in data["events"]}
+        return ActionFrame(json.dumps(data))
+
+    def test_columns_and_aggregates(self):
+        stream = EventStream(json.loads(CONFIG))
+        self.assertEqual((0, 1, 2), stream.structure_types)
+        stream.add_frame(self.frame(3, 0, spawn=[[[13, 0], 3, "20", 1]]))
+        stream.add_frame(self.frame(3, 5, damage=[[[12, 11], 5.0, 2, "4", 1], [[12, 11], 5.0, 2, "4", 1], [[13, 1], 2.0, 3, "20", 1],
+                                                  [[14, 16], 15.0, 0, "8", 2]],
+                                    attack=[[[12, 11], [13, 1], 2.0, 2, "4", "20", 1]]))
+        stream.add_frame(json.loads(self.frame(4, 2, damage=[[[12, 11], 6.0, 2, "4", 1]], breach=[[[3, 10], 1.0, 3, "21", 2]],
+                                               death=[[[12, 11], 2, "4", 1, False], [[20, 11], 0, "9", 1, True]])))
+        self.assertEqual(5, len(stream["damage"]))
+        self.assertEqual([3, 3, 3, 3, 4], list(stream["damage"].column("turn")))
+        self.assertEqual([20], list(stream["spawn"].column("unit_id")))
+        self.assertEqual([(13, 1)], list(zip(stream["attack"].column("target_x"), stream["attack"].column("target_y"))))
+        self.assertEqual({(12, 11): 10.0}, stream.damage_by_cell(3))
+        self.assertEqual({(12, 11): 10.0, (13, 1): 2.0}, stream.damage_by_cell(3, structures_only=False))
+        self.assertEqual({(14, 16): 15.0}, stream.damage_by_cell(3, player_index=1))
+        self.assertEqual({(12, 11): 16.0}, stream.damage_by_cell())
+        self.assertEqual([((3, 10), 1.0)], stream.breaches(4, player_index=1))
+        self.assertEqual([(12, 11)], stream.deaths(4, player_index=0, structures_only=True))
+        self.assertEqual(3, stream.count("damage", 3, player_index=0))
+        stream.discard_before(4)
+        self.assertEqual(({}, 1), (stream.damage_by_cell(3), len(stream["damage"])))
+
+
+def make_random_board(seed, structures=120):
+    """A turn 0 state with randomly placed walls on both halves of the board"""
+    rng = random.Random(seed)
+    state = GameState(json.loads(CONFIG), TURN_0)
+    state.suppress_warnings(True)
+    cells = [[x, y] for x in range(state.ARENA_SIZE) for y in range(state.ARENA_SIZE) if state.game_map.in_arena_bounds([x, y])]
+    for location in rng.sample(cells, structures):
+        state.game_map.add_unit("FF", location, 0 if location[1] < state.HALF_ARENA else 1)
+    return state
+
+
+class SimulatorTests(unittest.TestCase):
+
+    # Frames of one action phase: two scouts from [13, 0] against an enemy wall at [13, 2] and turret at [15, 4].
+    # Each frame lists, in the order of the unit lists, [x, y, health] of player 0 scouts, the wall and the turret
+    RECORDED = [
+        ([[13, 0, 15.0], [13, 0, 15.0]], [13, 2, 71.0], [15, 4, 90.0]),
+        ([[13, 1, 15.0], [13, 1, 15.0]], [13, 2, 67.0], [15, 4, 90.0]),
+        ([[14, 1, 15.0], [14, 1, 15.0]], [13, 2, 63.0], [15, 4, 90.0]),
+        ([[14, 2, 10.0], [14, 2, 15.0]], [13, 2, 59.0], [15, 4, 90.0]),
+        ([[15, 2, 5.0], [15, 2, 15.0]], [13, 2, 55.0], [15, 4, 90.0]),
+        ([[15, 3, 15.0]], [13, 2, 55.0], [15, 4, 86.0]),
+        ([[16, 3, 10.0]], [13, 2, 55.0], [15, 4, 84.0]),
+        ([[16, 4, 5.0]], [13, 2, 55.0], [15, 4, 82.0]),
+        ([], [13, 2, 55.0], [15, 4, 80.0]),
+    ]
+
+    def recorded_frame(self, number, scouts, wall, turret):
+        data = json.loads(make_turn([("PI", 0, x, y, health) for x, y, health in scouts] + [("FF", 1) + tuple(wall), ("DF", 1) + tuple(turret)], 0))
+        data["turnInfo"] = [1, 0, number]
+        return ActionFrame(json.dumps(data))
+
+    def test_recorded_frames(self):
+        state = GameState(json.loads(CONFIG), TURN_0)
+        state.game_map.add_unit("FF", [13, 2], 1)
+        state.game_map.add_unit("DF", [15, 4], 1)
+        state.game_map.add_units("PI", [13, 0], 2, 0)
+        simulator = Simulator(state)
+        for number, recorded in enumerate(self.RECORDED):
+            frame = self.recorded_frame(number, *recorded)
+            self.assertEqual(number < len(self.RECORDED) - 1, simulator.step())
+            for player_index in (0, 1):
+                expected = [[unit[:3] for unit in units] for units in frame.get_units(player_index)[:6]]
+                self.assertEqual(expected, simulator.get_units(player_index), "frame {}".format(number))
+        self.assertEqual([2, 0], simulator.result.units_lost)
+        self.assertEqual({(13, 2): 20.0, (15, 4): 10.0}, simulator.result.structure_damage)
+        # The GameState is left untouched
+        self.assertEqual((2, 90), (state.game_map.unit_count([13, 0]), state.game_map.get_structure([15, 4]).health))
+
+    def test_movement_matches_pathing(self):
+        state = make_random_board(5, 100)
+        # Our own structures are never attacked, so paths never change
+        for location in state.game_map:
+            structure = state.game_map.get_structure(location)
+            if structure is not None:
+                structure.player_index = 0
+        starts = [location for location in state.game_map.get_edge_locations(state.game_map.BOTTOM_LEFT) if not state.contains_stationary_unit(location)]
+        start = starts[0]
+        path = state.find_path_to_edge(start)
+        state.game_map.add_units("PI", start, 1, 0)
+        state.game_map.add_units("EI", start, 1, 0)
+        simulator = Simulator(state)
+        for frame in range(len(path)):
+            simulator.step()
+            positions = [list(divmod(cell, 28)) for cell in simulator.unit_cell]
+            self.assertEqual(path[min(frame, len(path) - 1)], positions[0])
+            self.assertEqual(path[frame // 2], positions[1])
+        result = simulator.run()
+        reached_edge = path[-1] in state.game_map.get_edge_locations(state.get_target_edge(start))
+        self.assertEqual(2.0 if reached_edge else 0.0, result.breach_damage[0])
+        self.assertEqual([0 if reached_edge else 2, 0], [len(result.self_destructs), result.survivors[0]])
+
+    def test_targets_match_get_target(self):
+        rng = random.Random(7)
+        state = make_random_board(11, 80)
+        for location in rng.sample([location for location in state.game_map if not state.contains_stationary_unit(location)], 40):
+            state.game_map.add_unit("DF", location, rng.randrange(2))
+        simulator = Simulator(state)
+        free = [location for location in state.game_map if not state.contains_stationary_unit(location)]
+        for location in rng.sample(free, 60):
+            unit_type, player_index = rng.choice(["PI", "EI", "SI"]), rng.randrange(2)
+            state.game_map.add_unit(unit_type, location, player_index)
+            simulator.spawn(unit_type, location, 1, player_index)
+        for unit in range(len(simulator.unit_cell)):
+            x, y = divmod(simulator.unit_cell[unit], 28)
+            attacker = [other for other in state.game_map[x, y] if not other.stationary][0]
+            expected = state.get_target(attacker)
+            target = simulator._target(simulator.unit_cell[unit], simulator.unit_owner[unit], simulator.unit_spec[unit])
+            if expected is None:
+                self.assertIsNone(target)
+                continue
+            is_structure, index = target
+            cell = index if is_structure else simulator.unit_cell[index]
+            self.assertEqual((expected.stationary, [expected.x, expected.y]), (is_structure, list(divmod(cell, 28))))
+
+    def test_shield_and_self_destruct(self):
+        config = json.loads(CONFIG)
+        config["unitInformation"][1].update(shieldRange=3.5, shieldPerUnit=3, shieldBonusPerY=0.5)
+        state = GameState(config, TURN_0)
+        state.game_map.add_unit("EF", [13, 2], 0)
+        state.game_map.add_unit("EF", [13, 8], 1)
+        # An enemy wall across the whole board, interceptors cannot hurt structures so they walk to its end and explode
+        for x in range(7, 21):
+            state.game_map.add_unit("FF", [x, 6], 1)
+        state.game_map.add_units("PI", [13, 0], 2, 0)
+        state.game_map.add_units("SI", [14, 0], 1, 0)
+        simulator = Simulator(state)
+        simulator.step()
+        simulator.step()
+        # Shielded once by the support 2 rows up, never by the enemy one
+        self.assertEqual([19.0, 19.0, 44.0], list(simulator.unit_health))
+        result = simulator.run()
+        # Scouts head for the top right and interceptors for the top left, both end against the wall
+        self.assertEqual([(19, 5, "PI", 0, 12), (19, 5, "PI", 0, 12), (8, 5, "SI", 0, 48)], result.self_destructs)
+        self.assertEqual({(7, 6): 40.0, (8, 6): 40.0, (9, 6): 40.0, (20, 6): 30.0},
+                         {location: damage for location, damage in result.structure_damage.items() if location[0] < 10 or location[0] > 19})
+        self.assertEqual([3, 0], result.units_lost)
+        self.assertGreater(result.frames_per_second, 0)
+
+    def test_run_skips_quiet_frames(self):
+        state = make_random_board(12, 60)
+        for location in [[6, 10], [13, 11], [21, 10], [13, 17]]:
+            if not state.contains_stationary_unit(location):
+                state.game_map.add_unit("DF", location, 0 if location[1] < 14 else 1)
+        def outcome(simulator, result):
+            return (result.frames, result.breaches, result.breach_cells, result.structure_damage, result.destroyed,
+                    result.units_lost, result.self_destructs, simulator.get_units(0), simulator.get_units(1))
+        for location, max_frames in [([14, 27], 1000), ([3, 17], 1000), ([22, 19], 9), ([10, 23], 25)]:
+            if state.contains_stationary_unit(location):
+                continue
+            played, skipped = Simulator(state), Simulator(state)
+            for simulator in (played, skipped):
+                simulator.spawn("PI", location, 8, 1)
+                simulator.spawn("EI", location, 3, 1)
+            while played.frame < max_frames and played.step():
+                pass
+            # run moves the units through the frames where none of them meets a structure without playing them
+            result = skipped.run(max_frames)
+            self.assertEqual(outcome(played, played.result), outcome(skipped, result), str(location))
+
+    def test_fork_matches_fresh_simulation(self):
+        state = make_random_board(6, 70)
+        for location in [[10, 6], [17, 6], [13, 20], [6, 16], [21, 17]]:
+            if not state.contains_stationary_unit(location):
+                state.game_map.add_unit("DF", location, 0 if location[1] < 14 else 1)
+        def outcome(result):
+            return (result.frames, result.breaches, result.structure_damage, result.destroyed, result.units_lost, result.breach_cells)
+        base = Simulator(state)
+        for location in [[13, 0], [3, 10], [20, 6], [14, 27]]:
+            if state.contains_stationary_unit(location):
+                continue
+            player_index = 0 if location[1] < 14 else 1
+            fresh = Simulator(state)
+            fresh.spawn("PI", location, 6, player_index)
+            forked = base.fork()
+            forked.spawn("PI", location, 6, player_index)
+            # A fork taken halfway through has to play the rest like the original
+            for _ in range(5):
+                forked.step()
+            halfway = forked.fork()
+            self.assertEqual(outcome(fresh.run()), outcome(forked.run()))
+            self.assertEqual(outcome(forked.result), outcome(halfway.run()))
+        self.assertEqual([], base.get_units(0)[3], "Forks should not add units to the original")
+
+    def test_breach_forecast(self):
+        state = make_random_board(8, 0)
+        # Our wall across the board with one gap, behind it a turret covering the gap
+        for x in range(28):
+            if x != 9:
+                state.game_map.add_unit("FF", [x, 13], 0)
+        state.game_map.add_unit("DF", [9, 11], 0)
+        forecast = BreachForecast(state, [("PI", 5), ("EI", 0)])
+        self.assertEqual(sorted(forecast.lanes, key=lambda lane: -lane[0]), forecast.lanes)
+        spawns = state.game_map.get_edges()[0] + state.game_map.get_edges()[1]
+        self.assertEqual(sorted(spawns), sorted(location for group in forecast.groups.values() for location in group))
+        self.assertEqual((len(forecast.groups), len(forecast.groups)), (len(forecast.lanes), forecast.simulations))
+        self.assertAlmostEqual(sum(lane[0] * len(forecast.groups[tuple(lane[1])]) for lane in forecast.lanes) / len(spawns), forecast.expected_damage)
+        damage, location, unit_type, breached = forecast.top_lanes(1)[0]
+        self.assertEqual(("PI", damage), (unit_type, breached * 1.0))
+        self.assertGreater(forecast.damage_at(location), 0)
+        # Every breaching unit walked through the gap
+        self.assertAlmostEqual(forecast.expected_damage, forecast.damage_at([9, 13]))
+        self.assertEqual([9, 13], forecast.hot_cells(1, 0)[0])
+
+    def test_breach_forecast_groups(self):
+        state = make_random_board(9, 40)
+        for location in [[4, 12], [9, 11], [13, 9], [18, 11], [23, 12]]:
+            state.game_map.add_unit("DF", location, 0)
+        waves = [("PI", 12), ("EI", 4)]
+        every = BreachForecast(state, waves, every_spawn=True, max_units=None)
+        grouped = BreachForecast(state, waves, max_units=None)
+        self.assertLess(grouped.simulations, every.simulations)
+        # The spawn locations of a group play the same from the first structure they meet on
+        self.assertAlmostEqual(every.expected_damage, grouped.expected_damage)
+        self.assertEqual(every.damage_map.keys(), grouped.damage_map.keys())
+        for cell, damage in every.damage_map.items():
+            self.assertAlmostEqual(damage, grouped.damage_map[cell], msg=str(cell))
+
+    def test_breach_forecast_self_destruct_steps(self):
+        state = make_random_board(2, 150)
+        # Long enough that from [23, 18] the scouts self destruct at the end of their short path for nothing,
+        # while from [22, 19] they walk two more cells to the same one and hurt the walls around it
+        state.config["unitInformation"][3]["selfDestructStepsRequired"] = 10
+        forecast = BreachForecast(state, [("PI", 3)], max_units=None)
+
+        def simulate(location):
+            simulator = Simulator(state)
+            simulator.spawn("PI", list(location), 3, 1)
+            return simulator.run()
+
+        self.assertEqual(3, len(simulate([23, 18]).self_destructs))
+        self.assertNotIn([22, 19], forecast.groups.get((23, 18), []))
+        for location, group in forecast.groups.items():
+            damage = simulate(location).structure_damage
+            for member in group:
+                self.assertEqual(damage, simulate(member).structure_damage, str(member))
+
+    def test_breach_forecast_max_units(self):
+        state = make_random_board(8, 0)
+        for x in range(28):
+            if x != 9:
+                state.game_map.add_unit("FF", [x, 13], 0)
+        state.game_map.add_unit("DF", [9, 11], 0)
+        full = BreachForecast(state, [("PI", 30)], every_spawn=True, max_units=None)
+        capped = BreachForecast(state, [("PI", 30)], every_spawn=True, max_units=10)
+        # The scouts left out are counted as breaching. The turret kills no more of a bigger stack, it dies sooner if anything
+        breached = {tuple(lane[1]): lane[3] for lane in full.lanes}
+        for damage, location, unit_type, count in capped.lanes:
+            self.assertIn(breached[tuple(location)] - count, (0, 1, 2), str(location))
+        self.assertLessEqual(full.expected_damage - capped.expected_damage, 2)
+        # A capped wave that is wiped out is played again in full
+        held = BreachForecast(state, [("PI", 3)], every_spawn=True, max_units=2)
+        self.assertEqual(BreachForecast(state, [("PI", 3)], every_spawn=True, max_units=None).lanes, held.lanes)
+
+
+def evaluate_in_parent(state, location, parent_pid):
+    """Fails in any process but parent_pid, standing in for a worker that breaks"""
+    if os.getpid() != parent_pid:
+        raise RuntimeError("worker failure")
+    return simulate_spawn(state, location, "PI", 5)
+
+
+class ParallelTests(unittest.TestCase):
+
+    def make_board(self):
+        state = make_random_board(3, 60)
+        state.game_map.add_unit("DF", [13, 16], 1)
+        state.game_map.add_unit("DF", [9, 18], 1)
+        state.game_map[13, 16][0].upgrade()
+        state.game_map.add_unit("EF", [13, 6], 0)
+        state.game_map[13, 6][0].pending_removal = True
+        state.game_map[9, 18][0].health = 12
+        edges = state.game_map.get_edges()
+        locations = [location for location in edges[2] + edges[3] if not state.contains_stationary_unit(location)]
+        return state, locations
+
+    def test_snapshot_round_trip(self):
+        state, _ = self.make_board()
+        restored = restore_board(state.config, board_snapshot(state))
+        def describe(game_state):
+            return [(unit.unit_type, unit.player_index, unit.health, unit.upgraded, unit.pending_removal)
+                    for unit in map(game_state.game_map.get_structure, game_state.game_map) if unit]
+        self.assertEqual(describe(state), describe(restored))
+        self.assertEqual(state.get_resources(1), restored.get_resources(1))
+        self.assertEqual((state.turn_number, state.enemy_health), (restored.turn_number, restored.enemy_health))
+
+    def test_pool_matches_serial(self):
+        state, locations = self.make_board()
+        serial = SimulationPool(state.config, processes=0).evaluate_spawns(state, locations, "PI", 5)
+        pool = SimulationPool(state.config, processes=2)
+        try:
+            self.assertEqual(2, pool.processes)
+            self.assertEqual(serial, pool.evaluate_spawns(state, locations, "PI", 5))
+            # A changed board reaches the workers too
+            state.game_map.remove_unit([13, 16])
+            self.assertEqual([simulate_spawn(state.fork(), location, "PI", 5) for location in locations],
+                             pool.evaluate_spawns(state, locations, "PI", 5))
+        finally:
+            pool.close()
+
+    def test_falls_back_when_workers_fail(self):
+        state, locations = self.make_board()
+        pool = SimulationPool(state.config, evaluate_in_parent, processes=2)
+        results = pool.evaluate_spawns(state, locations, os.getpid())
+        self.assertEqual(0, pool.processes)
+        self.assertEqual([simulate_spawn(state.fork(), location, "PI", 5) for location in locations], results)
+
+
+class GeometryTests(unittest.TestCase):
+
+    def test_bounds(self):
+        for x in range(-2, 30):
+            for y in range(-2, 30):
+                row_size = y + 1 if y < 14 else 28 - y
+                expected = 14 - row_size <= x <= 13 + row_size
+                self.assertEqual(expected, geometry.in_arena_bounds(x, y), "Wrong bounds for {}".format([x, y]))
+        self.assertTrue(geometry.in_arena_bounds(13.5, 0.0))
+        self.assertFalse(geometry.in_arena_bounds(12.5, 0.0))
+
+    def test_iteration_order(self):
+        game_map = make_random_board(0, 0).game_map
+        locations = list(game_map)
+        self.assertEqual(420, len(locations))
+        self.assertEqual([[13, 0], [14, 0], [12, 1]], locations[:3])
+        self.assertEqual([[13, 27], [14, 27]], locations[-2:])
+        self.assertEqual(sorted(locations, key=lambda location: (location[1], location[0])), locations)
+        self.assertEqual(420 * 420, sum(1 for _ in game_map for _ in game_map), "Nested iteration should not interfere")
+
+    def test_edges_and_distances(self):
+        game_map = make_random_board(0, 0).game_map
+        edges = game_map.get_edges()
+        edges[0].append([0, 0])
+        self.assertEqual(14, len(game_map.get_edge_locations(game_map.TOP_RIGHT)), "Callers should not be able to change the edges")
+        self.assertEqual([[14, 27], [15, 26]], game_map.get_edge_locations(game_map.TOP_RIGHT)[:2])
+        self.assertEqual(5.0, game_map.distance_between_locations([0, 13], [3, 17]))
+        self.assertEqual(math.sqrt(2), game_map.distance_between_locations([14, 14], [13, 13]))
+        self.assertAlmostEqual(0.5, game_map.distance_between_locations([13.5, 0], [13, 0]))
+
+
+    def test_locations_in_range(self):
+        game_map = make_random_board(0, 0).game_map
+        hit_radius = game_map.config["unitInformation"][0]["getHitRadius"]
+        for radius in (0, 1, 1.5, 2.5, 3.5, 4.5, 6, 9.5):
+            for location in list(game_map) + [[13.5, 3], [-1, 5]]:
+                expected = [[x, y] for x in range(28) for y in range(28)
+                            if game_map.in_arena_bounds([x, y]) and abs(x - location[0]) <= math.ceil(radius) and abs(y - location[1]) <= math.ceil(radius)
+                            and math.sqrt((x - location[0])**2 + (y - location[1])**2) < radius + hit_radius]
+                self.assertEqual(expected, game_map.get_locations_in_range(location, radius), "Wrong range {} around {}".format(radius, location))
+
+
+class ThreatMapTests(unittest.TestCase):
+
+    def make_turret_board(self, seed):
+        state = make_random_board(seed, 60)
+        rng = random.Random(seed)
+        for location in rng.sample(list(state.game_map), 40):
+            state.game_map.add_unit("DF", location, 0 if location[1] < 14 else 1)
+            if rng.random() < 0.4:
+                state.game_map.get_structure(location).upgrade()
+        return state
+
+    def assert_matches_scan(self, state):
+        threat_map = state.game_map.threat_map()
+        for location in list(state.game_map):
+            for player_index in (0, 1):
+                expected = scan_attackers(state, location, player_index)
+                self.assertEqual(expected, state.get_attackers(location, player_index), "Wrong attackers at {}".format(location))
+                self.assertEqual(sum(unit.damage_i for unit in expected), threat_map.damage_i[1 - player_index][location[0] * 28 + location[1]])
+                self.assertEqual(sum(unit.damage_f for unit in expected), threat_map.damage_f[1 - player_index][location[0] * 28 + location[1]])
+
+    def test_matches_scan(self):
+        for seed in range(3):
+            self.assert_matches_scan(self.make_turret_board(seed))
+
+    def test_incremental_updates(self):
+        state = self.make_turret_board(3)
+        state.game_map.threat_map()
+        rng = random.Random(3)
+        turrets = [location for location in list(state.game_map) if state.game_map.get_structure(location) and state.game_map.get_structure(location).unit_type == "DF"]
+        for location in rng.sample(turrets, 10):
+            state.game_map.remove_unit(location)
+        for location in rng.sample([location for location in list(state.game_map) if not state.contains_stationary_unit(location)], 10):
+            state.game_map.add_unit("DF", location, rng.randint(0, 1))
+        upgraded = rng.choice([location for location in list(state.game_map) if state.game_map.get_structure(location) and state.game_map.get_structure(location).unit_type == "DF"])
+        state.game_map.get_structure(upgraded).upgrade()
+        state.game_map.threat_map().update(upgraded)
+        self.assert_matches_scan(state)
+
+        copied = copy.deepcopy(state)
+        for location in list(copied.game_map):
+            copied.game_map.remove_unit(location)
+        self.assertEqual([], copied.get_attackers([13, 13], 0))
+        self.assert_matches_scan(state)
+
+    def test_upgrade(self):
+        state = self.make_turret_board(5)
+        state._player_resources[0] = {'SP': 100, 'MP': 0}
+        state.game_map.remove_unit([13, 6])
+        state.game_map.add_unit("DF", [13, 6], 0)
+        state.game_map.threat_map()
+        self.assertEqual(1, state.attempt_upgrade([13, 6]))
+        turret = state.game_map.get_structure([13, 6])
+        self.assertTrue(turret.upgraded)
+        self.assertIn(turret, state.get_attackers([13, 9], 1), "The upgraded range is missing")
+        self.assert_matches_scan(state)
+
+        message = make_turn([("DF", 0, 13, 6, 75), ("UP", 0, 13, 6, 75)])
+        parsed = GameState(state.config, message)
+        self.assertTrue(parsed.game_map.get_structure([13, 6]).upgraded)
+        self.assert_matches_scan(parsed)
+
+    def test_path_damage(self):
+        state = self.make_turret_board(4)
+        path = state.find_path_to_edge([13, 0])
+        self.assertEqual(sum(unit.damage_i for location in path for unit in scan_attackers(state, location, 0)),
+                         state.game_map.threat_map().path_damage(path, 0))
+
+
+class ForkTests(unittest.TestCase):
+
+    def snapshot(self, state):
+        return ([(location, [(unit.unit_type, unit.player_index, unit.health, unit.upgraded) for unit in state.game_map[location]])
+                 for location in list(state.game_map)], state.get_resources(0), state.get_resources(1), state._build_stack, state._deploy_stack)
+
+    def test_shares_immutable_data(self):
+        state = make_random_board(0)
+        fork = state.fork()
+        self.assertIs(state.config, fork.config)
+        self.assertIs(state.serialized_string, fork.serialized_string)
+        self.assertIs(state.path_cache, fork.path_cache)
+        self.assertEqual(self.snapshot(state), self.snapshot(fork))
+
+    def test_isolated(self):
+        state = make_random_board(1)
+        state.game_map.add_unit("DF", [13, 3], 0)
+        before = self.snapshot(state)
+        fork = state.fork()
+        wall = next(location for location in list(fork.game_map) if fork.contains_stationary_unit(location) and location[1] > 14)
+        fork.game_map.remove_unit(wall)
+        fork.game_map.add_unit("PI", [13, 0], 0)
+        fork.game_map[13, 3][0].health = 1
+        fork.get_attackers([13, 5], 1)[0].upgrade()
+        fork.attempt_spawn("FF", [12, 2])
+        fork.attempt_spawn("PI", [14, 0], 2)
+        self.assertEqual(before, self.snapshot(state), "Changes to the fork leaked into the parent")
+
+        after = self.snapshot(fork)
+        state.game_map.get_structure([13, 3]).health = 7
+        state.game_map.remove_unit([13, 3])
+        state.game_map.add_unit("FF", [13, 6], 0)
+        state.attempt_spawn("FF", [11, 2])
+        self.assertEqual(after, self.snapshot(fork), "Changes to the parent leaked into the fork")
+
+    def test_reads_share_cells(self):
+        state = make_random_board(3)
+        state.game_map.add_unit("DF", [13, 5], 0)
+        state.game_map.add_unit("DF", [14, 5], 0)
+        state.game_map.add_unit("FF", [13, 9], 1)
+        threats = state.game_map._threats()
+        fork = state.fork()
+        for location in list(state.game_map):
+            self.assertIs(state.game_map.get_structure(location), fork.game_map.get_structure(location))
+        self.assertIs(threats, fork.game_map._threats(), "The ThreatMap should be shared until a structure changes")
+
+        fork.game_map.remove_unit([13, 5])
+        state.game_map[14, 5][0].health = 1
+        self.assertIsNot(threats, fork.game_map._threats())
+        for game_state in (state, fork):
+            self.assertEqual(scan_attackers(game_state, [13, 7], 1), game_state.get_attackers([13, 7], 1))
+        self.assertEqual(1, state.get_attackers([13, 7], 1)[-1].health, "Attackers should be the copies the map owns")
+        self.assertNotEqual(1, fork.game_map.get_structure([14, 5]).health)
+
+        fork.game_map.add_unit("PI", [13, 7], 0)
+        target = fork.get_target(fork.game_map[13, 7][-1])
+        health = state.game_map.get_structure([target.x, target.y]).health
+        target.health = 0
+        self.assertEqual(health, state.game_map.get_structure([target.x, target.y]).health, "Targets should be owned by the fork")
+
+    def test_matches_deepcopy(self):
+        state = make_random_board(2)
+        state.game_map.add_unit("DF", [12, 6], 0)
+        fork = state.fork().fork()
+        copied = copy.deepcopy(state)
+        for location in list(state.game_map)[::7]:
+            if not state.contains_stationary_unit(location):
+                self.assertEqual(copied.find_path_to_edge(location), fork.find_path_to_edge(location))
+                self.assertEqual([(unit.x, unit.y) for unit in copied.get_attackers(location, 1)],
+                                 [(unit.x, unit.y) for unit in fork.get_attackers(location, 1)])
+        self.assertEqual(self.snapshot(copied), self.snapshot(fork))
+
+
+class SavepointTests(unittest.TestCase):
+
+    def snapshot(self, state):
+        return ([(location, [(id(unit), unit.unit_type, unit.player_index) for unit in state.game_map[location]]) for location in list(state.game_map)],
+                state.game_map.structure_layout(), state.game_map.structure_mask(), state.get_resources(0), state.get_resources(1),
+                list(state._build_stack), list(state._deploy_stack))
+
+    def test_rollback(self):
+        state = make_random_board(8)
+        state._player_resources[0] = {'SP': 40, 'MP': 10}
+        state.game_map.threat_map()
+        before = self.snapshot(state)
+        savepoint = state.savepoint()
+        wall = next(location for location in list(state.game_map) if state.contains_stationary_unit(location) and location[1] < 14)
+        state.attempt_remove(wall)
+        state.game_map.remove_unit(wall)
+        state.attempt_spawn("DF", [13, 5])
+        state.game_map.add_unit("DF", [13, 5], 0)
+        state.attempt_spawn("PI", [13, 0], 3)
+        state.game_map.add_unit("PI", [13, 0], 0)
+        state.game_map.add_unit("PI", [13, 0], 0)
+        state.game_map[13, 1] = [GameUnit("EF", state.config, 0, None, 13, 1)]
+        inner = state.savepoint()
+        state.game_map.add_unit("FF", [12, 2], 0)
+        state.attempt_spawn("FF", [11, 2])
+        middle = self.snapshot(state)
+        state.game_map.remove_unit([12, 2])
+        state.rollback(inner)
+        self.assertNotEqual(middle, self.snapshot(state))
+        state.rollback(savepoint)
+        self.assertEqual(before, self.snapshot(state), "Rollback did not restore the state")
+        self.assertEqual(scan_attackers(state, [13, 7], 1), state.get_attackers([13, 7], 1))
+
+    def test_rollback_upgrade(self):
+        state = make_random_board(8)
+        state._player_resources[0] = {'SP': 98, 'MP': 10}
+        state.game_map.add_unit("DF", [13, 6], 0)
+        state.game_map.threat_map()
+        turret = state.game_map.get_structure([13, 6])
+        before = self.snapshot(state)
+        stats = (turret.upgraded, turret.attackRange, turret.damage_i, turret.max_health, turret.health)
+        savepoint = state.savepoint()
+        state.game_map.add_unit("FF", [12, 3], 0)
+        self.assertEqual(1, state.attempt_upgrade([13, 6]))
+        self.assertEqual(94, state.get_resource(state.SP))
+        state.game_map.remove_unit([13, 6])
+        state.rollback(savepoint)
+        self.assertEqual(before, self.snapshot(state), "Rollback did not restore the state")
+        turret = state.game_map.get_structure([13, 6])
+        self.assertEqual(stats, (turret.upgraded, turret.attackRange, turret.damage_i, turret.max_health, turret.health), "The upgrade was not undone")
+        self.assertEqual(scan_attackers(state, [13, 9], 1), state.get_attackers([13, 9], 1))
+
+    def test_commit(self):
+        state = make_random_board(9, 0)
+        savepoint = state.savepoint()
+        state.game_map.add_unit("FF", [13, 3], 0)
+        state.commit()
+        state.suppress_warnings(True)
+        state.rollback(savepoint)
+        self.assertTrue(state.contains_stationary_unit([13, 3]), "Committed changes should stay")
+
+    def test_savepoint_on_fork(self):
+        def units(state):
+            return [[(unit.unit_type, unit.player_index) for unit in state.game_map[location]] for location in list(state.game_map)]
+
+        state = make_random_board(10)
+        expected = units(state)
+        fork = state.fork()
+        savepoint = fork.savepoint()
+        for location in list(fork.game_map)[::5]:
+            fork.game_map.remove_unit(location)
+        fork.rollback(savepoint)
+        self.assertEqual(expected, units(fork))
+        self.assertEqual(expected, units(state))
+
+
+def make_turn(units, turn_number=1):
+    """A turn message with the given (unit_type, player_index, x, y, health) units, RM and UP included"""
+    state = json.loads(TURN_0)
+    state["turnInfo"] = [0, turn_number, -1]
+    state["p1Units"], state["p2Units"] = [[] for _ in range(8)], [[] for _ in range(8)]
+    index = {unit["shorthand"]: i for i, unit in enumerate(json.loads(CONFIG)["unitInformation"])}
+    for number, (unit_type, player_index, x, y, health) in enumerate(units):
+        state["p1Units" if player_index == 0 else "p2Units"][index[unit_type]].append([x, y, health, str(number)])
+    return json.dumps(state)
+
+
+class PersistentStateTests(unittest.TestCase):
+
+    def cells(self, state):
+        return {location[0] * 28 + location[1]: [(unit.unit_type, unit.player_index, unit.health, unit.upgraded, unit.pending_removal)
+                                                 for unit in state.game_map[location]] for location in state.game_map}
+
+    def test_matches_fresh_parse(self):
+        rng = random.Random(5)
+        config = json.loads(CONFIG)
+        cells = [location for location in GameState(config, TURN_0).game_map]
+        structures = {}
+        for x, y in rng.sample(cells, 150):
+            structures[x, y] = [rng.choice(["FF", "EF", "DF"]), 0 if y < 14 else 1, 60.0, False, False]
+        kept = None
+        for turn in range(1, 8):
+            for location in rng.sample(sorted(structures), 15):
+                del structures[location]
+            for location in rng.sample(cells, 15):
+                structures[tuple(location)] = [rng.choice(["FF", "EF", "DF"]), 0 if location[1] < 14 else 1, 60.0, False, False]
+            for location in rng.sample(sorted(structures), 20):
+                structure = structures[location]
+                structure[2] = float(rng.randint(1, 60))
+                structure[3] = structure[3] or rng.random() < 0.3
+                structure[4] = rng.random() < 0.3
+            units = [(unit_type, owner, x, y, health) for (x, y), (unit_type, owner, health, _, _) in structures.items()]
+            units += [("UP", owner, x, y, 0.0) for (x, y), (_, owner, _, upgraded, _) in structures.items() if upgraded]
+            units += [("RM", owner, x, y, 0.0) for (x, y), (_, owner, _, _, removed) in structures.items() if removed]
+            structures.pop((13, 0), None)
+            units += [("PI", 0, 13, 0, 15.0)] * rng.randint(0, 3)
+            message = make_turn(units, turn)
+            fresh = GameState(config, message)
+            if kept is None:
+                kept = GameState(config, message)
+                kept.game_map.threat_map()
+                continue
+            before = self.cells(kept)
+            fork = kept.fork()
+            fork.game_map.remove_unit(next(location for location in kept.game_map if kept.contains_stationary_unit(location)))
+            fork.attempt_spawn("FF", [13, 2])
+            changed = kept.apply_turn(message)
+            after = self.cells(kept)
+            self.assertEqual(self.cells(fresh), after, "Turn {} differs from a fresh parse".format(turn))
+            self.assertEqual({cell for cell in after if after[cell] != before[cell]}, changed)
+            self.assertEqual(fresh.game_map.structure_layout(), kept.game_map.structure_layout())
+            self.assertEqual(fresh.game_map.structure_mask(1, "DF"), kept.game_map.structure_mask(1, "DF"))
+            self.assertEqual((turn, []), (kept.turn_number, kept._build_stack))
+            for location in cells[::11]:
+                self.assertEqual([(unit.x, unit.y, unit.attackRange) for unit in scan_attackers(fresh, location, 0)],
+                                 [(unit.x, unit.y, unit.attackRange) for unit in kept.get_attackers(location, 0)])
+
+    def test_algocore_hands_out_forks(self):
+        core = AlgoCore()
+        core.config = json.loads(CONFIG)
+        core.persistent_state = True
+        core.log_parse_times = False
+        first = make_turn([("DF", 0, 13, 6, 75.0), ("FF", 1, 13, 20, 60.0)], 1)
+        second = make_turn([("DF", 0, 13, 6, 30.0), ("FF", 1, 14, 20, 60.0)], 2)
+        for line in (first, second):
+            message = ParsedMessage(line, json.loads(line))
+            message.game_state = prepared = core._next_game_state(message)
+            state = GameState(core.config, message)
+            self.assertIs(prepared.game_map, state.game_map)
+            self.assertIsNone(message.game_state)
+            other = GameState(core.config, message)
+            self.assertIsNot(state.game_map, other.game_map, "The kept state should only be handed out once")
+            self.assertEqual(self.cells(other), self.cells(state))
+            state.game_map.remove_unit([13, 6])
+        self.assertEqual({13 * 28 + 6, 13 * 28 + 20, 14 * 28 + 20}, core._game_state.changed_cells)
+        self.assertEqual(30, core._game_state.game_map.get_structure([13, 6]).health)
+
+
+class SpeculationTests(unittest.TestCase):
+
+    UNITS = [("FF", 0, 3, 12, 60.0), ("DF", 1, 13, 20, 75.0), ("PI", 0, 13, 0, 15.0)]
+
+    def frame(self, units, turn_number=4, frame_number=20, events=None):
+        data = json.loads(make_turn(units, turn_number))
+        data["turnInfo"] = [1, turn_number, frame_number]
+        data["events"] = events or {}
+        return ActionFrame(json.dumps(data))
+
+    def test_board_hash(self):
+        frame = self.frame(self.UNITS)
+        same = make_turn([("PI", 0, 14, 0, 15.0), ("DF", 1, 13, 20, 30.0), ("FF", 0, 3, 12, 60.0)], 5)
+        self.assertEqual(board_hash(frame), board_hash(same))
+        self.assertNotEqual(board_hash(frame, include_health=True), board_hash(same, include_health=True))
+        self.assertNotEqual(board_hash(frame), board_hash(make_turn(self.UNITS + [("UP", 1, 13, 20, 75.0)], 5)))
+        self.assertNotEqual(board_hash(frame), board_hash(make_turn(self.UNITS[1:], 5)))
+        self.assertEqual(board_hash(TURN_0), board_hash(json.loads(TURN_0)))
+
+    def test_collect(self):
+        worker = BackgroundWorker()
+        calls = []
+
+        def analyse(frame):
+            calls.append(frame.frame_number)
+            state = GameState(json.loads(CONFIG), frame)
+            return state.get_resource(state.MP)
+
+        frame = self.frame(self.UNITS)
+        worker.schedule("analysis", frame, analyse, frame)
+        worker.schedule("analysis", frame, analyse, frame)
+        worker.schedule("failing", frame, lambda: 1 / 0)
+        worker.settle()
+        self.assertEqual([20], calls)
+        self.assertEqual(frame.get_stats(0)[2], worker.collect("analysis", make_turn(self.UNITS, 5)))
+        self.assertIsNone(worker.collect("analysis", make_turn(self.UNITS, 5)))
+        self.assertIsNone(worker.collect("failing", make_turn(self.UNITS, 5)))
+        worker.schedule("analysis", frame, analyse, frame)
+        worker.settle()
+        self.assertIsNone(worker.collect("analysis", make_turn(self.UNITS[1:], 5)))
+        self.assertEqual((1, 3), (worker.hits, worker.misses))
+        worker.shutdown()
+
+    def test_rehash_on_structure_events(self):
+        worker = BackgroundWorker()
+        calls = []
+
+        def analyse(frame):
+            calls.append((frame.turn_number, frame.frame_number))
+
+        damaged = self.frame(self.UNITS, frame_number=21, events={"damage": [[[3, 12], 4.0, 0, "1", 1]]})
+        self.assertFalse(structures_changed(damaged))
+        self.assertTrue(structures_changed(damaged, include_health=True))
+        # The wall is gone from the unit arrays, but only a frame with its death event is hashed again
+        quiet = self.frame(self.UNITS[:1], frame_number=22, events={"spawn": [[[13, 0], 3, "9", 1]]})
+        died = self.frame(self.UNITS[:1], frame_number=23, events={"death": [[[13, 20], 2, "2", 2, False]]})
+        for frame in (self.frame(self.UNITS), damaged, quiet, died, self.frame(self.UNITS, 5, 0)):
+            worker.schedule("analysis", frame, analyse, frame)
+            worker.settle()
+        self.assertEqual([(4, 20), (4, 23), (5, 0)], calls)
+        worker.shutdown()
+
+    def test_settle_skips_other_boards(self):
+        worker = BackgroundWorker()
+        release = threading.Event()
+        frame = self.frame(self.UNITS)
+        worker.schedule("slow", frame, release.wait, 5)
+        start = time.perf_counter()
+        worker.settle(5, make_turn(self.UNITS[1:], 5))
+        self.assertLess(time.perf_counter() - start, 1, "Waited for a job on another board")
+        release.set()
+        self.assertIsNone(worker.collect("slow", make_turn(self.UNITS[1:], 5)))
+        worker.shutdown()
+
+    def test_algocore(self):
+        algo = AlgoCore()
+        self.assertIsNone(algo.collect("analysis", TURN_0))
+        frame = self.frame(self.UNITS)
+        algo.speculate("analysis", frame, len, frame)
+        algo.background.settle()
+        self.assertEqual(len(frame), algo.collect("analysis", make_turn(self.UNITS, 5)))
+        algo.background.shutdown()
+
+
+def scan_attackers(state, location, player_index):
+    """What get_attackers returned before the ThreatMap, by scanning every location in range"""
+    max_range = max(unit.get('attackRange', 0) for unit in state.config["unitInformation"])
+    attackers = []
+    for location_unit in state.game_map.get_locations_in_range(location, max_range):
+        for unit in state.game_map[location_unit]:
+            if unit.damage_i + unit.damage_f > 0 and unit.player_index != player_index and state.game_map.distance_between_locations(location, location_unit) <= unit.attackRange:
+                attackers.append(unit)
+    return attackers
+
+
+class PathfindingTests(unittest.TestCase):
+
+    def assert_same_paths(self, state, starts):
+        fast = ShortestPathFinder()
+        legacy = LegacyShortestPathFinder()
+        for start in starts:
+            edge = state.get_target_edge(start)
+            end_points = state.game_map.get_edge_locations(edge)
+            expected = legacy.navigate_multiple_endpoints(start, end_points, state)
+            got = fast.navigate_multiple_endpoints(start, end_points, state)
+            self.assertEqual(expected, got, "Path from {} differs from the legacy path finder".format(start))
+
+    def test_empty_board_paths(self):
+        state = make_random_board(0, 0)
+        edges = state.game_map.get_edges()
+        self.assert_same_paths(state, edges[2] + edges[3] + [[13, 13], [14, 14], [5, 12]])
+
+    def test_random_board_paths(self):
+        for seed in range(6):
+            state = make_random_board(seed, 40 + 30 * seed)
+            starts = [location for location in state.game_map if not state.contains_stationary_unit(location)]
+            self.assert_same_paths(state, random.Random(seed).sample(starts, 40))
+
+    def test_many_starts(self):
+        for seed in range(4):
+            state = make_random_board(seed, 60 + 60 * seed)
+            state.path_cache = None
+            starts = [location for location in state.game_map if not state.contains_stationary_unit(location)]
+            starts = random.Random(seed).sample(starts, 60) + [[13, 13]]
+            expected = [state.find_path_to_edge(start) for start in starts]
+            self.assertEqual(expected, state.find_paths_to_edge_many(starts), "Batch paths differ from single paths")
+            for edge in range(4):
+                expected = [state.find_path_to_edge(start, edge) for start in starts]
+                self.assertEqual(expected, state.find_paths_to_edge_many(starts, edge), "Batch paths to edge {} differ".format(edge))
+
+    def test_persistent_updates(self):
+        for seed in range(4):
+            rng = random.Random(seed)
+            state = make_random_board(seed, 100 + 40 * seed)
+            cells = [location for location in state.game_map]
+            for edge in range(4):
+                end_points = state.game_map.get_edge_locations(edge)
+                tracked = ShortestPathFinder()
+                tracked.track_edge(state, end_points)
+                for _ in range(25):
+                    location = rng.choice(cells)
+                    if state.contains_stationary_unit(location):
+                        state.game_map.remove_unit(location)
+                        tracked.unblock(location)
+                    else:
+                        state.game_map.add_unit("FF", location, 0 if location[1] < state.HALF_ARENA else 1)
+                        tracked.block(location)
+                    fresh = ShortestPathFinder()
+                    fresh.track_edge(state, end_points)
+                    self.assertEqual(fresh.pathlength, tracked.pathlength, "Repaired distances differ from a full recompute")
+                    for start in rng.sample(cells, 5):
+                        expected = ShortestPathFinder().navigate_multiple_endpoints(start, end_points, state)
+                        self.assertEqual(expected, tracked.path_from(start), "Persistent path from {} differs".format(start))
+
+    def test_fork_persistent(self):
+        state = make_random_board(1, 160)
+        end_points = state.game_map.get_edge_locations(0)
+        tracked = ShortestPathFinder()
+        tracked.track_edge(state, end_points)
+        before = list(tracked.pathlength)
+        structures = [location for location in state.game_map if state.contains_stationary_unit(location)][:10]
+        forked = tracked.fork()
+        for location in structures:
+            forked.unblock(location)
+            state.game_map.remove_unit(location)
+        fresh = ShortestPathFinder()
+        fresh.track_edge(state, end_points)
+        self.assertEqual(fresh.pathlength, forked.pathlength)
+        self.assertEqual(fresh.path_from([13, 0]), forked.path_from([13, 0]))
+        self.assertEqual(before, tracked.pathlength, "Changes to the fork should not reach the original")
+
+    def test_edge_tables(self):
+        state = make_random_board(0, 0)
+        for edge, end_points in enumerate(state.game_map.get_edges()):
+            self.assertIs(EDGE_TABLES[edge], edge_table(end_points), "Standard edges should use the static tables")
+            self.assertEqual(len(end_points), sum(EDGE_TABLES[edge].is_target))
+        state = make_random_board(5, 150)
+        custom = state.game_map.get_edge_locations(state.game_map.TOP_LEFT)[3:9]
+        starts = [location for location in state.game_map if not state.contains_stationary_unit(location)][::7]
+        for start in starts:
+            self.assertEqual(LegacyShortestPathFinder().navigate_multiple_endpoints(start, custom, state),
+                             ShortestPathFinder().navigate_multiple_endpoints(start, custom, state), "Path to a partial edge differs")
+
+    def test_blocked_start(self):
+        state = make_random_board(1)
+        blocked = next(location for location in state.game_map if state.contains_stationary_unit(location))
+        self.assertIsNone(state.find_path_to_edge(blocked))
+
+
+class StructureGridTests(unittest.TestCase):
+
+    def assert_grid_matches(self, state):
+        for location in list(state.game_map):
+            expected = next((unit for unit in state.game_map[location] if unit.stationary), None)
+            self.assertIs(expected, state.game_map.get_structure(location), "Structure grid out of sync at {}".format(location))
+            self.assertEqual(expected is not None, state.game_map.structure_layout()[location[0] * 28 + location[1]] == 1)
+
+    def test_parsed_board(self):
+        self.assert_grid_matches(make_random_board(5))
+
+    def test_grid_updates(self):
+        state = make_random_board(6, 40)
+        state.game_map.add_unit("FF", [13, 3])
+        state.game_map.add_unit("PI", [13, 0])
+        wall = next(location for location in list(state.game_map) if state.contains_stationary_unit(location) and location != [13, 3])
+        state.game_map.remove_unit(wall)
+        state.game_map[13, 4] = [GameUnit("PI", state.config, 0, None, 13, 4), GameUnit("EF", state.config, 0, None, 13, 4)]
+        state.game_map[13, 3] = []
+        self.assert_grid_matches(state)
+        self.assertFalse(state.contains_stationary_unit(wall))
+        self.assertEqual("EF", state.contains_stationary_unit([13, 4]).unit_type)
+
+
+class BitboardTests(unittest.TestCase):
+
+    def test_structure_masks(self):
+        state = make_random_board(7, 150)
+        state.game_map.add_unit("DF", [13, 5], 0)
+        state.game_map.remove_unit(next(location for location in list(state.game_map) if state.contains_stationary_unit(location)))
+        structures = sorted(location for location in list(state.game_map) if state.contains_stationary_unit(location))
+        self.assertEqual(structures, bitboard.locations_of(state.game_map.structure_mask()))
+        self.assertEqual(len(structures), bitboard.popcount(state.game_map.structure_mask()))
+        for player_index in (0, 1):
+            self.assertEqual([location for location in structures if state.contains_stationary_unit(location).player_index == player_index],
+                             bitboard.locations_of(state.game_map.structure_mask(player_index)))
+        self.assertEqual([[13, 5]], bitboard.locations_of(state.game_map.structure_mask(unit_type="DF")))
+        self.assertEqual(state.game_map.structure_mask(), state.game_map.structure_mask(unit_type="FF") | bitboard.bit([13, 5]))
+
+    def test_masks(self):
+        self.assertEqual(sorted(list(make_random_board(0, 0).game_map)), sorted(bitboard.locations_of(bitboard.ARENA_MASK)))
+        self.assertEqual(bitboard.ARENA_MASK, bitboard.HALF_MASKS[0] | bitboard.HALF_MASKS[1])
+        self.assertEqual([[x, 20] for x in range(6, 22)], bitboard.locations_of(bitboard.ROW_MASKS[20] & bitboard.ARENA_MASK))
+        self.assertEqual([[3, y] for y in range(10, 18)], bitboard.locations_of(bitboard.COLUMN_MASKS[3] & bitboard.ARENA_MASK))
+        for edge, locations in enumerate(make_random_board(0, 0).game_map.get_edges()):
+            self.assertEqual(bitboard.mask_of(locations), bitboard.EDGE_MASKS[edge])
+        self.assertEqual([[13, 1], [14, 0]], bitboard.locations_of(bitboard.neighbors(bitboard.bit([13, 0]))))
+        self.assertEqual([13, 14], bitboard.columns_of(bitboard.mask_of([[13, 0], [14, 0], [13, 27]])))
+
+    def test_flood_fill_matches_reachability(self):
+        for seed in range(4):
+            state = make_random_board(seed, 260)
+            free = bitboard.ARENA_MASK & ~state.game_map.structure_mask()
+            reach = state.get_reachability()
+            for location in bitboard.locations_of(free)[::37]:
+                component = sorted(other for other in list(state.game_map) if reach.connected(location, other))
+                self.assertEqual(component, bitboard.locations_of(bitboard.flood_fill(bitboard.bit(location), free)))
+
+    def test_within_range(self):
+        state = make_random_board(0, 0)
+        centers = [[13, 0], [3, 12], [20, 20]]
+        expected = set()
+        for center in centers:
+            expected.update(map(tuple, state.game_map.get_locations_in_range(center, 3.5)))
+        self.assertEqual(sorted(map(list, expected)), bitboard.locations_of(bitboard.within_range(centers, 3.5, state.config["unitInformation"][0]["getHitRadius"])))
+
+
+class ReachabilityTests(unittest.TestCase):
+
+    def test_matches_pathing(self):
+        for seed in range(6):
+            state = make_random_board(seed, 260)
+            reach = state.get_reachability()
+            self.assertIs(reach, state.get_reachability(), "Unchanged board should not be labeled again")
+            for location in list(state.game_map):
+                if state.contains_stationary_unit(location):
+                    self.assertEqual(-1, reach.component(location))
+                    continue
+                for edge in range(4):
+                    path = ShortestPathFinder().navigate_multiple_endpoints(location, state.game_map.get_edge_locations(edge), state)
+                    self.assertEqual(path[-1] in state.game_map.get_edge_locations(edge), reach.can_reach_edge(location, edge),
+                                     "Reachability of edge {} from {} disagrees with pathing".format(edge, location))
+                    self.assertTrue(reach.connected(location, path[-1]))
+
+    def test_sealed_half(self):
+        state = make_random_board(0, 0)
+        for x in range(28):
+            state.game_map.add_unit("FF", [x, 13], 0)
+        reach = state.get_reachability()
+        self.assertFalse(reach.reaches_half([13, 20], 0), "Enemy half should be sealed off")
+        self.assertEqual([], reach.reachable_from_half(state.game_map.get_edge_locations(state.game_map.BOTTOM_LEFT), 1))
+        state.game_map.remove_unit([5, 13])
+        reach = state.get_reachability()
+        self.assertTrue(reach.reaches_half([13, 20], 0), "Hole in the wall should connect the halves")
+        # [0, 13] holds a wall, the other 13 cells of the edge are open again
+        self.assertEqual(13, len(reach.reachable_from_half(state.game_map.get_edge_locations(state.game_map.BOTTOM_LEFT), 1)))
+
+
+class PathCacheTests(unittest.TestCase):
+
+    def test_layout_tracks_structures(self):
+        state = make_random_board(0, 0)
+        layout = state.game_map.structure_layout()
+        self.assertIs(layout, state.game_map.structure_layout(), "Layout should be reused while the map is unchanged")
+        state.game_map.add_unit("SI", [13, 0])
+        self.assertIs(layout, state.game_map.structure_layout(), "Mobile units should not change the layout")
+        state.game_map.add_unit("FF", [13, 5])
+        self.assertEqual(1, state.game_map.structure_layout()[13 * 28 + 5], "New wall missing from the layout")
+        state.game_map.remove_unit([13, 5])
+        self.assertEqual(layout, state.game_map.structure_layout(), "Removed wall still in the layout")
+
+    def test_cached_paths(self):
+        state = make_random_board(3)
+        state.path_cache = PathCache()
+        start = next(location for location in state.game_map.get_edges()[2] if not state.contains_stationary_unit(location))
+        first = state.find_path_to_edge(start)
+        self.assertEqual(first, state.find_path_to_edge(start), "Cached path differs")
+        self.assertEqual({"hits": 1, "misses": 1, "evictions": 0, "size": 1}, {k: v for k, v in state.path_cache.stats().items() if k != "hit_rate"})
+
+        state.find_path_to_edge(start)[0].append(99)
+        self.assertEqual(first, state.find_path_to_edge(start), "Callers should not be able to corrupt cached paths")
+
+        blocker = first[len(first) // 2]
+        state.game_map.add_unit("FF", blocker, 0 if blocker[1] < 14 else 1)
+        self.assertEqual(LegacyShortestPathFinder().navigate_multiple_endpoints(start, state.game_map.get_edge_locations(state.get_target_edge(start)), state),
+                         state.find_path_to_edge(start), "Cache served a path for an outdated layout")
+
+    def test_eviction(self):
+        state = make_random_board(4, 0)
+        state.path_cache = PathCache(capacity=2)
+        for start in state.game_map.get_edges()[3][:3]:
+            state.find_path_to_edge(start)
+        self.assertEqual(1, state.path_cache.evictions, "Least recently used path should have been evicted")
+        self.assertEqual(2, len(state.path_cache))
+
+    def test_start_outside_arena(self):
+        state = make_random_board(2, 40)
+        state.suppress_warnings(True)
+        start = next(location for location in state.game_map.get_edges()[2] if not state.contains_stationary_unit(location))
+        expected = LegacyShortestPathFinder().navigate_multiple_endpoints(start, state.game_map.get_edge_locations(state.get_target_edge(start)), state)
+        for path_cache in (None, PathCache()):
+            state.path_cache = path_cache
+            self.assertIsNone(state.find_path_to_edge([0, 0]))
+            self.assertEqual([None, expected], state.find_paths_to_edge_many([[0, 0], start]))
+            self.assertEqual([None, expected], state.find_paths_to_edge_many([[0, 0], start]), "Second lookup, from the cache")
+
+
+class EvaluationCacheTests(unittest.TestCase):
+
+    def test_lookups_and_eviction(self):
+        state = make_random_board(2, 80)
+        cache = EvaluationCache(state.config, capacity=2)
+        board = cache.board_key(state)
+        cache.put(board, (), [13, 0], ("PI",), 5, 3, cache.footprint([[13, 0]]))
+        self.assertEqual(3, cache.get(board, (), [13, 0], ("PI",), 5))
+        self.assertIsNone(cache.get(board, (), [13, 0], ("PI",), 6))
+        self.assertIsNone(cache.get(board, ((13, 2),), [13, 0], ("PI",), 5))
+        cache.put(board, (), [14, 0], ("PI",), 5, 4, 0, [[14, 0], [14, 1]])
+        self.assertIsNone(cache.get(board, (), [14, 0], ("PI",), 5, [[14, 0], [15, 0]]), "Entry stored for another path")
+        self.assertEqual(4, cache.get(board, (), [14, 0], ("PI",), 5, [[14, 0], [14, 1]]))
+        state.game_map[next(iter(bitboard.locations_of(state.game_map.structure_mask())))][0].health -= 1
+        self.assertNotEqual(board, cache.board_key(state), "Health should be part of the board key")
+        cache.put(board, (), [15, 1], ("PI",), 5, 1, 0)
+        self.assertEqual(1, cache.evictions)
+        self.assertIsNone(cache.get(board, (), [13, 0], ("PI",), 5), "Least recently used entry should have been evicted")
+        self.assertEqual({"hits": 2, "misses": 4, "size": 2}, {k: cache.stats()[k] for k in ("hits", "misses", "size")})
+
+    def test_advance_keeps_untouched_entries(self):
+        state = make_random_board(5, 40)
+        cache = EvaluationCache(state.config)
+        cache.advance(state)
+        board = cache.board_key(state)
+        cache.put(board, (), [13, 0], ("PI",), 5, "left", cache.footprint([[x, 13 - x] for x in range(8)]))
+        cache.put(board, (), [14, 0], ("PI",), 5, "right", cache.footprint([[14 + x, x] for x in range(8)]))
+        after = state.fork()
+        if after.contains_stationary_unit([23, 10]):
+            after.game_map.remove_unit([23, 10])
+        else:
+            after.game_map.add_unit("DF", [23, 10], 0)
+        board = cache.advance(after)
+        self.assertEqual((1, 1), (cache.carried, cache.invalidations))
+        self.assertEqual("left", cache.get(board, (), [13, 0], ("PI",), 5))
+        self.assertIsNone(cache.get(board, (), [14, 0], ("PI",), 5), "A structure in range of the walk changed")
+
+
+def load_strategy():
+    """The AlgoStrategy of the algo this gamelib ships with, None if it cannot be imported"""
+    try:
+        import algo_strategy
+    except (ImportError, SyntaxError):
+        return None
+    return getattr(algo_strategy, "AlgoStrategy", None)
+
+
+class StrategyTests(unittest.TestCase):
+
+    def setUp(self):
+        strategy = load_strategy()
+        if strategy is None or not hasattr(strategy, "full_sweep"):
+            self.skipTest("The algo next to this gamelib has no wave size sweep")
+        self.algo = strategy()
+        self.algo.on_game_start(json.loads(CONFIG))
+        if getattr(self.algo, "simulation_pool", None) is not None:
+            self.algo.simulation_pool.close()
+
+    def test_sweep_matches_full_sim(self):
+        for seed in range(3):
+            rng = random.Random(seed)
+            state = make_random_board(seed, 50)
+            for location in rng.sample([location for location in state.game_map if location[1] >= 14 and not state.contains_stationary_unit(location)], 35):
+                state.game_map.add_unit(rng.choice(["DF", "EF"]), location, 1)
+            ours = [location for location in state.game_map if location[1] < 14 and not state.contains_stationary_unit(location)]
+            self.algo.support_locations = rng.sample(ours, 3)
+            for location in self.algo.support_locations:
+                state.game_map.add_unit("EF", location, 0)
+            for start in ([13, 0], [14, 0], [5, 8]):
+                if state.contains_stationary_unit(start):
+                    continue
+                sweep = self.algo._sweep_path(state, start, 12)
+                for num in range(1, 13):
+                    metrics = self.algo._simulate_path(state, start, num)
+                    self.assertEqual(tuple(metrics[:5]) + (metrics[-1],), sweep[num - 1],
+                                     "Sweep from {} differs for {} scouts".format(start, num))
+            sweep = self.algo.full_sweep(state, 12)
+            self.algo.evaluation_cache.clear()
+            self.assertEqual([self.algo.full_sim(state, num) for num in range(1, 13)], [(loc, metrics[0]) for loc, metrics in sweep])
+            # Every size full_sim stored is a hit for the sweep, with the same damage
+            misses = self.algo.evaluation_cache.misses
+            self.assertEqual(sweep, self.algo.full_sweep(state, 12))
+            self.assertEqual(misses, self.algo.evaluation_cache.misses)
@@ -4,7 +4,7 @@ import math
 import copy
 import json
 from sys import maxsize
-from gamelib import GameState, GameMap, GameUnit
+from gamelib import GameState, GameMap, GameUnit, bitboard
 from threshold import ThresholdEstimator
 
 # Shorthand constants set in on_game_start
@@ -19,6 +19,7 @@ class AlgoStrategy(gamelib.AlgoCore):
     """
     def __init__(self):
         super().__init__()
+        self.subscribe("breach", self.on_breach)
         seed = random.randrange(maxsize)
         random.seed(seed)
         gamelib.debug_write(f"Random seed: {seed}")
@@ -122,6 +123,9 @@ class AlgoStrategy(gamelib.AlgoCore):
                 for x in range(x_min, x_max + 1):
                     self.support_mask[x][y] = True
 
+        # Forked last, so the workers see everything set up above
+        self.simulation_pool = gamelib.SimulationPool(config, self._simulate_path)
+
     def on_turn(self, turn_state):
         """Main turn entry: offense, defense, support."""
         state = GameState(self.config, turn_state)
@@ -218,18 +222,16 @@ class AlgoStrategy(gamelib.AlgoCore):
 
         state.submit_turn()
 
-    def on_action_frame(self, turn_str):
+    def on_breach(self, breach, frame):
         """Stamp breaches with turn so we know where+when they happen."""
-        data = json.loads(turn_str)
-        for breach in data.get("events", {}).get("breach", []):
-            loc, owner = tuple(breach[0]), breach[4]
-            if owner != 1:
-                # record both location and the turn number
-                self.scored_on.append({
-                    "loc": loc,
-                    "turn": self.last_turn  # we'll set last_turn in on_turn
-                })
-                gamelib.debug_write(f"Opponent breached at {loc} on turn {self.last_turn}")
+        loc, owner = tuple(breach[0]), breach[4]
+        if owner != 1:
+            # record both location and the turn number
+            self.scored_on.append({
+                "loc": loc,
+                "turn": self.last_turn  # we'll set last_turn in on_turn
+            })
+            gamelib.debug_write(f"Opponent breached at {loc} on turn {self.last_turn}")
 
     # ------------------------
     # Initial defense
@@ -309,19 +311,12 @@ class AlgoStrategy(gamelib.AlgoCore):
         }
         totals = {'l': 0.0, 'r': 0.0}
 
-        for x in range(28):
-            for y in range(14, 28):
-                loc = [x, y]
-                cell = state.game_map[loc] or []    # treat None as empty
-                for unit in cell:
-                    # skip your own units
-                    if unit.player_index == 0:
-                        continue
-                    weight = WEIGHTS.get((unit.unit_type, unit.upgraded))
-                    if weight is None:
-                        continue
-                    side = 'l' if x < 14 else 'r'
-                    totals[side] += weight
+        # Only enemy walls and turrets on their side carry a weight
+        enemy_defense = (state.game_map.structure_mask(1, WALL) | state.game_map.structure_mask(1, TURRET)) & bitboard.HALF_MASKS[1]
+        for x, y in bitboard.locations_of(enemy_defense):
+            unit = state.game_map.get_structure([x, y])
+            side = 'l' if x < 14 else 'r'
+            totals[side] += WEIGHTS[(unit.unit_type, unit.upgraded)]
 
         gamelib.debug_write(
             f"Enemy defense weighted L={totals['l']:.1f}, R={totals['r']:.1f}"
@@ -425,20 +420,9 @@ class AlgoStrategy(gamelib.AlgoCore):
         Returns:
             1 if there's a rim with at most 3 consecutive holes in the right, -1 if left , 0 otherwise
         """
-        holes = []
-
-        # Check for holes along the rim
-        for x in range(28):
-            has_structure = False
-            # Check from y=14 onwards in this column
-            for y in range(14, 28):
-                if state.game_map.in_arena_bounds([x, y]) and state.contains_stationary_unit([x, y]):
-                    has_structure = True
-                    break
-
-            # If no structure found in this column, it's a hole
-            if not has_structure:
-                holes.append(x)
+        # Check for holes along the rim: a column with no structure from y=14 onwards is a hole
+        rim = state.game_map.structure_mask() & bitboard.HALF_MASKS[1]
+        holes = [x for x in range(28) if not rim & bitboard.COLUMN_MASKS[x]]
 
         # No holes means perfect rim
         if not holes:
@@ -655,18 +639,22 @@ class AlgoStrategy(gamelib.AlgoCore):
                 if orig_state.can_spawn(SCOUT, pt):
                     options.append(pt)
 
+        # Batch the starting paths, when evaluating in this process _simulate_path then reads them from the shared path cache
+        orig_state.find_paths_to_edge_many(options)
+
         best = (-1, None, None)  # (survived, loc, attackers_set)
-        for loc in options:
-            state = copy.deepcopy(orig_state)
-            survive, _, _, _, _, _, atk = self._simulate_path(state, loc, num_scouts)
+        results = self.simulation_pool.evaluate_spawns(orig_state, options, num_scouts, self.support_locations)
+        for loc, (survive, _, _, _, _, _, atk) in zip(options, results):
             if survive > best[0]:
                 best = (survive, loc, atk)
 
         return best[1], best[0]
 
-    def _simulate_path(self, state, loc, num_scouts):
+    def _simulate_path(self, state, loc, num_scouts, support_locations=None):
         """Helper to simulate a single scout path. Returns tuple of metrics + attackers set."""
-        temp = copy.deepcopy(state)
+        if support_locations is None:
+            support_locations = self.support_locations
+        temp = state.fork()
         scout_unit = GameUnit(SCOUT, state.config)
         SC_HP, SC_DMG = scout_unit.max_health, scout_unit.damage_f
         sup_info = self.config["unitInformation"][1]
@@ -675,6 +663,7 @@ class AlgoStrategy(gamelib.AlgoCore):
 
         edge = temp.get_target_edge(loc)
         path = temp.find_path_to_edge(loc)
+        pathing = None  # persistent path finder, created on the first kill
         dead = 0
         dmg_turret = dmg_wall = dmg_support = dmg_to_scout = 0
         attackers = set()
@@ -687,7 +676,7 @@ class AlgoStrategy(gamelib.AlgoCore):
             temp.game_map.add_unit(SCOUT, pt)
 
             # shield buff
-            for sup_loc in self.support_locations:
+            for sup_loc in support_locations:
                 sup = temp.contains_stationary_unit(sup_loc)
                 if sup and sup.unit_type == SUPPORT:
                     rng = base_rng + (1 if sup.upgraded else 0)
@@ -708,7 +697,12 @@ class AlgoStrategy(gamelib.AlgoCore):
                     elif tgt.unit_type == WALL:    dmg_wall   += tgt.health
                     elif tgt.unit_type == SUPPORT: dmg_support+= tgt.health
                     temp.game_map.remove_unit([tgt.x, tgt.y])
-                    path = temp.find_path_to_edge(pt, edge)
+                    if pathing is None:
+                        pathing = gamelib.ShortestPathFinder()
+                        pathing.track_edge(temp, temp.game_map.get_edge_locations(edge))
+                    else:
+                        pathing.unblock([tgt.x, tgt.y])
+                    path = pathing.path_from(pt)
                     idx = -1
                     rem -= math.ceil(tgt.health / SC_DMG)
                     break